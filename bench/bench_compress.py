@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+bench_compress
+~~~~~~~~~~~~~~
+
+Compares one-shot ``brotlicffi.compress()`` against driving a streaming
+``Compressor`` by hand, across a range of payload sizes.
+
+Run with ``python bench/bench_compress.py [--quality Q]``.
+"""
+import argparse
+import os
+import timeit
+
+import brotlicffi
+
+SIZES = [100, 1024, 10 * 1024, 100 * 1024, 1024 * 1024, 100 * 1024 * 1024]
+
+
+def make_payload(size):
+    # Half random, half repetitive, so the encoder has some work to do.
+    chunk = os.urandom(512) + b'brotlicffi benchmark payload ' * 18
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+
+def streaming(data, quality):
+    c = brotlicffi.Compressor(quality=quality)
+    return c.process(data) + c.finish()
+
+
+def run(quality):
+    print("%12s %14s %14s %8s" % ("size", "streaming", "one-shot", "speedup"))
+    for size in SIZES:
+        data = make_payload(size)
+        number = max(1, (1024 * 1024) // size)
+        repeat = 3 if size < 100 * 1024 * 1024 else 1
+        stream_time = min(timeit.repeat(
+            lambda: streaming(data, quality), number=number, repeat=repeat
+        )) / number
+        oneshot_time = min(timeit.repeat(
+            lambda: brotlicffi.compress(data, quality=quality),
+            number=number,
+            repeat=repeat,
+        )) / number
+        print("%12d %12.1fus %12.1fus %7.2fx" % (
+            size,
+            stream_time * 1e6,
+            oneshot_time * 1e6,
+            stream_time / oneshot_time,
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quality", type=int, default=5)
+    args = parser.parse_args()
+    run(args.quality)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+bench_decompress
+~~~~~~~~~~~~~~~~
+
+Measures streaming decompression throughput with a ``Decompressor`` fed
+compressed data in chunks, for payloads of increasing compression ratio, and
+the cost of draining compressed inputs of increasing size through a small
+``output_buffer_limit``, which should grow linearly with the input.
+
+Run with ``python bench/bench_decompress.py [--size BYTES] [--chunk BYTES]
+[--limit BYTES]``.
+"""
+import argparse
+import os
+import timeit
+
+import brotlicffi
+
+# The sizes of compressed input drained through output_buffer_limit.
+DRAIN_SIZES = [
+    1024 * 1024, 2 * 1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024
+]
+
+# The fraction of each payload that is random, which sets its compression
+# ratio: roughly 2x, 20x and 50x.
+RANDOM_FRACTIONS = [0.5, 0.05, 0.02]
+
+
+def make_payload(size, random_fraction):
+    random_size = int(4096 * random_fraction)
+    padding = b'\0' * (4096 - random_size)
+    return b''.join(
+        os.urandom(random_size) + padding for _ in range(size // 4096 + 1)
+    )[:size]
+
+
+def streaming(compressed, chunk_size):
+    d = brotlicffi.Decompressor()
+    output = [
+        d.process(compressed[i:i + chunk_size])
+        for i in range(0, len(compressed), chunk_size)
+    ]
+    d.finish()
+    return output
+
+
+def drain(compressed, limit):
+    # The pattern urllib3 uses to bound the memory used by each read.
+    d = brotlicffi.Decompressor()
+    output = [d.process(compressed, output_buffer_limit=limit)]
+    while not d.can_accept_more_data():
+        output.append(d.process(b'', output_buffer_limit=limit))
+    d.finish()
+    return output
+
+
+def run_ratios(size, chunk_size):
+    print("%8s %12s %12s" % ("ratio", "one call", "chunked"))
+    for fraction in RANDOM_FRACTIONS:
+        data = make_payload(size, fraction)
+        compressed = brotlicffi.compress(data, quality=5)
+        whole_time = min(timeit.repeat(
+            lambda: streaming(compressed, len(compressed)),
+            number=5,
+            repeat=3,
+        )) / 5
+        chunked_time = min(timeit.repeat(
+            lambda: streaming(compressed, chunk_size), number=5, repeat=3
+        )) / 5
+        print("%7.1fx %8.0f MB/s %8.0f MB/s" % (
+            len(data) / float(len(compressed)),
+            size / whole_time / 1e6,
+            size / chunked_time / 1e6,
+        ))
+
+
+def run_drain(limit):
+    print("%12s %12s %12s" % ("input", "drain", "per MB"))
+    for size in DRAIN_SIZES:
+        # Compresses about 2x, so the input is about `size` bytes.
+        compressed = brotlicffi.compress(
+            make_payload(2 * size, 0.5), quality=1
+        )
+        elapsed = min(timeit.repeat(
+            lambda: drain(compressed, limit), number=1, repeat=3
+        ))
+        print("%12d %10.1fms %10.2fms" % (
+            len(compressed),
+            elapsed * 1e3,
+            elapsed * 1e3 * 1024 * 1024 / len(compressed),
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=32 * 1024 * 1024)
+    parser.add_argument("--chunk", type=int, default=16 * 1024)
+    parser.add_argument("--limit", type=int, default=16 * 1024)
+    args = parser.parse_args()
+    run_ratios(args.size, args.chunk)
+    print()
+    run_drain(args.limit)
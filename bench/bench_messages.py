@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+bench_messages
+~~~~~~~~~~~~~~
+
+Measures the per-call overhead of a long-lived ``Compressor`` fed a stream
+of small messages, each flushed so that it can be decoded on arrival, as in
+WebSocket-style message streams, either with separate ``process()`` and
+``flush()`` calls or with ``compress_message()``.
+
+Run with ``python bench/bench_messages.py [--count N] [--size BYTES]
+[--quality Q]``.
+"""
+import argparse
+import os
+import time
+
+import brotlicffi
+
+
+def make_messages(size, distinct=64):
+    # A fixed key layout with varying values, like small JSON events.
+    return [
+        (b'{"id": %d, "data": "%s"}' % (i, os.urandom(size).hex().encode())
+         )[:size]
+        for i in range(distinct)
+    ]
+
+
+def separate(c, message):
+    return c.process(message) + c.flush()
+
+
+def fused(c, message):
+    return c.compress_message(message)
+
+
+def time_calls(compress, messages, count, quality):
+    c = brotlicffi.Compressor(quality=quality)
+    output = 0
+    start = time.perf_counter()
+    for i in range(count):
+        output += len(compress(c, messages[i % len(messages)]))
+    elapsed = time.perf_counter() - start
+    return elapsed, output
+
+
+def run(count, size, quality):
+    messages = make_messages(size)
+    print("%d x %d-byte messages at quality %d" % (count, size, quality))
+    print("%24s %10s %14s %14s" % ("", "total", "per message", "bytes out"))
+    for name, compress in [
+        ("process()+flush()", separate),
+        ("compress_message()", fused),
+    ]:
+        elapsed, output = time_calls(compress, messages, count, quality)
+        print("%24s %9.2fs %12.2fus %14.1f" % (
+            name, elapsed, elapsed * 1e6 / count, output / float(count)
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--quality", type=int, default=1)
+    args = parser.parse_args()
+    run(args.count, args.size, args.quality)
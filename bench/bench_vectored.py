@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+bench_vectored
+~~~~~~~~~~~~~~
+
+Compares ways of compressing a response assembled from fragments: joining
+them and calling ``brotlicffi.compress()``, calling ``Compressor.process()``
+once per fragment, and ``brotlicffi.compress_iter()``, for many small
+fragments, a few large ones, and a mix of both.
+
+Run with ``python bench/bench_vectored.py [--quality Q]``.
+"""
+import argparse
+import os
+import timeit
+
+import brotlicffi
+
+
+def make_responses():
+    small = [b'<li class="item">%d</li>\n' % i for i in range(20000)]
+    large = [os.urandom(256 * 1024) + b'\0' * (768 * 1024) for _ in range(4)]
+    return [("small", small), ("large", large), ("mixed", small + large)]
+
+
+def joined(fragments, quality):
+    return brotlicffi.compress(b''.join(fragments), quality=quality)
+
+
+def per_fragment(fragments, quality):
+    c = brotlicffi.Compressor(quality=quality)
+    return b''.join([c.process(f) for f in fragments]) + c.finish()
+
+
+def vectored(fragments, quality):
+    return brotlicffi.compress_iter(fragments, quality=quality)
+
+
+def run(quality):
+    print("%8s %14s %14s %14s" % ("", "join", "per fragment", "compress_iter"))
+    for name, fragments in make_responses():
+        times = [
+            min(timeit.repeat(
+                lambda: compress(fragments, quality), number=3, repeat=3
+            )) / 3
+            for compress in (joined, per_fragment, vectored)
+        ]
+        print("%8s %12.1fms %12.1fms %12.1fms" % (
+            (name,) + tuple(t * 1e3 for t in times)
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quality", type=int, default=1)
+    args = parser.parse_args()
+    run(args.quality)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+bench_writer
+~~~~~~~~~~~~
+
+Compares feeding many small records to ``Compressor.process()`` one at a time
+against writing them through a ``BrotliWriter``.
+
+Run with ``python bench/bench_writer.py [--quality Q] [--records N]``.
+"""
+import argparse
+import io
+import time
+
+import brotlicffi
+
+
+def make_records(count):
+    return [
+        b'{"event": "page_view", "user": %d, "path": "/item/%d"}\n'
+        % (i % 977, i)
+        for i in range(count)
+    ]
+
+
+def per_record(records, quality):
+    sink = io.BytesIO()
+    c = brotlicffi.Compressor(quality=quality)
+    for record in records:
+        sink.write(c.process(record))
+    sink.write(c.finish())
+    return sink.getvalue()
+
+
+def coalesced(records, quality):
+    sink = io.BytesIO()
+    with brotlicffi.BrotliWriter(sink, quality=quality) as w:
+        for record in records:
+            w.write(record)
+    return sink.getvalue()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def run(quality, count):
+    records = make_records(count)
+    total = sum(len(r) for r in records)
+    for name, func in [("Compressor.process", per_record),
+                       ("BrotliWriter", coalesced)]:
+        elapsed, compressed = timed(func, records, quality)
+        print("%-20s %8.3fs %8.1f MB/s  %d -> %d bytes" % (
+            name, elapsed, total / elapsed / 1e6, total, len(compressed)
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quality", type=int, default=5)
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.quality, args.records)
@@ -96,11 +96,11 @@ setup(
     author_email="cory@lukasa.co.uk",
 
     setup_requires=[
-        "cffi>=1.0.0; python_version<'3.13'",
+        "cffi>=1.12.0; python_version<'3.13'",
         "cffi>=1.17.0; python_version>='3.13'",
     ],
     install_requires=[
-        "cffi>=1.0.0; python_version<'3.13'",
+        "cffi>=1.12.0; python_version<'3.13'",
         "cffi>=1.17.0; python_version>='3.13'",
     ],
     python_requires=">=3.8",
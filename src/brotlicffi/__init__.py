@@ -2,7 +2,25 @@
 # flake8: noqa
 from ._api import (
     decompress, Decompressor, compress, BrotliEncoderMode, DEFAULT_MODE,
-    Compressor, MODE_GENERIC, MODE_TEXT, MODE_FONT, error, Error
+    Compressor, MODE_GENERIC, MODE_TEXT, MODE_FONT, error, Error,
+    decompress_into, compress_into, compress_iter, PreparedDictionary,
+    prepare_dictionary
+)
+from ._allocator import Allocator, PooledAllocator
+from ._async import (
+    AsyncCompressor, AsyncDecompressor, compress_aiter, decompress_aiter,
+    compress_stream, decompress_stream
+)
+from ._dcb import (
+    DCBCompressor, DCBDecompressor, DictionaryRegistry, compress_dcb,
+    decompress_dcb
+)
+from ._delta import compress_delta, decompress_delta
+from ._file import BrotliFile, BrotliWriter, open
+from ._parallel import compress_parallel, compress_many, decompress_many
+from ._seekable import SeekableBrotliReader, SeekableBrotliWriter
+from ._train import (
+    DictionaryEvaluation, evaluate_dictionary, train_dictionary
 )
 
 __version__ = "1.2.0.1"
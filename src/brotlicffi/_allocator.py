@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from ._brotlicffi import ffi, lib
+
+#: Blocks smaller than this are never kept by :class:`PooledAllocator`.
+POOL_MIN_BLOCK_SIZE = 64 * 1024
+
+#: The default amount of idle memory kept by :class:`PooledAllocator`.
+POOL_MAX_BYTES = 256 * 1024 * 1024
+
+
+class Allocator(object):
+    """
+    Supplies the native memory used by :class:`Compressor` and
+    :class:`Decompressor` instances created with ``allocator=``.
+
+    This base class simply uses the C library's ``malloc`` and ``free``.
+    Subclass it and override :meth:`malloc` and :meth:`free` to manage memory
+    some other way, for example to account for it or to pool it. Both methods
+    may be called from any thread that uses an instance, and never while the
+    GIL is released.
+
+    .. versionadded:: 1.2.0.2
+    """
+    def malloc(self, size):
+        """
+        Allocate ``size`` bytes.
+
+        :param size: The number of bytes needed. Never zero.
+        :type size: ``int``
+        :returns: A cffi ``void *`` pointer to the memory, or ``ffi.NULL`` if
+            it could not be allocated.
+        """
+        return lib.malloc(size)
+
+    def free(self, address, size):
+        """
+        Release memory returned by :meth:`malloc`.
+
+        :param address: The pointer returned by :meth:`malloc`.
+        :param size: The ``size`` that was passed to :meth:`malloc`.
+        :type size: ``int``
+        """
+        lib.free(address)
+
+
+class PooledAllocator(Allocator):
+    """
+    An :class:`Allocator` that keeps large blocks released by finished
+    instances and hands them to the next instance that asks for a block of
+    the same size.
+
+    An encoder's hash tables and ring buffer, and a decoder's ring buffer, are
+    sized only by the instance's parameters, so a steady stream of
+    compressors created with the same parameters ends up reusing the same
+    few blocks instead of repeatedly returning hundreds of megabytes to
+    ``malloc``. One pool may be shared by any number of instances on any
+    number of threads.
+
+    .. versionadded:: 1.2.0.2
+
+    :param min_block_size: Blocks smaller than this are allocated and freed
+        as usual rather than pooled.
+    :type min_block_size: ``int``
+
+    :param max_pooled_bytes: The most idle memory the pool keeps. Blocks
+        freed while the pool is full are released immediately.
+    :type max_pooled_bytes: ``int``
+    """
+    def __init__(self,
+                 min_block_size=POOL_MIN_BLOCK_SIZE,
+                 max_pooled_bytes=POOL_MAX_BYTES):
+        self.min_block_size = min_block_size
+        self.max_pooled_bytes = max_pooled_bytes
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pooled_bytes = 0
+
+    @property
+    def pooled_bytes(self):
+        """
+        The amount of idle memory currently held by the pool.
+        """
+        return self._pooled_bytes
+
+    def malloc(self, size):
+        if size >= self.min_block_size:
+            with self._lock:
+                blocks = self._blocks.get(size)
+                if blocks:
+                    self._pooled_bytes -= size
+                    return blocks.pop()
+        return super(PooledAllocator, self).malloc(size)
+
+    def free(self, address, size):
+        if size >= self.min_block_size:
+            with self._lock:
+                if self._pooled_bytes + size <= self.max_pooled_bytes:
+                    self._blocks.setdefault(size, []).append(address)
+                    self._pooled_bytes += size
+                    return
+        super(PooledAllocator, self).free(address, size)
+
+    def clear(self):
+        """
+        Release all of the idle memory held by the pool. Blocks in use by
+        live instances are unaffected, and return to the pool when freed.
+        """
+        with self._lock:
+            blocks, self._blocks = self._blocks, {}
+            self._pooled_bytes = 0
+        for size, addresses in blocks.items():
+            for address in addresses:
+                lib.free(address)
+
+    def __del__(self):
+        self.clear()
+
+
+class _InstanceMemory(object):
+    """
+    The allocation state of a single encoder or decoder instance, passed to
+    the native callbacks as their opaque pointer. It remembers the size of
+    every live block, since ``brotli_free_func`` isn't told it, and keeps
+    count of the instance's usage against its limit.
+    """
+    def __init__(self, allocator, may_fail, max_memory):
+        self._allocator = allocator
+        self._may_fail = may_fail
+        self._blocks = {}
+        self.max_memory = max_memory
+        self.usage = 0
+        self.peak = 0
+        self.exceeded = False
+
+    def malloc(self, size):
+        if self.max_memory is not None and self.usage + size > self.max_memory:
+            # Remember the overrun: the encoder can't be refused memory, so
+            # its owner checks for this after every call instead.
+            self.exceeded = True
+            if self._may_fail:
+                return ffi.NULL
+
+        try:
+            address = self._allocator.malloc(size)
+        except Exception:
+            address = ffi.NULL
+        owner = self._allocator
+        if not address:
+            if self._may_fail:
+                return ffi.NULL
+            # The encoder terminates the process when an allocation fails,
+            # so fall back to malloc rather than let that happen.
+            address = lib.malloc(size)
+            owner = None
+
+        self._blocks[int(ffi.cast("uintptr_t", address))] = (size, owner)
+        self.usage += size
+        self.peak = max(self.peak, self.usage)
+        return address
+
+    def free(self, address):
+        if not address:
+            return
+        size, owner = self._blocks.pop(int(ffi.cast("uintptr_t", address)))
+        self.usage -= size
+        if owner is None:
+            lib.free(address)
+        else:
+            owner.free(address, size)
+
+
+@ffi.def_extern()
+def _brotlicffi_alloc(opaque, size):
+    return ffi.from_handle(opaque).malloc(size)
+
+
+@ffi.def_extern()
+def _brotlicffi_free(opaque, address):
+    ffi.from_handle(opaque).free(address)
+
+
+def _create_instance(create, destroy, allocator, may_fail, max_memory=None):
+    """
+    Creates an encoder or decoder instance with ``create``, attaching
+    ``destroy`` as its finalizer.
+
+    If an ``allocator`` or ``max_memory`` is given, the instance's allocations
+    are routed through an :class:`_InstanceMemory`, which is returned
+    alongside the instance; otherwise the library allocates with ``malloc``
+    and ``None`` is returned in its place. The instance is ``ffi.NULL`` if it
+    couldn't be created.
+
+    ``may_fail`` says whether the instance copes with failed allocations: the
+    decoder does, the encoder does not.
+    """
+    if allocator is None and max_memory is None:
+        state = create(ffi.NULL, ffi.NULL, ffi.NULL)
+        return (ffi.gc(state, destroy) if state else state), None
+
+    memory = _InstanceMemory(allocator or Allocator(), may_fail, max_memory)
+    handle = ffi.new_handle(memory)
+    state = create(lib._brotlicffi_alloc, lib._brotlicffi_free, handle)
+    if not state:
+        return state, memory
+
+    def _destroy(state, handle=handle):
+        # The handle must outlive the instance, whose destructor frees
+        # through it.
+        destroy(state)
+
+    return ffi.gc(state, _destroy), memory
@@ -1,10 +1,47 @@
 # -*- coding: utf-8 -*-
-import math
+import collections
 import enum
+import functools
+import hashlib
 import threading
 
+from ._allocator import _create_instance
 from ._brotlicffi import ffi, lib
 
+#: Allocates cdata without zero-filling it first. Only use this for buffers
+#: that are always written before they are read, such as output buffers.
+_new_uninitialized = ffi.new_allocator(should_clear_after_alloc=False)
+
+# The output arena of a Decompressor starts at least this large, like the
+# buffer of the brotli C extension.
+_MIN_OUTPUT_SIZE = 32 * 1024
+
+# The largest output arena a Decompressor allocates before it has seen any
+# output, however large the input; it grows as needed from there.
+_MAX_INITIAL_OUTPUT_SIZE = 64 * 1024 * 1024
+
+# Output buffers larger than this are released at the end of each call rather
+# than kept by an idle Compressor or Decompressor.
+_MAX_RETAINED_OUTPUT_SIZE = 4 * 1024 * 1024
+
+# The compression ratio assumed before a stream has produced any output.
+_INITIAL_COMPRESSION_RATIO = 5
+
+# Buffers given to Compressor.compress_vectored() smaller than this are
+# gathered into a staging buffer of about this size rather than each being
+# passed to the encoder separately.
+_VECTORED_STAGING_SIZE = 64 * 1024
+
+# Passed to the encoder in place of an empty input, so that it always gets a
+# valid pointer.
+_NO_INPUT = ffi.new("uint8_t []", 1)
+
+# The encoder treats every size hint from 1 GiB up the same way.
+_MAX_SIZE_HINT = 1 << 30
+
+#: The number of prepared dictionaries kept by :func:`prepare_dictionary`.
+DICTIONARY_CACHE_SIZE = 16
+
 
 class error(Exception):
     """
@@ -80,32 +117,121 @@ MODE_TEXT = BrotliEncoderMode.TEXT
 MODE_FONT = BrotliEncoderMode.FONT
 
 
-def decompress(data):
+def decompress(data, expected_size=None, large_window=False, dictionary=None):
     """
     Decompress a complete Brotli-compressed string.
 
-    :param data: A bytestring containing Brotli-compressed data.
+    .. versionchanged:: 1.2.0.2
+       ``data`` may be any object supporting the buffer protocol.
+
+    .. versionchanged:: 1.2.0.2
+       Added ``expected_size``, ``large_window`` and ``dictionary``
+       parameters.
+
+    :param data: A bytes-like object containing Brotli-compressed data.
+    :param expected_size: The size of the decompressed data, if known. When
+        set, exactly one output buffer of this size is allocated and the data
+        is decoded into it in a single pass. Decompressed data larger than
+        ``expected_size`` raises :class:`Error <brotlicffi.Error>` rather
+        than growing the buffer, so this also works as a hard limit on the
+        output size. Shorter output is returned as-is.
+    :type expected_size: ``int`` or ``None``
+    :param large_window: Whether to accept streams in the non-standard Large
+        Window Brotli format, as written by :func:`compress` with
+        ``large_window=True``.
+    :type large_window: ``bool``
+    :param dictionary: The custom dictionary the data was compressed with,
+        if any.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
     """
-    d = Decompressor()
+    if expected_size is not None:
+        if expected_size < 0:
+            raise error(
+                "%d is not a valid expected_size, must be non-negative"
+                % expected_size
+            )
+        output_buffer = _new_uninitialized("uint8_t []", expected_size)
+        written = _decompress_oneshot(
+            data,
+            ffi.buffer(output_buffer),
+            "decompressed data is larger than expected_size",
+            large_window,
+            dictionary,
+        )
+        return ffi.buffer(output_buffer, written)[:]
+
+    d = Decompressor(dictionary=dictionary, large_window=large_window)
     data = d.decompress(data)
     d.finish()
     return data
 
 
+def decompress_into(data, out):
+    """
+    Decompress a complete Brotli-compressed string directly into a
+    caller-supplied buffer.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing Brotli-compressed data.
+    :param out: A writable bytes-like object (e.g. a ``bytearray`` or a
+        ``memoryview`` slice of one) that receives the decompressed data. It
+        must be large enough to hold the whole of the decompressed output.
+    :returns: The number of bytes written to ``out``.
+    :rtype: ``int``
+    :raises: :class:`Error <brotlicffi.Error>` if the data is invalid or
+        truncated, or if ``out`` is too small.
+    """
+    return _decompress_oneshot(data, out, "output buffer is too small")
+
+
+def _decompress_oneshot(data,
+                        out,
+                        overflow_message,
+                        large_window=False,
+                        dictionary=None):
+    """
+    Decodes a complete stream into ``out`` in a single pass, returning the
+    number of bytes written.
+    """
+    d = Decompressor(dictionary=dictionary, large_window=large_window)
+    written, _, rc = d._decompress_into(data, out)
+    if rc == lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT:
+        raise error("Decompression error: %s." % overflow_message)
+    d.finish()
+    return written
+
+
 def compress(data,
              mode=DEFAULT_MODE,
              quality=lib.BROTLI_DEFAULT_QUALITY,
              lgwin=lib.BROTLI_DEFAULT_WINDOW,
-             lgblock=0):
+             lgblock=0,
+             disable_literal_context_modeling=False,
+             npostfix=0,
+             ndirect=0,
+             large_window=False,
+             dictionary=None):
     """
     Compress a string using Brotli.
 
+    The length of ``data`` is always passed to the encoder as its size hint,
+    so small inputs are compressed with tables and buffers sized for them.
+
     .. versionchanged:: 0.5.0
        Added ``mode``, ``quality``, `lgwin``, ``lgblock``, and ``dictionary``
        parameters.
 
-    :param data: A bytestring containing the data to compress.
-    :type data: ``bytes``
+    .. versionchanged:: 1.2.0.2
+       ``data`` may be any object supporting the buffer protocol. Added
+       ``disable_literal_context_modeling``, ``npostfix``, ``ndirect``,
+       ``large_window`` and ``dictionary`` parameters.
+
+    :param data: A bytes-like object containing the data to compress. Any
+        C-contiguous buffer (``bytes``, ``bytearray``, ``memoryview``,
+        ``mmap``, ``array.array``, ...) is accepted and is read in place
+        rather than copied.
+    :type data: ``bytes`` or any object supporting the buffer protocol
 
     :param mode: The encoder mode.
     :type mode: :class:`BrotliEncoderMode` or ``int``
@@ -124,19 +250,77 @@ def compress(data,
         based on ``quality``.
     :type lgblock: ``int``
 
+    :param disable_literal_context_modeling: Whether to turn off literal
+        context modeling, which trades some compression ratio for faster
+        decompression.
+    :type disable_literal_context_modeling: ``bool``
+
+    :param npostfix: The recommended number of postfix bits used in distance
+        codes, from 0 to 3.
+    :type npostfix: ``int``
+
+    :param ndirect: The recommended number of direct distance codes, from 0
+        to ``15 << npostfix`` in steps of ``1 << npostfix``.
+    :type ndirect: ``int``
+
+    :param large_window: Whether to use the Large Window Brotli format, which
+        allows ``lgwin`` up to 30 (a 1 GiB window). This is **not** standard
+        RFC 7932 Brotli: only decoders that opt in, such as
+        :func:`decompress` with ``large_window=True``, can read it.
+    :type large_window: ``bool``
+
+    :param dictionary: A custom dictionary to compress against, which must
+        also be given to the decoder. See :class:`Compressor`.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+
     :returns: The compressed bytestring.
     :rtype: ``bytes``
     """
-    # This method uses private variables on the Compressor object, and
+    advanced = (
+        disable_literal_context_modeling or npostfix or ndirect or dictionary
+    )
+    # The one-shot encoder only turns on the large window format when lgwin
+    # needs it.
+    if large_window and lgwin <= 24:
+        advanced = True
+    if lgblock == 0 and not advanced:
+        # The one-shot encoder avoids the cost of setting up a streaming
+        # encoder, and because its output is bounded by
+        # BrotliEncoderMaxCompressedSize we can allocate exactly once. It
+        # passes the input length as the size hint itself.
+        with ffi.from_buffer("uint8_t []", data) as input_buffer:
+            max_size = lib.BrotliEncoderMaxCompressedSize(len(input_buffer))
+            if max_size:
+                output_buffer = _new_uninitialized("uint8_t []", max_size)
+                written = _compress_oneshot(
+                    input_buffer,
+                    output_buffer,
+                    mode,
+                    quality,
+                    lgwin,
+                    large_window
+                )
+                if written is not None:
+                    return ffi.buffer(output_buffer, written)[:]
+
+    # This path uses private variables on the Compressor object, and
     # generally does a whole lot of stuff that's not supported by the public
     # API. The goal here is to minimise the number of allocations and copies
     # we have to do. Users should prefer this method over the Compressor if
     # they know they have single-shot data.
+    with memoryview(data) as view:
+        size_hint = min(view.nbytes, _MAX_SIZE_HINT)
     compressor = Compressor(
         mode=mode,
         quality=quality,
         lgwin=lgwin,
-        lgblock=lgblock
+        lgblock=lgblock,
+        size_hint=size_hint,
+        disable_literal_context_modeling=disable_literal_context_modeling,
+        npostfix=npostfix,
+        ndirect=ndirect,
+        large_window=large_window,
+        dictionary=dictionary
     )
     compressed_data = compressor._compress(data, lib.BROTLI_OPERATION_FINISH)
     assert lib.BrotliEncoderIsFinished(compressor._encoder) == lib.BROTLI_TRUE
@@ -146,6 +330,281 @@ def compress(data,
     return compressed_data
 
 
+def compress_iter(chunks,
+                  mode=DEFAULT_MODE,
+                  quality=lib.BROTLI_DEFAULT_QUALITY,
+                  lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                  lgblock=0,
+                  disable_literal_context_modeling=False,
+                  npostfix=0,
+                  ndirect=0,
+                  large_window=False,
+                  dictionary=None):
+    """
+    Compress the concatenation of a sequence of buffers using Brotli, without
+    joining them first.
+
+    Chunks of 64 KiB or more are read in place and fed to the encoder in
+    turn, so a large response assembled from many fragments is compressed
+    without a full-size temporary copy. Runs of smaller chunks are copied
+    into a staging buffer of about 64 KiB and fed to the encoder together,
+    which is far cheaper than a trip into the encoder for each of them. If
+    ``chunks`` is a list or tuple, its total size is passed to the encoder as
+    its size hint, as by :func:`compress`.
+
+    .. versionadded:: 1.2.0.2
+
+    :param chunks: An iterable of bytes-like objects to compress.
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: Controls the compression-speed vs compression-density
+        tradeoffs. The higher the quality, the slower the compression. The
+        range of this value is 0 to 11.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size. The range of
+        this value is 10 to 24.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size. The
+        range of this value is 16 to 24. If set to 0, the value will be set
+        based on ``quality``.
+    :type lgblock: ``int``
+
+    :param disable_literal_context_modeling: Whether to turn off literal
+        context modeling, which trades some compression ratio for faster
+        decompression.
+    :type disable_literal_context_modeling: ``bool``
+
+    :param npostfix: The recommended number of postfix bits used in distance
+        codes, from 0 to 3.
+    :type npostfix: ``int``
+
+    :param ndirect: The recommended number of direct distance codes, from 0
+        to ``15 << npostfix`` in steps of ``1 << npostfix``.
+    :type ndirect: ``int``
+
+    :param large_window: Whether to use the Large Window Brotli format, which
+        allows ``lgwin`` up to 30 (a 1 GiB window). This is **not** standard
+        RFC 7932 Brotli: only decoders that opt in, such as
+        :func:`decompress` with ``large_window=True``, can read it.
+    :type large_window: ``bool``
+
+    :param dictionary: A custom dictionary to compress against, which must
+        also be given to the decoder. See :class:`Compressor`.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+
+    :returns: The compressed bytestring.
+    :rtype: ``bytes``
+    """
+    size_hint = 0
+    if isinstance(chunks, (list, tuple)):
+        size_hint = min(sum(map(_nbytes, chunks)), _MAX_SIZE_HINT)
+    compressor = Compressor(
+        mode=mode,
+        quality=quality,
+        lgwin=lgwin,
+        lgblock=lgblock,
+        size_hint=size_hint,
+        disable_literal_context_modeling=disable_literal_context_modeling,
+        npostfix=npostfix,
+        ndirect=ndirect,
+        large_window=large_window,
+        dictionary=dictionary
+    )
+    return compressor._compress_vectored(
+        chunks, lib.BROTLI_OPERATION_FINISH
+    )
+
+
+def compress_into(data,
+                  out,
+                  mode=DEFAULT_MODE,
+                  quality=lib.BROTLI_DEFAULT_QUALITY,
+                  lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                  lgblock=0):
+    """
+    Compress a string using Brotli, writing the compressed data directly into
+    a caller-supplied buffer.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the data to compress.
+
+    :param out: A writable bytes-like object that receives the compressed
+        data. It must be large enough to hold the whole compressed stream.
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: Controls the compression-speed vs compression-density
+        tradeoffs. The higher the quality, the slower the compression. The
+        range of this value is 0 to 11.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size. The range of
+        this value is 10 to 24.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size. The
+        range of this value is 16 to 24. If set to 0, the value will be set
+        based on ``quality``.
+    :type lgblock: ``int``
+
+    :returns: The number of bytes written to ``out``.
+    :rtype: ``int``
+    :raises: :class:`Error <brotlicffi.Error>` if ``out`` is too small.
+    """
+    if lgblock == 0:
+        with ffi.from_buffer("uint8_t []", data) as input_buffer, \
+                ffi.from_buffer(
+                    "uint8_t []", out, require_writable=True
+                ) as output_buffer:
+            written = _compress_oneshot(
+                input_buffer, output_buffer, mode, quality, lgwin
+            )
+        if written is None:
+            raise error("Compression error: output buffer is too small.")
+        return written
+
+    compressor = Compressor(
+        mode=mode,
+        quality=quality,
+        lgwin=lgwin,
+        lgblock=lgblock
+    )
+    written, _ = compressor._compress_into(
+        data, out, lib.BROTLI_OPERATION_FINISH
+    )
+    if lib.BrotliEncoderIsFinished(compressor._encoder) != lib.BROTLI_TRUE:
+        raise error("Compression error: output buffer is too small.")
+    return written
+
+
+def _compress_oneshot(input_buffer,
+                      output_buffer,
+                      mode,
+                      quality,
+                      lgwin,
+                      large_window=False):
+    """
+    Compresses ``input_buffer`` into ``output_buffer`` with the native one-shot
+    encoder. Returns the number of bytes written, or ``None`` if the output
+    did not fit. The encoder uses the large window format exactly when
+    ``lgwin`` is above 24, which ``large_window`` must allow.
+    """
+    _validate_mode(mode)
+    _validate_quality(quality)
+    _validate_lgwin(lgwin, large_window)
+
+    encoded_size = ffi.new("size_t *", len(output_buffer))
+    rc = lib.BrotliEncoderCompress(
+        quality,
+        lgwin,
+        mode,
+        len(input_buffer),
+        input_buffer,
+        encoded_size,
+        output_buffer
+    )
+    if rc != lib.BROTLI_TRUE:
+        return None
+    return encoded_size[0]
+
+
+def _nbytes(data):
+    """
+    Returns the size of a bytes-like object in bytes, without the cost of a
+    memoryview for the common types.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    with memoryview(data) as view:
+        return view.nbytes
+
+
+def _gather_small_buffers(buffers):
+    """
+    Yields ``buffers``, except that runs of buffers smaller than
+    :data:`_VECTORED_STAGING_SIZE` are joined into staging buffers of about
+    that size. A trip into the encoder for each small buffer would cost far
+    more than copying it, and at qualities 0 and 1 the encoder compresses
+    each input it is given as a separate fragment.
+    """
+    staging = bytearray()
+    for data in buffers:
+        # Checked inline for bytes, since this is per fragment.
+        size = len(data) if type(data) is bytes else _nbytes(data)
+        if size < _VECTORED_STAGING_SIZE:
+            staging += data
+            if len(staging) < _VECTORED_STAGING_SIZE:
+                continue
+        if staging:
+            yield staging
+            staging = bytearray()
+        if size >= _VECTORED_STAGING_SIZE:
+            yield data
+    if staging:
+        yield staging
+
+
+def _take_output(state, has_more_output, take_output):
+    """
+    Yields the output held by an encoder or decoder instance as read-only
+    memoryviews of its internal buffer, without copying it. Each view is
+    released before the next is taken, since taking output invalidates it.
+    """
+    size = ffi.new("size_t *")
+    while has_more_output(state) == lib.BROTLI_TRUE:
+        size[0] = 0
+        data = take_output(state, size)
+        with memoryview(ffi.buffer(data, size[0])) as raw:
+            view = raw.toreadonly()
+            try:
+                yield view
+            finally:
+                try:
+                    view.release()
+                except BufferError:
+                    # Something still holds a buffer exported from the view,
+                    # and will see it change: the caller has been warned.
+                    pass
+
+
+def _decoder_error(decoder, memory=None, large_window=True):
+    """
+    Builds the :class:`Error <brotlicffi.Error>` describing why the decoder
+    failed.
+    """
+    if memory is not None and memory.exceeded:
+        return error(
+            "Decompression error: memory limit of %d bytes exceeded."
+            % memory.max_memory
+        )
+    error_code = lib.BrotliDecoderGetErrorCode(decoder)
+    if (not large_window and
+            error_code == lib.BROTLI_DECODER_ERROR_FORMAT_WINDOW_BITS):
+        # Without the large window flag, this is the only way that the
+        # window bits can be invalid.
+        return error(
+            "Decompression error: the stream uses the Large Window Brotli "
+            "format, which must be enabled with large_window=True."
+        )
+    error_message = lib.BrotliDecoderErrorString(error_code)
+    return error(b"Decompression error: %s" % ffi.string(error_message))
+
+
+def _validate_max_memory(val):
+    """
+    Validate that ``max_memory`` is a non-negative number of bytes, if set.
+    """
+    if val is not None and val < 0:
+        raise error("%d is not a valid max_memory, must not be negative"
+                    % val)
+
+
 def _validate_mode(val):
     """
     Validate that the mode is valid.
@@ -166,11 +625,22 @@ def _validate_quality(val):
         )
 
 
-def _validate_lgwin(val):
+def _validate_lgwin(val, large_window=False):
     """
-    Validate that the lgwin setting is valid.
+    Validate that the lgwin setting is valid. Windows above 24 are only valid
+    in the large window format.
     """
-    if not (10 <= val <= 24):
+    if large_window:
+        if not (10 <= val <= 30):
+            raise error(
+                "%d is not a valid lgwin, must be between 10 and 30" % val
+            )
+    elif not (10 <= val <= 24):
+        if 24 < val <= 30:
+            raise error(
+                "%d is not a valid lgwin without large_window=True, must be "
+                "between 10 and 24" % val
+            )
         raise error("%d is not a valid lgwin, must be between 10 and 24" % val)
 
 
@@ -185,24 +655,92 @@ def _validate_lgblock(val):
         )
 
 
+def _validate_stream_offset(val):
+    """
+    Validate that the stream offset setting is valid.
+    """
+    if not (0 <= val <= (1 << 30)):
+        raise error(
+            "%d is not a valid stream offset, must be between 0 and 2**30"
+            % val
+        )
+
+
+def _validate_size_hint(val):
+    """
+    Validate that the size hint fits the encoder's 32-bit parameter.
+    """
+    if not (0 <= val < (1 << 32)):
+        raise error(
+            "%d is not a valid size_hint, must be between 0 and 2**32 - 1"
+            % val
+        )
+
+
+def _validate_flag(val):
+    """
+    Validate that a boolean encoder parameter is 0 or 1.
+    """
+    if val not in (0, 1):  # pragma: no cover
+        raise error("%d is not a valid flag, must be 0 or 1" % val)
+
+
+def _validate_npostfix(val):
+    """
+    Validate that the npostfix setting is valid.
+    """
+    if not (0 <= val <= 3):
+        raise error("%d is not a valid npostfix, must be between 0 and 3"
+                    % val)
+
+
+def _validate_ndirect(val, npostfix=None):
+    """
+    Validate that the ndirect setting is valid. The valid values depend on
+    ``npostfix``: they run from 0 to ``15 << npostfix`` in steps of
+    ``1 << npostfix``. Without ``npostfix`` only the overall range is checked.
+    """
+    if npostfix is None:
+        if not (0 <= val <= 120):
+            raise error("%d is not a valid ndirect, must be between 0 and 120"
+                        % val)
+    elif not (0 <= val <= (15 << npostfix)) or val % (1 << npostfix):
+        raise error(
+            "%d is not a valid ndirect for npostfix %d, must be a multiple "
+            "of %d between 0 and %d"
+            % (val, npostfix, 1 << npostfix, 15 << npostfix)
+        )
+
+
+_PARAMETER_VALIDATORS = {
+    lib.BROTLI_PARAM_MODE: _validate_mode,
+    lib.BROTLI_PARAM_QUALITY: _validate_quality,
+    # The Compressor checks lgwin against its large_window setting itself.
+    lib.BROTLI_PARAM_LGWIN: functools.partial(
+        _validate_lgwin, large_window=True
+    ),
+    lib.BROTLI_PARAM_LARGE_WINDOW: _validate_flag,
+    lib.BROTLI_PARAM_LGBLOCK: _validate_lgblock,
+    lib.BROTLI_PARAM_DISABLE_LITERAL_CONTEXT_MODELING: _validate_flag,
+    lib.BROTLI_PARAM_SIZE_HINT: _validate_size_hint,
+    lib.BROTLI_PARAM_NPOSTFIX: _validate_npostfix,
+    lib.BROTLI_PARAM_NDIRECT: _validate_ndirect,
+    lib.BROTLI_PARAM_STREAM_OFFSET: _validate_stream_offset,
+}
+
+
 def _set_parameter(encoder, parameter, parameter_name, val):
     """
     This helper function sets a specific Brotli encoder parameter, checking
     the return code and raising :class:`Error <brotlicffi.Error>` if it is
     invalid.
     """
-    rc = lib.BrotliEncoderSetParameter(encoder, parameter, val)
-
-    if parameter == lib.BROTLI_PARAM_MODE:
-        _validate_mode(val)
-    elif parameter == lib.BROTLI_PARAM_QUALITY:
-        _validate_quality(val)
-    elif parameter == lib.BROTLI_PARAM_LGWIN:
-        _validate_lgwin(val)
-    elif parameter == lib.BROTLI_PARAM_LGBLOCK:
-        _validate_lgblock(val)
-    else:  # pragma: no cover
+    validator = _PARAMETER_VALIDATORS.get(parameter)
+    if validator is None:  # pragma: no cover
         raise RuntimeError("Unexpected parameter!")
+    validator(val)
+
+    rc = lib.BrotliEncoderSetParameter(encoder, parameter, val)
 
     # This block is defensive: I see no way to hit it, but as long as the
     # function returns a value we can live in hope that the brotli folks will
@@ -213,6 +751,127 @@ def _set_parameter(encoder, parameter, parameter_name, val):
         )
 
 
+class PreparedDictionary(object):
+    """
+    A custom LZ77 dictionary, prepared for use by the encoder.
+
+    Preparing a dictionary builds the hash tables the encoder uses to search
+    it, which can take far longer than compressing a small message with it.
+    Once prepared, a dictionary may be passed to any number of
+    :class:`Compressor` objects, on any thread, at no further cost.
+    :class:`Decompressor` accepts it too, and uses its copy of the data
+    directly.
+
+    Most code should call :func:`prepare_dictionary`, which keeps recently
+    used dictionaries, rather than construct this directly.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the dictionary.
+    :raises: :class:`Error <brotlicffi.Error>` if the dictionary is empty or
+        can't be prepared.
+    """
+    def __init__(self, data):
+        #: The dictionary's contents.
+        self.data = data if isinstance(data, bytes) else bytes(
+            memoryview(data).cast("B")
+        )
+        if not self.data:
+            raise error("A dictionary must not be empty.")
+
+        #: The SHA-256 digest of :attr:`data`.
+        self.digest = hashlib.sha256(self.data).digest()
+
+        # The prepared dictionary refers to this buffer rather than copying
+        # it, so it must stay alive for as long as the dictionary does.
+        self._source = ffi.from_buffer("uint8_t []", self.data)
+        prepared = lib.BrotliEncoderPrepareDictionary(
+            lib.BROTLI_SHARED_DICTIONARY_RAW,
+            len(self.data),
+            self._source,
+            lib.BROTLI_DEFAULT_QUALITY,
+            ffi.NULL,
+            ffi.NULL,
+            ffi.NULL
+        )
+        if not prepared:  # pragma: no cover
+            raise error("Unable to prepare Brotli dictionary!")
+        self._prepared = ffi.gc(
+            prepared, lib.BrotliEncoderDestroyPreparedDictionary
+        )
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def memory_usage(self):
+        """
+        The native memory used by the prepared dictionary, in bytes.
+        """
+        return lib.BrotliEncoderGetPreparedDictionarySize(self._prepared)
+
+
+class _DictionaryCache(object):
+    """
+    A thread-safe LRU cache of prepared dictionaries, keyed by the SHA-256
+    digest of their contents.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, data):
+        with memoryview(data) as view:
+            digest = hashlib.sha256(view).digest()
+        with self._lock:
+            prepared = self._entries.get(digest)
+            if prepared is not None:
+                self._entries.move_to_end(digest)
+                return prepared
+
+        # Prepare outside the lock so that other dictionaries can still be
+        # looked up in the meantime. If two threads race to prepare the same
+        # dictionary, the first one to finish wins.
+        prepared = PreparedDictionary(data)
+        with self._lock:
+            prepared = self._entries.setdefault(digest, prepared)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return prepared
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_dictionary_cache = _DictionaryCache(DICTIONARY_CACHE_SIZE)
+
+
+def prepare_dictionary(data):
+    """
+    Prepare a custom dictionary for the encoder, reusing an earlier
+    preparation of the same contents if there is one.
+
+    The most recently used :data:`DICTIONARY_CACHE_SIZE` dictionaries are
+    kept, so each is typically prepared once per process no matter how many
+    :class:`Compressor` objects use it. :class:`Compressor` calls this
+    itself when given a dictionary as ``bytes``, but passing it the result
+    instead also saves hashing the dictionary each time.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the dictionary, or an already
+        prepared dictionary, which is returned unchanged.
+    :returns: The prepared dictionary.
+    :rtype: :class:`PreparedDictionary`
+    """
+    if isinstance(data, PreparedDictionary):
+        return data
+    return _dictionary_cache.get(data)
+
+
 class Compressor(object):
     """
     An object that allows for streaming compression of data using the Brotli
@@ -239,106 +898,446 @@ class Compressor(object):
 
     :param dictionary: A pre-set dictionary for LZ77. Please use this with
         caution: if a dictionary is used for compression, the same dictionary
-        **must** be used for decompression!
-    :type dictionary: ``bytes``
+        **must** be used for decompression! Dictionaries given as ``bytes``
+        are prepared through :func:`prepare_dictionary`, so each is only
+        prepared once.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+
+    :param size_hint: The expected total size of the input, if known. The
+        encoder uses it to size its tables and to pick faster strategies for
+        small inputs. Defaults to 0, meaning unknown.
+    :type size_hint: ``int``
+
+    :param disable_literal_context_modeling: Whether to turn off literal
+        context modeling, which trades some compression ratio for faster
+        decompression.
+    :type disable_literal_context_modeling: ``bool``
+
+    :param npostfix: The recommended number of postfix bits used in distance
+        codes, from 0 to 3. The encoder may change it.
+    :type npostfix: ``int``
+
+    :param ndirect: The recommended number of direct distance codes, from 0
+        to ``15 << npostfix`` in steps of ``1 << npostfix``. The encoder may
+        change it.
+    :type ndirect: ``int``
+
+    :param large_window: Whether to use the Large Window Brotli format, which
+        allows ``lgwin`` up to 30 (a 1 GiB window). This is **not** standard
+        RFC 7932 Brotli: only decoders that opt in, such as a
+        :class:`Decompressor` with ``large_window=True``, can read it.
+    :type large_window: ``bool``
+
+    :param allocator: Where the encoder's native memory comes from. By
+        default it is allocated with ``malloc``. The encoder cannot recover
+        from a failed allocation, so if the allocator fails, ``malloc`` is
+        used instead.
+    :type allocator: :class:`Allocator` or ``None``
+
+    :param max_memory: The most native memory, in bytes, that the encoder may
+        allocate. The encoder can't be refused memory part-way through a
+        call, so the limit is checked after each call instead: the call that
+        takes the encoder over the limit raises
+        :class:`Error <brotlicffi.Error>`, and the compressor can't be used
+        after that. An encoder with a large ``lgwin`` and a high ``quality``
+        can need hundreds of megabytes.
+    :type max_memory: ``int`` or ``None``
+
+    .. versionchanged:: 1.2.0.2
+       Added ``size_hint``, ``disable_literal_context_modeling``,
+       ``npostfix``, ``ndirect``, ``large_window``, ``allocator`` and
+       ``max_memory`` parameters. The ``dictionary`` parameter, which was
+       documented but never accepted, now works.
     """
     _dictionary = None
     _dictionary_size = None
+    # Set while a views iterator holds the lock, which is reentrant.
+    _views_active = False
 
     def __init__(self,
                  mode=DEFAULT_MODE,
                  quality=lib.BROTLI_DEFAULT_QUALITY,
                  lgwin=lib.BROTLI_DEFAULT_WINDOW,
-                 lgblock=0):
+                 lgblock=0,
+                 dictionary=None,
+                 size_hint=0,
+                 disable_literal_context_modeling=False,
+                 npostfix=0,
+                 ndirect=0,
+                 large_window=False,
+                 allocator=None,
+                 max_memory=None):
+        _validate_max_memory(max_memory)
+        _validate_lgwin(lgwin, large_window)
+        _validate_npostfix(npostfix)
+        _validate_ndirect(ndirect, npostfix)
         self.lock = threading.RLock()
-        enc = lib.BrotliEncoderCreateInstance(
-            ffi.NULL, ffi.NULL, ffi.NULL
+        enc, self._memory = _create_instance(
+            lib.BrotliEncoderCreateInstance,
+            lib.BrotliEncoderDestroyInstance,
+            allocator,
+            may_fail=False,
+            max_memory=max_memory
         )
         if not enc:  # pragma: no cover
             raise RuntimeError("Unable to allocate Brotli encoder!")
 
-        enc = ffi.gc(enc, lib.BrotliEncoderDestroyInstance)
-
         # Configure the encoder appropriately.
+        if large_window:
+            _set_parameter(
+                enc, lib.BROTLI_PARAM_LARGE_WINDOW, "large_window", 1
+            )
         _set_parameter(enc, lib.BROTLI_PARAM_MODE, "mode", mode)
         _set_parameter(enc, lib.BROTLI_PARAM_QUALITY, "quality", quality)
         _set_parameter(enc, lib.BROTLI_PARAM_LGWIN, "lgwin", lgwin)
         _set_parameter(enc, lib.BROTLI_PARAM_LGBLOCK, "lgblock", lgblock)
 
+        # The rest default to off in the encoder, so are only set if used.
+        if size_hint:
+            _set_parameter(
+                enc, lib.BROTLI_PARAM_SIZE_HINT, "size_hint", size_hint
+            )
+        if disable_literal_context_modeling:
+            _set_parameter(
+                enc,
+                lib.BROTLI_PARAM_DISABLE_LITERAL_CONTEXT_MODELING,
+                "disable_literal_context_modeling",
+                1
+            )
+        if npostfix or ndirect:
+            _set_parameter(
+                enc, lib.BROTLI_PARAM_NPOSTFIX, "npostfix", npostfix
+            )
+            _set_parameter(
+                enc, lib.BROTLI_PARAM_NDIRECT, "ndirect", ndirect
+            )
+
+        if dictionary:
+            # The encoder only refers to the prepared dictionary, so keep it
+            # alive alongside the encoder.
+            self._dictionary = prepare_dictionary(dictionary)
+            self._dictionary_size = len(self._dictionary)
+            rc = lib.BrotliEncoderAttachPreparedDictionary(
+                enc, self._dictionary._prepared
+            )
+            if rc != lib.BROTLI_TRUE:  # pragma: no cover
+                raise error("Unable to attach Brotli dictionary!")
+
         self._encoder = enc
 
+        # Scratch state for _compress(), kept so that each call doesn't have
+        # to allocate its own.
+        self._available_in = ffi.new("size_t *")
+        self._next_in = ffi.new("uint8_t **")
+        self._available_out = ffi.new("size_t *")
+        self._next_out = ffi.new("uint8_t **")
+        self._output = None
+
     def _compress(self, data, operation):
         """
         This private method compresses some data in a given mode. This is used
         because almost all of the code uses the exact same setup. It wouldn't
-        have to, but it doesn't hurt at all.
+        have to, but it doesn't hurt at all. ``data`` is ``None`` for no input.
+        The caller is responsible for holding the lock.
         """
-        if not self.lock.acquire(blocking=False):
-            raise error(
-                "Concurrently sharing Compressor objects is not allowed")
+        self._check_memory()
+
+        # Pin the caller's buffer rather than copying it: the encoder only
+        # reads from it for the duration of this call.
+        if data is not None:
+            with ffi.from_buffer("uint8_t []", data) as input_buffer:
+                output_size = self._compress_buffer(
+                    input_buffer, len(input_buffer), operation
+                )
+        else:
+            output_size = self._compress_buffer(_NO_INPUT, 0, operation)
+        self._check_memory()
+
+        result = ffi.buffer(self._output, output_size)[:]
+        if len(self._output) > _MAX_RETAINED_OUTPUT_SIZE:
+            self._output = None
+        return result
+
+    def _locked_compress(self, data, operation):
+        self._acquire()
         try:
-            # The 'algorithm' for working out how big to make this buffer is
-            # from the Brotli source code, brotlimodule.cc.
-            original_output_size = int(
-                math.ceil(len(data) + (len(data) >> 2) + 10240)
+            return self._compress(data, operation)
+        finally:
+            self.lock.release()
+
+    def _compress_buffer(self, input_buffer, input_len, operation, offset=0):
+        """
+        Runs the encoder once over the first ``input_len`` bytes of
+        ``input_buffer``, into the reusable output buffer after the first
+        ``offset`` bytes, which are kept. The pointers passed to the encoder
+        live on the instance, and the output buffer only grows, so a stream
+        of small calls allocates nothing. Returns the size of the output,
+        including the ``offset`` bytes.
+        """
+        # The 'algorithm' for working out how big to make this buffer is
+        # from the Brotli source code, brotlimodule.cc.
+        output_size = offset + input_len + (input_len >> 2) + 10240
+        if self._output is None:
+            self._output = _new_uninitialized("uint8_t []", output_size)
+        elif len(self._output) < output_size:
+            # Grow geometrically, so that inputs creeping up in size don't
+            # reallocate on every call.
+            output = _new_uninitialized(
+                "uint8_t []", max(output_size, 2 * len(self._output))
             )
-            available_out = ffi.new("size_t *")
-            available_out[0] = original_output_size
-            output_buffer = ffi.new("uint8_t []", available_out[0])
-            ptr_to_output_buffer = ffi.new("uint8_t **", output_buffer)
-            input_size = ffi.new("size_t *", len(data))
-            input_buffer = ffi.new("uint8_t []", data)
-            ptr_to_input_buffer = ffi.new("uint8_t **", input_buffer)
+            ffi.memmove(output, self._output, offset)
+            self._output = output
+        output_size = len(self._output)
+
+        self._available_in[0] = input_len
+        self._next_in[0] = input_buffer
+        self._available_out[0] = output_size - offset
+        self._next_out[0] = self._output + offset
+        rc = lib.BrotliEncoderCompressStream(
+            self._encoder,
+            operation,
+            self._available_in,
+            self._next_in,
+            self._available_out,
+            self._next_out,
+            ffi.NULL
+        )
+        # Don't keep referring to the caller's buffer.
+        self._next_in[0] = ffi.NULL
+        if rc != lib.BROTLI_TRUE:  # pragma: no cover
+            raise error("Error encountered compressing data.")
+
+        assert not self._available_in[0]
+        return output_size - self._available_out[0]
+
+    def _compress_vectored(self, buffers, operation):
+        """
+        Feeds each of ``buffers`` to the encoder in turn, then finishes the
+        stream if ``operation`` is ``BROTLI_OPERATION_FINISH``, gathering all
+        of the output in the reusable output buffer. The caller is
+        responsible for holding the lock.
+
+        Large buffers are read in place, and runs of small ones are gathered
+        together first, see :func:`_gather_small_buffers`.
+        """
+        self._check_memory()
+        size = 0
+        for data in _gather_small_buffers(buffers):
+            size = self._compress_piece(data, size)
+
+        if operation == lib.BROTLI_OPERATION_FINISH:
+            while not lib.BrotliEncoderIsFinished(self._encoder):
+                size = self._compress_buffer(_NO_INPUT, 0, operation, size)
+            self._check_memory()
+
+        result = ffi.buffer(self._output, size)[:]
+        if len(self._output) > _MAX_RETAINED_OUTPUT_SIZE:
+            self._output = None
+        return result
+
+    def _compress_piece(self, data, offset):
+        with ffi.from_buffer("uint8_t []", data) as input_buffer:
+            size = self._compress_buffer(
+                input_buffer,
+                len(input_buffer),
+                lib.BROTLI_OPERATION_PROCESS,
+                offset
+            )
+        self._check_memory()
+        return size
+
+    def _compress_into(self, data, out, operation):
+        """
+        This private method runs the encoder once over ``data``, writing
+        straight into the caller's ``out`` buffer. The caller is responsible
+        for holding the lock. Returns a ``(written, consumed)`` tuple.
+        """
+        self._check_memory()
+
+        # The pinned buffers are released on the way out, even on error, so
+        # that callers are free to resize them straight afterwards.
+        with ffi.from_buffer("uint8_t []", data) as input_buffer, \
+                ffi.from_buffer(
+                    "uint8_t []", out, require_writable=True
+                ) as output_buffer:
+            available_in = ffi.new("size_t *", len(input_buffer))
+            next_in = ffi.new("uint8_t **", input_buffer)
+            available_out = ffi.new("size_t *", len(output_buffer))
+            next_out = ffi.new("uint8_t **", output_buffer)
 
             rc = lib.BrotliEncoderCompressStream(
                 self._encoder,
                 operation,
-                input_size,
-                ptr_to_input_buffer,
+                available_in,
+                next_in,
                 available_out,
-                ptr_to_output_buffer,
+                next_out,
                 ffi.NULL
             )
-        finally:
-            self.lock.release()
-        if rc != lib.BROTLI_TRUE:  # pragma: no cover
-            raise error("Error encountered compressing data.")
+            if rc != lib.BROTLI_TRUE:  # pragma: no cover
+                raise error("Error encountered compressing data.")
+            self._check_memory()
 
-        assert not input_size[0]
+            return (
+                len(output_buffer) - available_out[0],
+                len(input_buffer) - available_in[0],
+            )
 
-        size_of_output = original_output_size - available_out[0]
-        return ffi.buffer(output_buffer, size_of_output)[:]
+    def _locked_compress_into(self, data, out, operation):
+        self._acquire()
+        try:
+            return self._compress_into(data, out, operation)
+        finally:
+            self.lock.release()
 
     def compress(self, data):
         """
         Incrementally compress more data.
 
-        :param data: A bytestring containing data to compress.
+        .. versionchanged:: 1.2.0.2
+           ``data`` may be any object supporting the buffer protocol.
+
+        :param data: A bytes-like object containing data to compress. The
+            buffer is read in place rather than copied.
         :returns: A bytestring containing some compressed data. May return the
             empty bytestring if not enough data has been inserted into the
             compressor to create the output yet.
         """
-        return self._compress(data, lib.BROTLI_OPERATION_PROCESS)
+        return self._locked_compress(data, lib.BROTLI_OPERATION_PROCESS)
 
     process = compress
 
+    def compress_into(self, data, out):
+        """
+        Incrementally compress more data, writing the compressed output
+        directly into a caller-supplied buffer instead of returning a new
+        bytestring.
+
+        .. versionadded:: 1.2.0.2
+
+        :param data: A bytes-like object containing data to compress.
+        :param out: A writable bytes-like object that receives compressed
+            data.
+        :returns: A ``(bytes_written, bytes_consumed)`` tuple. If fewer bytes
+            were consumed than ``data`` holds, ``out`` filled up: call again
+            with the remainder of ``data``.
+        :rtype: ``tuple``
+        """
+        return self._locked_compress_into(
+            data, out, lib.BROTLI_OPERATION_PROCESS
+        )
+
+    process_into = compress_into
+
+    def flush_into(self, out):
+        """
+        Flush the compressor into a caller-supplied buffer. This is the
+        in-place equivalent of :meth:`flush`.
+
+        .. versionadded:: 1.2.0.2
+
+        :param out: A writable bytes-like object that receives compressed
+            data.
+        :returns: The number of bytes written. If this equals the size of
+            ``out``, there may be more output: call again with a fresh buffer
+            until a short write is returned.
+        :rtype: ``int``
+        """
+        written, _ = self._locked_compress_into(
+            b'', out, lib.BROTLI_OPERATION_FLUSH
+        )
+        return written
+
+    def finish_into(self, out):
+        """
+        Finish the compressor into a caller-supplied buffer. This is the
+        in-place equivalent of :meth:`finish`.
+
+        .. versionadded:: 1.2.0.2
+
+        :param out: A writable bytes-like object that receives compressed
+            data.
+        :returns: The number of bytes written. If this equals the size of
+            ``out``, there may be more output: call again with a fresh buffer
+            until a short write is returned.
+        :rtype: ``int``
+        """
+        if lib.BrotliEncoderIsFinished(self._encoder) == lib.BROTLI_TRUE:
+            return 0
+        written, _ = self._locked_compress_into(
+            b'', out, lib.BROTLI_OPERATION_FINISH
+        )
+        return written
+
     def flush(self):
         """
         Flush the compressor. This will emit the remaining output data, but
         will not destroy the compressor. It can be used, for example, to ensure
         that given chunks of content will decompress immediately.
         """
-        if not self.lock.acquire(blocking=False):
-            raise error(
-                "Concurrently sharing Compressor objects is not allowed")
+        self._acquire()
         try:
-            chunks = [self._compress(b'', lib.BROTLI_OPERATION_FLUSH)]
+            return self._flush(None)
+        finally:
+            self.lock.release()
 
-            while ((lib.BrotliEncoderHasMoreOutput(self._encoder) ==
-                    lib.BROTLI_TRUE)):
-                chunks.append(self._compress(b'', lib.BROTLI_OPERATION_FLUSH))
+    def compress_message(self, data):
+        """
+        Compress a complete message and flush it, so that it can be
+        decompressed as soon as it arrives. This is equivalent to
+        ``process(data) + flush()``, but hands the input to the encoder
+        together with the flush, which makes it cheaper for streams of small
+        messages, such as server-sent events or WebSocket frames.
+
+        .. versionadded:: 1.2.0.2
+
+        :param data: A bytes-like object containing the message to compress.
+            The buffer is read in place rather than copied.
+        :returns: A bytestring containing the compressed message.
+        """
+        self._acquire()
+        try:
+            return self._flush(data)
+        finally:
+            self.lock.release()
+
+    process_message = compress_message
+
+    def compress_vectored(self, buffers):
+        """
+        Incrementally compress a sequence of buffers, as though they had been
+        joined together, without joining them.
+
+        The buffers are fed to the encoder in turn within a single call, and
+        the output for all of them is returned together. Buffers of 64 KiB
+        or more are read in place; runs of smaller ones are copied into a
+        staging buffer of about 64 KiB first. This avoids both a full-size
+        copy made by ``b''.join()`` and the overhead of a :meth:`process`
+        call per buffer when assembling data from many fragments.
+
+        .. versionadded:: 1.2.0.2
+
+        :param buffers: An iterable of bytes-like objects to compress.
+        :returns: A bytestring containing some compressed data. May return the
+            empty bytestring if not enough data has been inserted into the
+            compressor to create the output yet.
+        """
+        self._acquire()
+        try:
+            return self._compress_vectored(
+                buffers, lib.BROTLI_OPERATION_PROCESS
+            )
         finally:
             self.lock.release()
+
+    process_vectored = compress_vectored
+
+    def _flush(self, data):
+        chunks = [self._compress(data, lib.BROTLI_OPERATION_FLUSH)]
+
+        while ((lib.BrotliEncoderHasMoreOutput(self._encoder) ==
+                lib.BROTLI_TRUE)):
+            chunks.append(self._compress(None, lib.BROTLI_OPERATION_FLUSH))
         return b''.join(chunks)
 
     def finish(self):
@@ -347,18 +1346,154 @@ class Compressor(object):
         transition the compressor to a completed state. The compressor cannot
         be used again after this point, and must be replaced.
         """
-        if not self.lock.acquire(blocking=False):
-            raise error(
-                "Concurrently sharing Compressor objects is not allowed")
+        self._acquire()
         try:
             chunks = []
             while ((lib.BrotliEncoderIsFinished(self._encoder) ==
                     lib.BROTLI_FALSE)):
-                chunks.append(self._compress(b'', lib.BROTLI_OPERATION_FINISH))
+                chunks.append(
+                    self._compress(None, lib.BROTLI_OPERATION_FINISH)
+                )
         finally:
             self.lock.release()
         return b''.join(chunks)
 
+    def compress_views(self, data):
+        """
+        Incrementally compress more data, handing out the compressed output
+        without copying it.
+
+        Returns an iterator of read-only memoryviews of the encoder's own
+        output buffer. Each view is only valid until the iterator is advanced,
+        after which it is released and its memory reused, so it must be
+        consumed straight away, for example by ``socket.sendall()`` or
+        ``os.write()``. The compressor is locked from when the iterator is
+        first advanced, and the iterator must be exhausted before the
+        compressor is used again.
+
+        .. versionadded:: 1.2.0.2
+
+        :param data: A bytes-like object containing data to compress. It is
+            read in place, and must not be modified until the iterator is
+            exhausted.
+        :returns: An iterator of ``memoryview`` objects.
+        """
+        return self._compress_views(data, lib.BROTLI_OPERATION_PROCESS)
+
+    process_views = compress_views
+
+    def flush_views(self):
+        """
+        Flush the compressor, handing out the output as for
+        :meth:`compress_views`.
+
+        .. versionadded:: 1.2.0.2
+
+        :returns: An iterator of ``memoryview`` objects.
+        """
+        return self._compress_views(b'', lib.BROTLI_OPERATION_FLUSH)
+
+    def finish_views(self):
+        """
+        Finish the compressor, handing out the output as for
+        :meth:`compress_views`. The compressor cannot be used again
+        afterwards.
+
+        .. versionadded:: 1.2.0.2
+
+        :returns: An iterator of ``memoryview`` objects.
+        """
+        return self._compress_views(b'', lib.BROTLI_OPERATION_FINISH)
+
+    def _compress_views(self, data, operation):
+        # The lock is only taken once the iterator is started, so that it is
+        # always released, even if the iterator is closed before then.
+        self._acquire()
+        self._views_active = True
+        try:
+            self._check_memory()
+            with ffi.from_buffer("uint8_t []", data) as input_buffer:
+                available_in = ffi.new("size_t *", len(input_buffer))
+                next_in = ffi.new("uint8_t **", input_buffer)
+                # With no room for output, the encoder keeps it all
+                # internally until it is taken.
+                available_out = ffi.new("size_t *", 0)
+                next_out = ffi.new("uint8_t **")
+                while True:
+                    rc = lib.BrotliEncoderCompressStream(
+                        self._encoder,
+                        operation,
+                        available_in,
+                        next_in,
+                        available_out,
+                        next_out,
+                        ffi.NULL
+                    )
+                    if rc != lib.BROTLI_TRUE:  # pragma: no cover
+                        raise error("Error encountered compressing data.")
+                    self._check_memory()
+
+                    for view in _take_output(
+                        self._encoder,
+                        lib.BrotliEncoderHasMoreOutput,
+                        lib.BrotliEncoderTakeOutput
+                    ):
+                        yield view
+
+                    if operation == lib.BROTLI_OPERATION_FINISH:
+                        done = lib.BrotliEncoderIsFinished(self._encoder)
+                    else:
+                        done = not available_in[0]
+                    if done:
+                        return
+        finally:
+            self._views_active = False
+            self.lock.release()
+
+    def _acquire(self):
+        """
+        Takes the lock, raising rather than waiting if another thread holds
+        it, or if this thread does for an unfinished views iterator.
+        """
+        if not self.lock.acquire(blocking=False):
+            raise error(
+                "Concurrently sharing Compressor objects is not allowed")
+        if self._views_active:
+            self.lock.release()
+            raise error(
+                "Compressor used before its views iterator was exhausted")
+
+    def _check_memory(self):
+        """
+        Raises if the encoder has gone over ``max_memory`` at any point.
+        """
+        if self._memory is not None and self._memory.exceeded:
+            raise error(
+                "Compression error: memory limit of %d bytes exceeded."
+                % self._memory.max_memory
+            )
+
+    @property
+    def memory_usage(self):
+        """
+        The native memory currently held by the encoder, in bytes, or
+        ``None`` if the compressor was created without an ``allocator`` or
+        ``max_memory``, in which case it isn't tracked.
+
+        .. versionadded:: 1.2.0.2
+        """
+        return None if self._memory is None else self._memory.usage
+
+    @property
+    def peak_memory_usage(self):
+        """
+        The most native memory the encoder has held at once, in bytes, or
+        ``None`` if it isn't tracked.
+
+        .. versionadded:: 1.2.0.2
+        """
+        return None if self._memory is None else self._memory.peak
+
 
 class Decompressor(object):
     """
@@ -375,43 +1510,107 @@ class Decompressor(object):
     :param dictionary: A pre-set dictionary for LZ77. Please use this with
         caution: if a dictionary is used for compression, the same dictionary
         **must** be used for decompression!
-    :type dictionary: ``bytes``
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+
+    :param large_window: Whether to accept streams in the non-standard Large
+        Window Brotli format, whose window may be as large as 1 GiB. Without
+        it, such streams raise :class:`Error <brotlicffi.Error>`.
+    :type large_window: ``bool``
+
+    :param allocator: Where the decoder's native memory comes from. By
+        default it is allocated with ``malloc``. If the allocator fails,
+        decompression raises :class:`Error <brotlicffi.Error>`.
+    :type allocator: :class:`Allocator` or ``None``
+
+    :param max_memory: The most native memory, in bytes, that the decoder may
+        allocate for its state and ring buffer. Allocations that would exceed
+        it are refused, and decompression raises
+        :class:`Error <brotlicffi.Error>`. The ring buffer is as large as the
+        stream's window, up to 16 MiB.
+    :type max_memory: ``int`` or ``None``
+
+    .. versionchanged:: 1.2.0.2
+       Added ``large_window``, ``allocator`` and ``max_memory`` parameters.
+       ``dictionary`` may be a :class:`PreparedDictionary`.
     """
     _dictionary = None
     _dictionary_size = None
-    _unconsumed_data = None
+    _pending = None
+    _output = None
+    _bytes_in = 0
+    _bytes_out = 0
 
-    def __init__(self, dictionary=b''):
+    def __init__(self,
+                 dictionary=b'',
+                 large_window=False,
+                 allocator=None,
+                 max_memory=None):
+        _validate_max_memory(max_memory)
         self.lock = threading.Lock()
-        dec = lib.BrotliDecoderCreateInstance(ffi.NULL, ffi.NULL, ffi.NULL)
-        self._decoder = ffi.gc(dec, lib.BrotliDecoderDestroyInstance)
-        self._unconsumed_data = b''
+        dec, self._memory = _create_instance(
+            lib.BrotliDecoderCreateInstance,
+            lib.BrotliDecoderDestroyInstance,
+            allocator,
+            may_fail=True,
+            max_memory=max_memory
+        )
+        if not dec:
+            raise error("Unable to allocate Brotli decoder!")
+        self._decoder = dec
+        self._large_window = bool(large_window)
+        if large_window:
+            rc = lib.BrotliDecoderSetParameter(
+                dec, lib.BROTLI_DECODER_PARAM_LARGE_WINDOW, 1
+            )
+            if rc != lib.BROTLI_TRUE:  # pragma: no cover
+                raise error("Error setting parameter large_window: 1")
 
         if dictionary:
-            self._dictionary = ffi.new("uint8_t []", dictionary)
-            self._dictionary_size = len(dictionary)
-            lib.BrotliDecoderSetCustomDictionary(
+            # The decoder refers to the dictionary rather than copying it, so
+            # keep it alive and unchanging alongside the decoder.
+            if isinstance(dictionary, PreparedDictionary):
+                self._dictionary = dictionary._source
+            elif isinstance(dictionary, bytes):
+                self._dictionary = ffi.from_buffer("uint8_t []", dictionary)
+            else:
+                self._dictionary = ffi.from_buffer(
+                    "uint8_t []", bytes(memoryview(dictionary).cast("B"))
+                )
+            self._dictionary_size = len(self._dictionary)
+            rc = lib.BrotliDecoderAttachDictionary(
                 self._decoder,
+                lib.BROTLI_SHARED_DICTIONARY_RAW,
                 self._dictionary_size,
                 self._dictionary
             )
+            if rc != lib.BROTLI_TRUE:  # pragma: no cover
+                raise error("Unable to attach Brotli dictionary!")
 
-    @staticmethod
-    def _calculate_buffer_size(
-        input_data_len, output_buffer_limit, chunks_len, chunks_num
-    ):
-        if output_buffer_limit is not None:
-            return output_buffer_limit - chunks_len
-        # When `decompress(b'')` is called without `output_buffer_limit`.
-        elif input_data_len == 0:
-            # libbrotli would use 32 KB as a starting buffer size and double it
-            # each time, capped at 16 MB.
-            # https://github.com/google/brotli/blob/028fb5a23661f123017c060daa546b55cf4bde29/python/_brotli.c#L291-L292
-            return 1 << min(chunks_num + 15, 24)
+    def _expected_output_size(self, input_size, output_buffer_limit):
+        """
+        Estimates how much output a call with ``input_size`` bytes of input
+        will produce, from the compression ratio of the stream so far.
+        """
+        if self._bytes_in:
+            ratio = self._bytes_out / float(self._bytes_in)
         else:
-            # Allocate a buffer that's hopefully overlarge, but if it's not we
-            # don't mind: we'll spin around again.
-            return 5 * input_data_len
+            ratio = _INITIAL_COMPRESSION_RATIO
+        # A little extra room saves a second round trip when the ratio is
+        # slightly higher than before.
+        size = int(input_size * ratio * 1.125)
+        size = max(min(size, _MAX_INITIAL_OUTPUT_SIZE), _MIN_OUTPUT_SIZE)
+        if output_buffer_limit is not None:
+            size = min(size, output_buffer_limit)
+        return size
+
+    def _output_buffer(self, size):
+        """
+        Returns the reusable output buffer, replacing it with a larger one if
+        it can't hold ``size`` bytes.
+        """
+        if self._output is None or len(self._output) < size:
+            self._output = _new_uninitialized("uint8_t[]", size)
+        return self._output
 
     def decompress(self, data, output_buffer_limit=None):
         """
@@ -420,7 +1619,11 @@ class Decompressor(object):
         .. versionchanged:: 1.2.0
            Added ``output_buffer_limit`` parameter.
 
-        :param data: A bytestring containing Brotli-compressed data.
+        .. versionchanged:: 1.2.0.2
+           ``data`` may be any object supporting the buffer protocol.
+
+        :param data: A bytes-like object containing Brotli-compressed data.
+            The buffer is read in place rather than copied.
         :param output_buffer_limit: Optional maximum size for the output
             buffer. If set, the output buffer will not grow once its size
             equals or exceeds this value. If the limit is reached, further
@@ -434,13 +1637,23 @@ class Decompressor(object):
             raise error(
                 "Concurrently sharing Decompressor instances is not allowed")
         try:
-            chunks = self._decompress(data, output_buffer_limit)
+            return self._decompress(data, output_buffer_limit)
         finally:
             self.lock.release()
-        return b''.join(chunks)
+
+    @property
+    def _unconsumed_data(self):
+        """
+        The input left over from the last call, which the next call decodes
+        before accepting any more.
+        """
+        if self._pending is None:
+            return b''
+        in_buffer, offset = self._pending
+        return ffi.buffer(in_buffer + offset, len(in_buffer) - offset)
 
     def _decompress(self, data, output_buffer_limit):
-        if self._unconsumed_data and data:
+        if self._pending is not None and _nbytes(data):
             raise error(
                 "brotli: decoder process called with data when "
                 "'can_accept_more_data()' is False"
@@ -452,30 +1665,80 @@ class Decompressor(object):
             return b''
 
         # Use unconsumed data if available, use new data otherwise.
-        if self._unconsumed_data:
-            input_data = self._unconsumed_data
-            self._unconsumed_data = b''
+        if self._pending is not None:
+            in_buffer, offset = self._pending
         else:
-            input_data = data
-
-        chunks = []
-        chunks_len = 0
+            in_buffer, offset = ffi.from_buffer("uint8_t[]", data), 0
+        available_in = ffi.new("size_t *", len(in_buffer) - offset)
+        next_in = ffi.new("uint8_t **", in_buffer + offset)
+        try:
+            pieces = self._decompress_pieces(
+                available_in, next_in, output_buffer_limit
+            )
+        except Exception:
+            self._release_input(in_buffer)
+            raise
+        self._bytes_in += len(in_buffer) - offset - available_in[0]
+        self._keep_pending(data, in_buffer, available_in[0])
+
+        if len(pieces) == 1:
+            result = pieces[0][:]
+        else:
+            result = b''.join(pieces)
+        self._bytes_out += len(result)
 
-        available_in = ffi.new("size_t *", len(input_data))
-        in_buffer = ffi.new("uint8_t[]", input_data)
-        next_in = ffi.new("uint8_t **", in_buffer)
+        if len(self._output) > _MAX_RETAINED_OUTPUT_SIZE:
+            self._output = None
+        return result
 
+    def _keep_pending(self, data, in_buffer, remaining):
+        """
+        Keeps the last ``remaining`` bytes of ``in_buffer`` pinned for the
+        next call, with a cursor to where they start, so that draining a
+        large input through a small ``output_buffer_limit`` doesn't copy the
+        rest of it on every call.
+        """
+        if not remaining:
+            self._release_input(in_buffer)
+        elif self._pending is not None or isinstance(data, bytes):
+            # Immutable, so safe to keep referring to.
+            self._pending = (in_buffer, len(in_buffer) - remaining)
+        else:
+            # The caller is free to change or resize their buffer once we
+            # return, so copy what's left of it, once.
+            rest = ffi.buffer(in_buffer + (len(in_buffer) - remaining),
+                              remaining)[:]
+            ffi.release(in_buffer)
+            self._pending = (ffi.from_buffer("uint8_t[]", rest), 0)
+
+    def _release_input(self, in_buffer):
+        self._pending = None
+        # Release the pin straight away, so that callers are free to resize
+        # their buffer.
+        ffi.release(in_buffer)
+
+    def _decompress_pieces(self, available_in, next_in, output_buffer_limit):
+        """
+        Decompresses as much of the input as possible, or until the output
+        reaches ``output_buffer_limit``. Returns the output as a list of
+        ``ffi.buffer`` pieces.
+
+        The output goes into the reusable output buffer, which is sized from
+        the compression ratio so far, so it usually fits in one piece. If it
+        doesn't, it continues in new buffers, each twice the size of the
+        last, so large outputs take few round trips and are never moved.
+        """
+        remaining = output_buffer_limit
+        buffer = self._output_buffer(
+            self._expected_output_size(available_in[0], output_buffer_limit)
+        )
+        pieces = []
         while True:
-            buffer_size = self._calculate_buffer_size(
-                input_data_len=len(input_data),
-                output_buffer_limit=output_buffer_limit,
-                chunks_len=chunks_len,
-                chunks_num=len(chunks),
-            )
-
-            available_out = ffi.new("size_t *", buffer_size)
-            out_buffer = ffi.new("uint8_t[]", buffer_size)
-            next_out = ffi.new("uint8_t **", out_buffer)
+            size = len(buffer)
+            if remaining is not None:
+                size = min(size, remaining)
+            available_out = ffi.new("size_t *", size)
+            next_out = ffi.new("uint8_t **", buffer)
 
             rc = lib.BrotliDecoderDecompressStream(self._decoder,
                                                    available_in,
@@ -483,43 +1746,166 @@ class Decompressor(object):
                                                    available_out,
                                                    next_out,
                                                    ffi.NULL)
-
-            # First, check for errors.
             if rc == lib.BROTLI_DECODER_RESULT_ERROR:
-                error_code = lib.BrotliDecoderGetErrorCode(self._decoder)
-                error_message = lib.BrotliDecoderErrorString(error_code)
+                raise _decoder_error(
+                    self._decoder, self._memory, self._large_window
+                )
+            written = size - available_out[0]
+            pieces.append(ffi.buffer(buffer, written))
+
+            if remaining is not None:
+                remaining -= written
+                if remaining <= 0:
+                    return pieces
+            # The decoder can use up its input and fill the output at the
+            # same time while still holding output back, and then reports
+            # that it needs more input rather than more output.
+            if rc != lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT and not (
+                available_out[0] == 0 and
+                lib.BrotliDecoderHasMoreOutput(self._decoder)
+            ):
+                assert (
+                    rc == lib.BROTLI_DECODER_RESULT_SUCCESS or
+                    available_in[0] == 0
+                )
+                return pieces
+            # The larger buffer is the one to reuse next time.
+            buffer = self._output = _new_uninitialized(
+                "uint8_t[]", 2 * len(buffer)
+            )
+
+    process = decompress
+
+    def decompress_into(self, data, out):
+        """
+        Decompress part of a complete Brotli-compressed string, writing the
+        output directly into a caller-supplied buffer.
+
+        Unlike :meth:`decompress`, input that does not fit is not retained by
+        the decompressor: the caller keeps ownership of it and passes the
+        remainder back in on the next call.
+
+        .. versionadded:: 1.2.0.2
+
+        :param data: A bytes-like object containing Brotli-compressed data.
+        :param out: A writable bytes-like object that receives decompressed
+            data.
+        :returns: A ``(bytes_written, bytes_consumed)`` tuple. If ``out`` was
+            filled, call again (with the unconsumed input, which may be empty)
+            to receive more output.
+        :rtype: ``tuple``
+        """
+        if not self.lock.acquire(blocking=False):
+            raise error(
+                "Concurrently sharing Decompressor instances is not allowed")
+        try:
+            if self._pending is not None:
                 raise error(
-                    b"Decompression error: %s" % ffi.string(error_message)
+                    "brotli: decoder process_into called when "
+                    "'can_accept_more_data()' is False"
                 )
+            written, consumed, _ = self._decompress_into(data, out)
+        finally:
+            self.lock.release()
+        return written, consumed
 
-            # Next, copy the result out.
-            chunk = ffi.buffer(out_buffer, buffer_size - available_out[0])[:]
-            chunks.append(chunk)
-            chunks_len += len(chunk)
+    process_into = decompress_into
 
-            # Save any unconsumed input for the next call.
-            if available_in[0] > 0:
-                remaining_input = ffi.buffer(next_in[0], available_in[0])[:]
-                self._unconsumed_data = remaining_input
+    def decompress_views(self, data):
+        """
+        Decompress part of a complete Brotli-compressed string, handing out
+        the decompressed output without copying it.
+
+        Returns an iterator of read-only memoryviews of the decoder's own
+        ring buffer. Each view is only valid until the iterator is advanced,
+        after which it is released and its memory reused, so it must be
+        consumed straight away, for example by ``socket.sendall()`` or
+        ``os.write()``. The decompressor is locked from when the iterator is
+        first advanced, and the iterator must be exhausted before the
+        decompressor is used again: any input it has not reached yet is
+        dropped if it is closed early.
+
+        .. versionadded:: 1.2.0.2
+
+        :param data: A bytes-like object containing Brotli-compressed data.
+            It is read in place, and must not be modified until the iterator
+            is exhausted.
+        :returns: An iterator of ``memoryview`` objects.
+        """
+        return self._decompress_views(data)
 
-            # Check if we've reached the output limit.
-            if (
-                output_buffer_limit is not None
-                and chunks_len >= output_buffer_limit
-            ):
-                break
+    process_views = decompress_views
 
-            if rc == lib.BROTLI_DECODER_RESULT_NEEDS_MORE_INPUT:
-                assert available_in[0] == 0
-                break
-            elif rc == lib.BROTLI_DECODER_RESULT_SUCCESS:
-                break
-            else:
-                # It's cool if we need more output, we just loop again.
-                assert rc == lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT
-        return chunks
+    def _decompress_views(self, data):
+        # The lock is only taken once the iterator is started, so that it is
+        # always released, even if the iterator is closed before then.
+        if not self.lock.acquire(blocking=False):
+            raise error(
+                "Concurrently sharing Decompressor instances is not allowed")
+        try:
+            if self._pending is not None:
+                raise error(
+                    "brotli: decoder process_views called when "
+                    "'can_accept_more_data()' is False"
+                )
+            with ffi.from_buffer("uint8_t[]", data) as in_buffer:
+                available_in = ffi.new("size_t *", len(in_buffer))
+                next_in = ffi.new("uint8_t **", in_buffer)
+                # With no room for output, the decoder keeps it all in its
+                # ring buffer until it is taken.
+                available_out = ffi.new("size_t *", 0)
+                next_out = ffi.new("uint8_t **")
+                rc = lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT
+                while rc == lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT:
+                    rc = lib.BrotliDecoderDecompressStream(self._decoder,
+                                                           available_in,
+                                                           next_in,
+                                                           available_out,
+                                                           next_out,
+                                                           ffi.NULL)
+                    if rc == lib.BROTLI_DECODER_RESULT_ERROR:
+                        raise _decoder_error(
+                            self._decoder, self._memory, self._large_window
+                        )
+                    for view in _take_output(
+                        self._decoder,
+                        lib.BrotliDecoderHasMoreOutput,
+                        lib.BrotliDecoderTakeOutput
+                    ):
+                        self._bytes_out += len(view)
+                        yield view
+                self._bytes_in += len(in_buffer) - available_in[0]
+        finally:
+            self.lock.release()
 
-    process = decompress
+    def _decompress_into(self, data, out):
+        # The pinned buffers are released on the way out, even on error, so
+        # that callers are free to resize them straight afterwards.
+        with ffi.from_buffer("uint8_t[]", data) as in_buffer, \
+                ffi.from_buffer(
+                    "uint8_t[]", out, require_writable=True
+                ) as out_buffer:
+            available_in = ffi.new("size_t *", len(in_buffer))
+            next_in = ffi.new("uint8_t **", in_buffer)
+            available_out = ffi.new("size_t *", len(out_buffer))
+            next_out = ffi.new("uint8_t **", out_buffer)
+
+            rc = lib.BrotliDecoderDecompressStream(self._decoder,
+                                                   available_in,
+                                                   next_in,
+                                                   available_out,
+                                                   next_out,
+                                                   ffi.NULL)
+            if rc == lib.BROTLI_DECODER_RESULT_ERROR:
+                raise _decoder_error(
+                    self._decoder, self._memory, self._large_window
+                )
+
+            return (
+                len(out_buffer) - available_out[0],
+                len(in_buffer) - available_in[0],
+                rc,
+            )
 
     def flush(self):
         """
@@ -593,7 +1979,7 @@ class Decompressor(object):
                 "Concurrently sharing Decompressor instances is not allowed")
         try:
             ret = True
-            if len(self._unconsumed_data) > 0:
+            if self._pending is not None:
                 ret = False
             if ((lib.BrotliDecoderHasMoreOutput(self._decoder) ==
                  lib.BROTLI_TRUE)):
@@ -601,3 +1987,24 @@ class Decompressor(object):
         finally:
             self.lock.release()
         return ret
+
+    @property
+    def memory_usage(self):
+        """
+        The native memory currently held by the decoder, in bytes, or
+        ``None`` if the decompressor was created without an ``allocator`` or
+        ``max_memory``, in which case it isn't tracked.
+
+        .. versionadded:: 1.2.0.2
+        """
+        return None if self._memory is None else self._memory.usage
+
+    @property
+    def peak_memory_usage(self):
+        """
+        The most native memory the decoder has held at once, in bytes, or
+        ``None`` if it isn't tracked.
+
+        .. versionadded:: 1.2.0.2
+        """
+        return None if self._memory is None else self._memory.peak
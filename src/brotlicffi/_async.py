@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ._api import Compressor, DEFAULT_MODE, Decompressor
+from ._brotlicffi import lib
+
+#: The default amount of compressed data read at a time by
+#: :func:`compress_stream` and :func:`decompress_stream`.
+ASYNC_CHUNK_SIZE = 64 * 1024
+
+#: The default estimated decoding work, in bytes of output, that
+#: :class:`AsyncDecompressor` does on the event loop rather than on the
+#: executor: about a millisecond's worth.
+DECOMPRESS_INLINE_THRESHOLD = 256 * 1024
+
+# Roughly how much input each encoder quality gets through in a millisecond,
+# which is how much work AsyncCompressor does on the event loop by default.
+_COMPRESS_INLINE_THRESHOLDS = (
+    128 * 1024, 96 * 1024, 48 * 1024, 48 * 1024, 24 * 1024, 16 * 1024,
+    12 * 1024, 12 * 1024, 8 * 1024, 6 * 1024, 512, 256
+)
+
+# The output expected from a byte of compressed input, for estimating how
+# long decoding it takes before anything has been decoded.
+_EXPECTED_EXPANSION = 4
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def _get_default_executor():
+    """
+    Returns the thread pool shared by async instances that weren't given an
+    executor, creating it on first use. It is kept separate from the event
+    loop's default executor so that compression can't hold up other work
+    queued there, and is bounded by the number of CPUs since each call keeps
+    a CPU busy.
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix="brotlicffi"
+            )
+        return _default_executor
+
+
+def _input_block_size(quality, lgwin, lgblock):
+    """
+    Returns the amount of input the encoder gathers before compressing it,
+    as chosen by the library.
+    """
+    if quality < 2:
+        # The fast qualities compress input as soon as it arrives.
+        return 1
+    if quality < 4:
+        return 1 << 14
+    if lgblock:
+        return 1 << lgblock
+    if quality >= 9 and lgwin > 16:
+        return 1 << min(18, lgwin)
+    return 1 << 16
+
+
+class _Runner(object):
+    """
+    Runs the calls of one instance in order, either directly on the event
+    loop or on an executor.
+    """
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = None
+        self._running = None
+
+    async def run(self, offload, func, *args):
+        # Created here so that it belongs to the running loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._running is not None and not self._running.done():
+                # A cancelled call may still be running on the executor: it
+                # can't be interrupted, so wait for it to finish.
+                await asyncio.wait([asyncio.wrap_future(self._running)])
+            if not offload:
+                return func(*args)
+            executor = self._executor or _get_default_executor()
+            self._running = executor.submit(func, *args)
+            return await asyncio.wrap_future(self._running)
+
+
+class AsyncCompressor(object):
+    """
+    An object that allows for streaming compression of data from asyncio
+    code, without stalling the event loop.
+
+    Calls that make the encoder do more than a little work, such as those
+    that complete a block of input at a high quality, run on an executor.
+    Calls that only add input to the encoder's buffer, or are otherwise cheap,
+    run directly on the event loop, which saves the cost of a round trip to a
+    thread. Calls on one instance are always run one at a time, in order.
+
+    If a call is cancelled, the data it was given may or may not have been
+    compressed, so the stream should be abandoned.
+
+    .. versionadded:: 1.2.0.2
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: The encoder quality.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size.
+    :type lgblock: ``int``
+
+    :param executor: The :class:`concurrent.futures.Executor` to compress on.
+        By default, a thread pool shared by all async instances and bounded
+        by the number of CPUs is used.
+
+    :param inline_threshold: The most encoding work, in bytes of input, done
+        directly on the event loop. Defaults to about a millisecond's worth
+        at ``quality``; pass ``0`` to offload every call that compresses
+        anything.
+    :type inline_threshold: ``int``
+
+    Any other keyword arguments are passed to :class:`Compressor`.
+    """
+    def __init__(self,
+                 mode=DEFAULT_MODE,
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0,
+                 executor=None,
+                 inline_threshold=None,
+                 **kwargs):
+        self._compressor = Compressor(
+            mode=mode, quality=quality, lgwin=lgwin, lgblock=lgblock, **kwargs
+        )
+        if inline_threshold is None:
+            inline_threshold = _COMPRESS_INLINE_THRESHOLDS[quality]
+        self.inline_threshold = inline_threshold
+        self._block_size = _input_block_size(quality, lgwin, lgblock)
+        self._buffered = 0
+        self._runner = _Runner(executor)
+
+    def _process_work(self, size):
+        # The encoder only compresses its buffered input once it has a whole
+        # block, so until then a call is a cheap copy.
+        self._buffered += size
+        work = self._buffered - self._buffered % self._block_size
+        self._buffered -= work
+        return work
+
+    def _flush_work(self):
+        work, self._buffered = self._buffered, 0
+        return work
+
+    async def compress(self, data):
+        """
+        Incrementally compress more data.
+
+        :param data: A bytes-like object containing data to compress. It must
+            not be modified until the call completes.
+        :returns: A bytestring containing any compressed data.
+        """
+        with memoryview(data) as view:
+            work = self._process_work(view.nbytes)
+        return await self._runner.run(
+            work > self.inline_threshold, self._compressor.process, data
+        )
+
+    process = compress
+
+    async def flush(self):
+        """
+        Flush the compressor, compressing everything given to it so far.
+
+        :returns: A bytestring containing the compressed data.
+        """
+        return await self._runner.run(
+            self._flush_work() > self.inline_threshold, self._compressor.flush
+        )
+
+    async def finish(self):
+        """
+        Finish the compressed stream. The compressor cannot be used again
+        afterwards.
+
+        :returns: A bytestring containing the end of the compressed data.
+        """
+        return await self._runner.run(
+            self._flush_work() > self.inline_threshold, self._compressor.finish
+        )
+
+
+class AsyncDecompressor(object):
+    """
+    An object that allows for streaming decompression of data from asyncio
+    code, without stalling the event loop.
+
+    Calls expected to produce more than ``inline_threshold`` bytes of output
+    run on an executor, and the rest directly on the event loop. The output
+    of each call is estimated from ``output_buffer_limit`` when it is given,
+    so decompressing in limited steps, as :func:`decompress_aiter` does,
+    keeps each step short enough to run inline. Otherwise it is estimated
+    from the compression ratio of the stream so far.
+
+    If a call is cancelled, the data it was given may or may not have been
+    decompressed, so the stream should be abandoned.
+
+    .. versionadded:: 1.2.0.2
+
+    :param executor: The :class:`concurrent.futures.Executor` to decompress
+        on. By default, a thread pool shared by all async instances and
+        bounded by the number of CPUs is used.
+
+    :param inline_threshold: The most estimated output, in bytes, decoded
+        directly on the event loop.
+    :type inline_threshold: ``int``
+
+    Any other keyword arguments are passed to :class:`Decompressor`.
+    """
+    def __init__(self,
+                 executor=None,
+                 inline_threshold=DECOMPRESS_INLINE_THRESHOLD,
+                 **kwargs):
+        self._decompressor = Decompressor(**kwargs)
+        self.inline_threshold = inline_threshold
+        self._runner = _Runner(executor)
+
+    async def decompress(self, data, output_buffer_limit=None):
+        """
+        Decompress part of a complete Brotli-compressed string.
+
+        :param data: A bytes-like object containing Brotli-compressed data.
+            It must not be modified until the call completes.
+        :param output_buffer_limit: As for :meth:`Decompressor.decompress`.
+        :returns: A bytestring containing the decompressed data.
+        """
+        if output_buffer_limit is None:
+            with memoryview(data) as view:
+                work = view.nbytes * self._expansion()
+        else:
+            work = output_buffer_limit
+        return await self._runner.run(
+            work > self.inline_threshold,
+            self._decompressor.decompress,
+            data,
+            output_buffer_limit
+        )
+
+    process = decompress
+
+    def _expansion(self):
+        # Calls are serialized, so these can't change while being read.
+        decompressor = self._decompressor
+        if decompressor._bytes_in:
+            return decompressor._bytes_out / float(decompressor._bytes_in)
+        return _EXPECTED_EXPANSION
+
+    def is_finished(self):
+        """
+        Returns ``True`` if the decompression stream is complete, ``False``
+        otherwise.
+        """
+        return self._decompressor.is_finished()
+
+    def can_accept_more_data(self):
+        """
+        As for :meth:`Decompressor.can_accept_more_data`.
+        """
+        return self._decompressor.can_accept_more_data()
+
+    async def finish(self):
+        """
+        Finish the decompressor, raising if the stream was truncated.
+
+        :returns: An empty bytestring.
+        """
+        return await self._runner.run(False, self._decompressor.finish)
+
+
+async def compress_aiter(chunks, **kwargs):
+    """
+    Compress the chunks of data produced by an async iterable, yielding the
+    compressed stream as it is produced.
+
+    As an async generator, it only compresses more data when the consumer
+    asks for more, so a slow consumer holds up the source rather than
+    letting output pile up in memory.
+
+    .. versionadded:: 1.2.0.2
+
+    :param chunks: An async iterable of bytes-like objects.
+    :param kwargs: Passed to :class:`AsyncCompressor`.
+    :returns: An async iterator of bytestrings.
+    """
+    compressor = AsyncCompressor(**kwargs)
+    async for chunk in chunks:
+        output = await compressor.compress(chunk)
+        if output:
+            yield output
+    output = await compressor.finish()
+    if output:
+        yield output
+
+
+async def decompress_aiter(chunks,
+                           output_chunk_size=ASYNC_CHUNK_SIZE,
+                           **kwargs):
+    """
+    Decompress the chunks of a Brotli stream produced by an async iterable,
+    yielding the decompressed data in pieces of at most
+    ``output_chunk_size`` bytes.
+
+    Each piece is only decoded when the consumer asks for it, so a small,
+    highly compressed input never expands into more than one piece in
+    memory, however large its output.
+
+    .. versionadded:: 1.2.0.2
+
+    :param chunks: An async iterable of bytes-like objects.
+    :param output_chunk_size: The most decompressed data to yield at once.
+    :type output_chunk_size: ``int``
+    :param kwargs: Passed to :class:`AsyncDecompressor`.
+    :returns: An async iterator of bytestrings.
+    :raises: :class:`Error <brotlicffi.Error>` if the stream is invalid or
+        truncated.
+    """
+    decompressor = AsyncDecompressor(**kwargs)
+    async for chunk in chunks:
+        output = await decompressor.decompress(chunk, output_chunk_size)
+        if output:
+            yield output
+        while not decompressor.can_accept_more_data():
+            output = await decompressor.decompress(b'', output_chunk_size)
+            if output:
+                yield output
+    await decompressor.finish()
+
+
+async def _read_chunks(reader, chunk_size):
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _write_all(chunks, writer):
+    async for chunk in chunks:
+        writer.write(chunk)
+        # Wait for the transport to catch up before producing more.
+        await writer.drain()
+
+
+async def compress_stream(reader,
+                          writer,
+                          chunk_size=ASYNC_CHUNK_SIZE,
+                          **kwargs):
+    """
+    Compress everything read from an :class:`asyncio.StreamReader` until
+    EOF, writing the compressed stream to an :class:`asyncio.StreamWriter`.
+    The writer is drained after every write, so a slow peer slows reading
+    down instead of letting output pile up. It is not closed.
+
+    .. versionadded:: 1.2.0.2
+
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param writer: An :class:`asyncio.StreamWriter`.
+    :param chunk_size: The most data to read at a time.
+    :type chunk_size: ``int``
+    :param kwargs: Passed to :class:`AsyncCompressor`.
+    """
+    await _write_all(
+        compress_aiter(_read_chunks(reader, chunk_size), **kwargs), writer
+    )
+
+
+async def decompress_stream(reader,
+                            writer,
+                            chunk_size=ASYNC_CHUNK_SIZE,
+                            **kwargs):
+    """
+    Decompress a Brotli stream read from an :class:`asyncio.StreamReader`
+    until EOF, writing the decompressed data to an
+    :class:`asyncio.StreamWriter` in pieces of at most ``chunk_size`` bytes.
+    The writer is drained after every write, and is not closed.
+
+    .. versionadded:: 1.2.0.2
+
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param writer: An :class:`asyncio.StreamWriter`.
+    :param chunk_size: The most data to read, and to write, at a time.
+    :type chunk_size: ``int``
+    :param kwargs: Passed to :class:`AsyncDecompressor`.
+    :raises: :class:`Error <brotlicffi.Error>` if the stream is invalid or
+        truncated.
+    """
+    await _write_all(
+        decompress_aiter(
+            _read_chunks(reader, chunk_size),
+            output_chunk_size=chunk_size,
+            **kwargs
+        ),
+        writer
+    )
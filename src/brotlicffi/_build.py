@@ -17,7 +17,8 @@ else:
 
 ffi.set_source(
     "_brotlicffi",
-    """#include <brotli/decode.h>
+    """#include <stdlib.h>
+       #include <brotli/decode.h>
        #include <brotli/encode.h>
     """,
     libraries=libraries,
@@ -42,6 +43,23 @@ ffi.cdef("""
        address is 0. */
     typedef void (*brotli_free_func)(void* opaque, void* address);
 
+    /* Callbacks that route the allocations of an encoder or decoder
+       instance to a Python allocator object, passed as |opaque|. */
+    extern "Python" void* _brotlicffi_alloc(void* opaque, size_t size);
+    extern "Python" void _brotlicffi_free(void* opaque, void* address);
+
+    /* stdlib.h */
+    void* malloc(size_t size);
+    void free(void* ptr);
+
+    /* shared_dictionary.h */
+    typedef enum BrotliSharedDictionaryType {
+      /* Raw LZ77 prefix dictionary. */
+      BROTLI_SHARED_DICTIONARY_RAW = 0,
+      /* Serialized shared dictionary. */
+      BROTLI_SHARED_DICTIONARY_SERIALIZED = 1
+    } BrotliSharedDictionaryType;
+
     /* dec/decode.h */
 
     typedef enum {
@@ -55,9 +73,19 @@ ffi.cdef("""
       BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT = 3
     } BrotliDecoderResult;
 
-    typedef enum {...} BrotliDecoderErrorCode;
+    typedef enum {
+      BROTLI_DECODER_ERROR_FORMAT_WINDOW_BITS,
+      ...
+    } BrotliDecoderErrorCode;
     typedef ... BrotliDecoderState;
 
+    typedef enum BrotliDecoderParameter {
+      /* Disable "canny" ring buffer allocation strategy. */
+      BROTLI_DECODER_PARAM_DISABLE_RING_BUFFER_REALLOCATION = 0,
+      /* Flag that determines if "Large Window Brotli" is used. */
+      BROTLI_DECODER_PARAM_LARGE_WINDOW = 1
+    } BrotliDecoderParameter;
+
     /* Creates the instance of BrotliDecoderState and initializes it.
        |alloc_func| and |free_func| MUST be both zero or both non-zero. In the
        case they are both zero, default memory allocators are used. |opaque| is
@@ -69,6 +97,20 @@ ffi.cdef("""
     /* Deinitializes and frees BrotliDecoderState instance. */
     void BrotliDecoderDestroyInstance(BrotliDecoderState* state);
 
+    /* Sets the specified parameter to the given decoder instance. Returns
+       false if parameter is unrecognized, or value is invalid. */
+    BROTLI_BOOL BrotliDecoderSetParameter(BrotliDecoderState* state,
+                                          BrotliDecoderParameter param,
+                                          uint32_t value);
+
+    /* Adds LZ77 prefix dictionary, adds or replaces built-in static
+       dictionary and transforms. Attached dictionary ownership is not
+       transferred; data provided to this method should be kept accessible
+       until decoding is finished and decoder instance is destroyed. */
+    BROTLI_BOOL BrotliDecoderAttachDictionary(
+        BrotliDecoderState* state, BrotliSharedDictionaryType type,
+        size_t data_size, const uint8_t* data);
+
     /* Decompresses the data. Supports partial input and output.
 
        Must be called with an allocated input buffer in |*next_in| and an
@@ -97,6 +139,13 @@ ffi.cdef("""
        Otherwise returns false. */
     BROTLI_BOOL BrotliDecoderHasMoreOutput(const BrotliDecoderState* s);
 
+    /* Acquires pointer to internal output buffer. Returns at most |*size|
+       bytes of output, or all of it if |*size| is 0, setting |*size| to the
+       amount returned. The bytes are considered consumed, and the pointer is
+       only valid until the next call to any decoder function. */
+    const uint8_t* BrotliDecoderTakeOutput(BrotliDecoderState* s,
+                                           size_t* size);
+
     /* Returns true, if decoder has already received some input bytes.
        Otherwise returns false. */
     BROTLI_BOOL BrotliDecoderIsUsed(const BrotliDecoderState* s);
@@ -124,7 +173,30 @@ ffi.cdef("""
       BROTLI_PARAM_LGWIN = 2,
       /* Base 2 logarithm of the maximum input block size. Range is 16 to 24.
          If set to 0, the value will be set based on the quality. */
-      BROTLI_PARAM_LGBLOCK = 3
+      BROTLI_PARAM_LGBLOCK = 3,
+      /* Flag that affects usage of "literal context modeling" format
+         feature. This flag is a "decoding-speed vs compression ratio"
+         trade-off. */
+      BROTLI_PARAM_DISABLE_LITERAL_CONTEXT_MODELING = 4,
+      /* Estimated total input size for all BrotliEncoderCompressStream calls.
+         The default value is 0, which means that the total input size is
+         unknown. */
+      BROTLI_PARAM_SIZE_HINT = 5,
+      /* Flag that determines if "Large Window Brotli" is used. If set,
+         BROTLI_PARAM_LGWIN may be up to 30, and the output is not a standard
+         RFC 7932 stream. */
+      BROTLI_PARAM_LARGE_WINDOW = 6,
+      /* Recommended number of postfix bits (NPOSTFIX). Encoder may change
+         this value. Range is from 0 to 3. */
+      BROTLI_PARAM_NPOSTFIX = 7,
+      /* Recommended number of direct distance codes (NDIRECT). Encoder may
+         change this value. Range is from 0 to (15 << NPOSTFIX) in steps of
+         (1 << NPOSTFIX). */
+      BROTLI_PARAM_NDIRECT = 8,
+      /* Number of bytes of input stream already processed by a different
+         instance. If not 0, the stream header is omitted, so the output can
+         be appended to the flushed output of the "predecessor" encoder. */
+      BROTLI_PARAM_STREAM_OFFSET = 9
     } BrotliEncoderParameter;
 
     typedef enum BrotliEncoderMode {
@@ -162,6 +234,36 @@ ffi.cdef("""
     /* Deinitializes and frees BrotliEncoderState instance. */
     void BrotliEncoderDestroyInstance(BrotliEncoderState* state);
 
+    typedef ... BrotliEncoderPreparedDictionary;
+
+    /* Prepares a shared dictionary from the given file format for the
+       encoder. Returns NULL on failure. A prepared raw dictionary refers to
+       |data| rather than copying it, so it must be kept accessible for as
+       long as the prepared dictionary is used. */
+    BrotliEncoderPreparedDictionary* BrotliEncoderPrepareDictionary(
+        BrotliSharedDictionaryType type, size_t data_size,
+        const uint8_t* data, int quality,
+        brotli_alloc_func alloc_func, brotli_free_func free_func,
+        void* opaque);
+
+    void BrotliEncoderDestroyPreparedDictionary(
+        BrotliEncoderPreparedDictionary* dictionary);
+
+    /* Attaches a prepared dictionary of any type to the encoder. Can be used
+       multiple times to attach multiple dictionaries. Attaching does not
+       transfer ownership, so the dictionary must outlive the encoder. */
+    BROTLI_BOOL BrotliEncoderAttachPreparedDictionary(
+        BrotliEncoderState* state,
+        const BrotliEncoderPreparedDictionary* dictionary);
+
+    /* Returns the memory used by a prepared dictionary. */
+    size_t BrotliEncoderGetPreparedDictionarySize(
+        const BrotliEncoderPreparedDictionary* dictionary);
+
+    /* Calculates the output size bound for the given |input_size|.
+       Returns 0 if the result does not fit size_t. */
+    size_t BrotliEncoderMaxCompressedSize(size_t input_size);
+
     /* Compresses the data in |input_buffer| into |encoded_buffer|, and sets
        |*encoded_size| to the compressed length.
        BROTLI_DEFAULT_QUALITY, BROTLI_DEFAULT_WINDOW and BROTLI_DEFAULT_MODE
@@ -201,6 +303,14 @@ ffi.cdef("""
        Works only with BrotliEncoderCompressStream workflow.
        Returns 1 if has more output (in internal buffer) and 0 otherwise. */
     BROTLI_BOOL BrotliEncoderHasMoreOutput(BrotliEncoderState* s);
+
+    /* Acquires pointer to internal output buffer. Returns at most |*size|
+       bytes of output, or all of it if |*size| is 0, setting |*size| to the
+       amount returned. The bytes are considered consumed, and the pointer is
+       only valid until the next call to any encoder function.
+       Works only with BrotliEncoderCompressStream workflow. */
+    const uint8_t* BrotliEncoderTakeOutput(BrotliEncoderState* s,
+                                           size_t* size);
 """)
 
 if __name__ == '__main__':
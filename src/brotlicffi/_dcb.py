@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import threading
+
+from ._api import (
+    Compressor, DEFAULT_MODE, Decompressor, PreparedDictionary, error,
+    prepare_dictionary
+)
+from ._brotlicffi import lib
+
+#: The magic number that starts every dictionary-compressed Brotli (``dcb``)
+#: stream.
+DCB_MAGIC = b"\xff\x44\x43\x42"
+
+# A dcb stream is the magic number, then the SHA-256 digest of the
+# dictionary, then a Brotli stream compressed with the dictionary as a raw
+# LZ77 prefix dictionary.
+_DIGEST_SIZE = 32
+DCB_HEADER_SIZE = len(DCB_MAGIC) + _DIGEST_SIZE
+
+
+class DictionaryRegistry(object):
+    """
+    A thread-safe collection of dictionaries, looked up by the SHA-256
+    digest of their contents, as used by the ``dcb`` content encoding and the
+    ``Available-Dictionary`` HTTP header.
+
+    Only the encoder needs a dictionary prepared, so dictionaries added as
+    ``bytes`` are prepared the first time :meth:`get` returns them. A
+    :class:`DCBDecompressor` uses their contents directly.
+
+    .. versionadded:: 1.2.0.2
+
+    :param dictionaries: Dictionaries to add straight away.
+    """
+    def __init__(self, dictionaries=()):
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        for dictionary in dictionaries:
+            self.add(dictionary)
+
+    def add(self, dictionary):
+        """
+        Add a dictionary to the registry.
+
+        :param dictionary: The dictionary.
+        :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+        :returns: The dictionary's SHA-256 digest.
+        :rtype: ``bytes``
+        """
+        if isinstance(dictionary, PreparedDictionary):
+            digest = dictionary.digest
+        else:
+            # Copy it, so that it can't change after it has been hashed.
+            dictionary = bytes(memoryview(dictionary).cast("B"))
+            if not dictionary:
+                raise error("A dictionary must not be empty.")
+            digest = hashlib.sha256(dictionary).digest()
+        with self._lock:
+            self._dictionaries[digest] = dictionary
+        return digest
+
+    def remove(self, digest):
+        """
+        Remove the dictionary with the given digest, if there is one.
+        """
+        with self._lock:
+            self._dictionaries.pop(digest, None)
+
+    def get(self, digest, default=None):
+        """
+        Return the :class:`PreparedDictionary` with the given SHA-256 digest,
+        or ``default`` if there isn't one.
+        """
+        with self._lock:
+            dictionary = self._dictionaries.get(digest)
+        if dictionary is None:
+            return default
+        if isinstance(dictionary, PreparedDictionary):
+            return dictionary
+
+        # Prepare it without holding the lock, as that can take a while.
+        prepared = prepare_dictionary(dictionary)
+        with self._lock:
+            if self._dictionaries.get(digest) is dictionary:
+                self._dictionaries[digest] = prepared
+        return prepared
+
+    def _get_data(self, digest):
+        # The contents of the dictionary with the given digest, or None,
+        # without preparing it.
+        with self._lock:
+            dictionary = self._dictionaries.get(digest)
+        if isinstance(dictionary, PreparedDictionary):
+            return dictionary.data
+        return dictionary
+
+    def __contains__(self, digest):
+        with self._lock:
+            return digest in self._dictionaries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dictionaries)
+
+
+class DCBCompressor(object):
+    """
+    An object that allows for streaming compression of data into the
+    dictionary-compressed Brotli (``dcb``) format of the Compression
+    Dictionary Transport HTTP extension: a Brotli stream compressed against
+    a shared dictionary, prefixed with a header that identifies the
+    dictionary by its SHA-256 digest.
+
+    The header is emitted with the first output, so the methods can be used
+    exactly like those of :class:`Compressor`.
+
+    .. versionadded:: 1.2.0.2
+
+    :param dictionary: The dictionary to compress against, which the client
+        already has.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: The encoder quality.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size. ``dcb``
+        limits the window to 16 MiB, which is also Brotli's standard limit.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size.
+    :type lgblock: ``int``
+    """
+    def __init__(self,
+                 dictionary,
+                 mode=DEFAULT_MODE,
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0):
+        prepared = prepare_dictionary(dictionary)
+        self._compressor = Compressor(
+            mode=mode,
+            quality=quality,
+            lgwin=lgwin,
+            lgblock=lgblock,
+            dictionary=prepared
+        )
+        self._header = DCB_MAGIC + prepared.digest
+
+    def _with_header(self, data):
+        if self._header is None:
+            return data
+        header, self._header = self._header, None
+        return header + data
+
+    def compress(self, data):
+        """
+        Incrementally compress more data.
+
+        :param data: A bytes-like object containing data to compress.
+        :returns: A bytestring containing the stream header, on the first
+            call, and any compressed data.
+        """
+        return self._with_header(self._compressor.process(data))
+
+    process = compress
+
+    def flush(self):
+        """
+        Flush the compressor, returning everything written so far in a form
+        the client can decode.
+        """
+        return self._with_header(self._compressor.flush())
+
+    def finish(self):
+        """
+        Finish the stream. The compressor cannot be used again afterwards.
+        """
+        return self._with_header(self._compressor.finish())
+
+
+class DCBDecompressor(object):
+    """
+    An object that allows for streaming decompression of dictionary-compressed
+    Brotli (``dcb``) data.
+
+    The header is read from the start of the input as it arrives, and the
+    dictionary it names is looked up in ``dictionaries``. The payload is then
+    decompressed as it streams in, without buffering it.
+
+    .. versionadded:: 1.2.0.2
+
+    :param dictionaries: Where to look up dictionaries by their SHA-256
+        digest: a :class:`DictionaryRegistry`, or any mapping from digests to
+        dictionaries.
+
+    :raises: :class:`Error <brotlicffi.Error>` from :meth:`decompress` if the
+        input isn't a ``dcb`` stream, or uses a dictionary that isn't in
+        ``dictionaries``.
+    """
+    def __init__(self, dictionaries):
+        self._dictionaries = dictionaries
+        self._header = b''
+        self._decompressor = None
+
+    def decompress(self, data, output_buffer_limit=None):
+        """
+        Decompress part of a ``dcb`` stream.
+
+        :param data: A bytes-like object containing the next part of the
+            stream.
+        :param output_buffer_limit: As for :meth:`Decompressor.decompress`.
+        :returns: A bytestring containing the decompressed data.
+        """
+        if self._decompressor is not None:
+            return self._decompressor.decompress(data, output_buffer_limit)
+
+        with memoryview(data) as view, view.cast("B") as byte_view:
+            needed = DCB_HEADER_SIZE - len(self._header)
+            self._header += byte_view[:needed]
+            rest = byte_view[needed:]
+            if not DCB_MAGIC.startswith(self._header[:len(DCB_MAGIC)]):
+                raise error("Not a dcb stream: bad magic number.")
+            if len(self._header) < DCB_HEADER_SIZE:
+                return b''
+
+            self._decompressor = Decompressor(
+                dictionary=self._find_dictionary()
+            )
+            return self._decompressor.decompress(rest, output_buffer_limit)
+
+    process = decompress
+
+    def _find_dictionary(self):
+        # The decoder uses the dictionary's contents as they are, so there's
+        # no need to prepare it, which only helps the encoder.
+        digest = self._header[len(DCB_MAGIC):]
+        actual = None
+        if isinstance(self._dictionaries, DictionaryRegistry):
+            # The registry hashed its dictionaries when they were added.
+            dictionary = self._dictionaries._get_data(digest)
+            actual = digest
+        else:
+            dictionary = self._dictionaries.get(digest)
+            if isinstance(dictionary, PreparedDictionary):
+                actual = dictionary.digest
+            elif dictionary is not None:
+                actual = hashlib.sha256(dictionary).digest()
+        if dictionary is None:
+            raise error(
+                "Unknown dcb dictionary: no dictionary has SHA-256 digest %s."
+                % digest.hex()
+            )
+        if actual != digest:
+            raise error(
+                "Wrong dcb dictionary: the dictionary given for SHA-256 "
+                "digest %s has a different digest." % digest.hex()
+            )
+        return dictionary
+
+    @property
+    def dictionary_digest(self):
+        """
+        The SHA-256 digest of the stream's dictionary, or ``None`` if the
+        header hasn't been read yet.
+        """
+        if self._decompressor is None:
+            return None
+        return self._header[len(DCB_MAGIC):]
+
+    def is_finished(self):
+        """
+        Returns ``True`` if the stream is complete, ``False`` otherwise.
+        """
+        return (
+            self._decompressor is not None and
+            self._decompressor.is_finished()
+        )
+
+    def can_accept_more_data(self):
+        """
+        As for :meth:`Decompressor.can_accept_more_data`.
+        """
+        return (
+            self._decompressor is None or
+            self._decompressor.can_accept_more_data()
+        )
+
+    def finish(self):
+        """
+        Finish the decompressor, raising if the stream was truncated.
+        """
+        if not self.is_finished():
+            raise error("Decompression error: incomplete compressed stream.")
+        return b''
+
+
+def compress_dcb(data,
+                 dictionary,
+                 mode=DEFAULT_MODE,
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0):
+    """
+    Compress a string into the dictionary-compressed Brotli (``dcb``) format
+    against ``dictionary``. See :class:`DCBCompressor`.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the data to compress.
+    :param dictionary: The dictionary to compress against.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+    :returns: The ``dcb`` stream.
+    :rtype: ``bytes``
+    """
+    compressor = DCBCompressor(
+        dictionary, mode=mode, quality=quality, lgwin=lgwin, lgblock=lgblock
+    )
+    return compressor.process(data) + compressor.finish()
+
+
+def decompress_dcb(data, dictionaries):
+    """
+    Decompress a complete dictionary-compressed Brotli (``dcb``) stream,
+    looking its dictionary up in ``dictionaries``. See
+    :class:`DCBDecompressor`.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the ``dcb`` stream.
+    :param dictionaries: A :class:`DictionaryRegistry`, or any mapping from
+        SHA-256 digests to dictionaries.
+    :returns: The decompressed data.
+    :rtype: ``bytes``
+    """
+    decompressor = DCBDecompressor(dictionaries)
+    result = decompressor.process(data)
+    decompressor.finish()
+    return result
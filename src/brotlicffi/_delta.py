@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from ._api import (
+    Compressor, DEFAULT_MODE, Decompressor, PreparedDictionary, error,
+    _MAX_SIZE_HINT
+)
+from ._brotlicffi import lib
+
+# The encoder's sliding window is 16 bytes short of 2 ** lgwin.
+_WINDOW_GAP = 16
+
+# The window sizes of standard and Large Window Brotli.
+_MIN_LGWIN = 10
+_MAX_LGWIN = 24
+_MAX_LARGE_LGWIN = 30
+
+# The encoder's faster hashers, used below quality 5, don't search custom
+# dictionaries at all.
+_MIN_DELTA_QUALITY = 5
+
+
+def _delta_window(reference_size):
+    """
+    Returns the ``lgwin`` and ``large_window`` settings for a delta against a
+    reference of ``reference_size`` bytes: the smallest window that holds the
+    whole reference, so that the new version can refer to its own content as
+    far back as it can refer to the reference's.
+    """
+    lgwin = max(
+        (reference_size + _WINDOW_GAP - 1).bit_length(),
+        _MIN_LGWIN
+    )
+    if lgwin > _MAX_LARGE_LGWIN:
+        raise error(
+            "A reference of %d bytes is too large for delta compression, "
+            "which supports up to %d bytes"
+            % (reference_size,
+               (1 << _MAX_LARGE_LGWIN) - _WINDOW_GAP)
+        )
+    return lgwin, lgwin > _MAX_LGWIN
+
+
+def compress_delta(reference,
+                   new,
+                   mode=DEFAULT_MODE,
+                   quality=lib.BROTLI_DEFAULT_QUALITY):
+    """
+    Compress a new version of some data against an older version that the
+    reader already has, so that only the differences take up space.
+
+    The reference is used as a custom dictionary, and the window is sized to
+    hold the whole reference. References over 16 MiB need a larger window
+    than standard Brotli allows, so their deltas use the Large Window Brotli
+    format, which :func:`decompress_delta` always accepts.
+
+    .. versionadded:: 1.2.0.2
+
+    :param reference: The old version. To compress several deltas against the
+        same reference, pass a :class:`PreparedDictionary` of it to save
+        preparing it each time.
+    :type reference: ``bytes`` or :class:`PreparedDictionary`
+
+    :param new: A bytes-like object containing the new version.
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: The encoder quality, from 5 to 11. Lower qualities don't
+        search custom dictionaries.
+    :type quality: ``int``
+
+    :returns: The delta, a Brotli stream that :func:`decompress_delta` turns
+        back into ``new`` given the same reference.
+    :rtype: ``bytes``
+    """
+    if quality < _MIN_DELTA_QUALITY:
+        raise error(
+            "%d is not a valid quality for delta compression, must be at "
+            "least %d" % (quality, _MIN_DELTA_QUALITY)
+        )
+    if not isinstance(reference, PreparedDictionary):
+        # References are typically large and used once, so aren't worth a
+        # place in the shared dictionary cache.
+        reference = PreparedDictionary(reference)
+
+    lgwin, large_window = _delta_window(len(reference))
+    with memoryview(new) as view, view.cast("B") as byte_view:
+        compressor = Compressor(
+            mode=mode,
+            quality=quality,
+            lgwin=lgwin,
+            large_window=large_window,
+            dictionary=reference,
+            size_hint=min(len(byte_view), _MAX_SIZE_HINT),
+        )
+        return compressor.process(byte_view) + compressor.finish()
+
+
+def decompress_delta(reference, delta):
+    """
+    Reconstruct the new version of some data from the reference it was
+    compressed against by :func:`compress_delta` and the delta.
+
+    .. versionadded:: 1.2.0.2
+
+    :param reference: The old version, exactly as given to
+        :func:`compress_delta`.
+    :type reference: ``bytes`` or :class:`PreparedDictionary`
+
+    :param delta: A bytes-like object containing the delta.
+
+    :returns: The new version.
+    :rtype: ``bytes``
+
+    :raises: :class:`Error <brotlicffi.Error>` if the delta is invalid. A
+        delta decoded against the wrong reference typically produces wrong
+        output rather than an error.
+    """
+    decompressor = Decompressor(dictionary=reference, large_window=True)
+    result = decompressor.decompress(delta)
+    decompressor.finish()
+    return result
@@ -0,0 +1,710 @@
+# -*- coding: utf-8 -*-
+import builtins
+import errno
+import io
+import os
+import threading
+import time
+import weakref
+
+from ._api import Compressor, Decompressor, DEFAULT_MODE
+from ._brotlicffi import lib
+
+#: The size of the chunks of compressed data read from the underlying file.
+BUFFER_SIZE = 64 * 1024
+
+#: The default size of the staging buffer that :class:`BrotliWriter` gathers
+#: small writes into before handing them to the encoder.
+WRITE_BUFFER_SIZE = 128 * 1024
+
+_MODE_CLOSED = 0
+_MODE_READ = 1
+_MODE_WRITE = 2
+
+
+def _open_fileobj(filename, mode):
+    """
+    Returns a ``(fileobj, should_close)`` tuple for ``filename``, which is
+    either a path to open in ``mode`` or an already open file object.
+    """
+    if isinstance(filename, (str, bytes, os.PathLike)):
+        return builtins.open(filename, mode), True
+    elif hasattr(filename, "read") or hasattr(filename, "write"):
+        return filename, False
+    raise TypeError("filename must be a str, bytes, file or PathLike object")
+
+
+class _DecompressReader(io.RawIOBase):
+    """
+    Adapts a :class:`Decompressor <brotlicffi.Decompressor>` to the
+    ``RawIOBase`` reader API, decompressing straight into the buffer supplied
+    to :meth:`readinto`.
+
+    Memory use is bounded by :data:`BUFFER_SIZE` of pending compressed input
+    plus the decoder's own window, regardless of the compression ratio.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        self._eof = False
+        # Current offset in the decompressed stream.
+        self._pos = 0
+        # Size of the decompressed stream, once known, for SEEK_END.
+        self._size = -1
+        self._decompressor = Decompressor()
+        self._input = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._fp.seekable()
+
+    def close(self):
+        self._decompressor = None
+        self._input = None
+        return super(_DecompressReader, self).close()
+
+    def readinto(self, b):
+        with memoryview(b) as view, view.cast("B") as byte_view:
+            if self._eof or not len(byte_view):
+                return 0
+
+            while True:
+                written, consumed = self._decompressor.process_into(
+                    self._input, byte_view
+                )
+                self._input = self._input[consumed:]
+                if written:
+                    self._pos += written
+                    return written
+
+                if self._decompressor.is_finished():
+                    # Anything after the end of the stream is ignored, just
+                    # as it is by decompress().
+                    self._eof = True
+                    self._size = self._pos
+                    return 0
+
+                if not self._input:
+                    rawblock = self._fp.read(BUFFER_SIZE)
+                    if not rawblock:
+                        raise EOFError(
+                            "Compressed file ended before the end-of-stream "
+                            "marker was reached"
+                        )
+                    self._input = memoryview(rawblock)
+
+    def _rewind(self):
+        self._fp.seek(0)
+        self._eof = False
+        self._pos = 0
+        self._decompressor = Decompressor()
+        self._input = memoryview(b'')
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Recalculate offset as an absolute position in the decompressed
+        # stream.
+        if whence == io.SEEK_SET:
+            pass
+        elif whence == io.SEEK_CUR:
+            offset = self._pos + offset
+        elif whence == io.SEEK_END:
+            if self._size < 0:
+                self._skip(-1)
+            offset = self._size + offset
+        else:
+            raise ValueError("Invalid value for whence: %r" % (whence,))
+
+        # Like gzip, clamp seeks before the start of the stream to it, which
+        # _skip() would otherwise take as a request to read to the end.
+        offset = max(offset, 0)
+        if offset < self._pos:
+            self._rewind()
+        self._skip(offset - self._pos)
+        return self._pos
+
+    def _skip(self, count):
+        """
+        Decompresses and discards ``count`` bytes, or everything up to the
+        end of the stream if ``count`` is negative.
+        """
+        scratch = bytearray(io.DEFAULT_BUFFER_SIZE)
+        with memoryview(scratch) as view:
+            while count:
+                limit = len(view) if count < 0 else min(len(view), count)
+                read = self.readinto(view[:limit])
+                if not read:
+                    break
+                if count > 0:
+                    count -= read
+
+    def tell(self):
+        return self._pos
+
+
+class BrotliWriter(io.BufferedIOBase):
+    """
+    A writable binary stream that compresses everything written to it and
+    writes the compressed data to ``sink``.
+
+    Small writes are gathered into a staging buffer of ``buffer_size`` bytes
+    and passed to the encoder in large batches, rather than paying for a trip
+    into the encoder on every call. Writes at least as large as the staging
+    buffer skip it and are compressed straight from the caller's buffer.
+    Compressed output is written to ``sink`` from a reused output buffer, so
+    steady-state writing performs no allocations.
+
+    :meth:`flush` compresses anything staged and flushes the encoder, so that
+    everything written so far can be decompressed by the reader. Closing the
+    writer finishes the Brotli stream but does not close ``sink``.
+
+    Flushing costs some compression ratio, so rather than flushing after
+    every write, a writer can be told to flush automatically: once
+    ``flush_bytes`` bytes have been written since the last flush, or once
+    ``flush_interval`` seconds have passed since the first write after it,
+    whichever comes first. Explicit calls to :meth:`flush`, for example at
+    record boundaries, reset both. The interval is kept by a timer thread,
+    one per writer, started by the first write and stopped by
+    :meth:`close`, so the caller doesn't need to poll, but it means that
+    ``sink`` may be written to and flushed from that thread. An exception
+    raised by a timed flush is raised again by the next call on the writer.
+
+    .. versionadded:: 1.2.0.2
+
+    :param sink: A writable binary file object, such as a file, socket file
+        or :class:`io.BytesIO`, that receives the compressed data. It must be
+        blocking: if a non-blocking raw sink can't accept any output,
+        :exc:`BlockingIOError` is raised and the stream can't be resumed.
+
+    :param buffer_size: The size of the staging buffer, in bytes.
+    :type buffer_size: ``int``
+
+    :param quality: Controls the compression-speed vs compression-density
+        tradeoffs. The higher the quality, the slower the compression. The
+        range of this value is 0 to 11.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size. The range of
+        this value is 10 to 24.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size. The
+        range of this value is 16 to 24. If set to 0, the value will be set
+        based on ``quality``.
+    :type lgblock: ``int``
+
+    :param encoder_mode: The encoder mode.
+    :type encoder_mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param flush_bytes: If set, flush automatically once this many
+        uncompressed bytes have been written since the last flush.
+    :type flush_bytes: ``int`` or ``None``
+
+    :param flush_interval: If set, flush automatically at most this many
+        seconds after data is written, so that it reaches ``sink`` within a
+        bounded time.
+    :type flush_interval: ``float`` or ``None``
+    """
+    def __init__(self,
+                 sink,
+                 buffer_size=WRITE_BUFFER_SIZE,
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0,
+                 encoder_mode=DEFAULT_MODE,
+                 flush_bytes=None,
+                 flush_interval=None):
+        if buffer_size <= 0:
+            raise ValueError("buffer_size must be greater than zero")
+        if flush_bytes is not None and flush_bytes <= 0:
+            raise ValueError("flush_bytes must be greater than zero")
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError("flush_interval must be greater than zero")
+
+        self._compressor = Compressor(
+            mode=encoder_mode,
+            quality=quality,
+            lgwin=lgwin,
+            lgblock=lgblock
+        )
+        self._sink = sink
+        self._closed = False
+        # Number of uncompressed bytes written so far.
+        self._pos = 0
+        self._staging = bytearray(buffer_size)
+        self._staged = 0
+        self._out = memoryview(bytearray(buffer_size))
+
+        self._flush_bytes = flush_bytes
+        self._flush_interval = flush_interval
+        # Number of uncompressed bytes written since the last flush.
+        self._unflushed = 0
+        # When the timer thread should next flush, or None if it shouldn't.
+        self._deadline = None
+        self._timer = None
+        self._timer_error = None
+        # Serialises writes with flushes made by the timer thread, which
+        # waits on the condition for the deadline to pass or change. It is
+        # reentrant because the timer thread may be the one to close a
+        # writer that is collected without being closed.
+        self._lock = threading.RLock()
+        self._timer_condition = threading.Condition(self._lock)
+
+    def _check_not_closed(self):
+        if self._closed:
+            raise ValueError("I/O operation on closed file")
+        if self._timer_error is not None:
+            error, self._timer_error = self._timer_error, None
+            raise error
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def writable(self):
+        self._check_not_closed()
+        return True
+
+    def write(self, data):
+        """
+        Compress ``data``, returning the number of uncompressed bytes
+        accepted, which is always all of them.
+        """
+        with self._lock:
+            self._check_not_closed()
+            with memoryview(data) as view, view.cast("B") as byte_view:
+                length = len(byte_view)
+                self._stage(byte_view)
+            self._pos += length
+            if length:
+                self._unflushed += length
+                if (self._flush_bytes is not None and
+                        self._unflushed >= self._flush_bytes):
+                    self._flush()
+                elif (self._flush_interval is not None and
+                        self._deadline is None):
+                    self._arm_timer()
+        return length
+
+    def _stage(self, byte_view):
+        length = len(byte_view)
+        end = self._staged + length
+        if end <= len(self._staging):
+            self._staging[self._staged:end] = byte_view
+            self._staged = end
+            if end == len(self._staging):
+                self._compress_staged()
+        else:
+            self._compress_staged()
+            if length >= len(self._staging):
+                self._compress(byte_view)
+            else:
+                self._staging[:length] = byte_view
+                self._staged = length
+
+    def flush(self):
+        """
+        Compress any staged data and flush the encoder, so that everything
+        written so far can be decompressed, then flush ``sink``.
+        """
+        with self._lock:
+            self._check_not_closed()
+            self._flush()
+
+    def _flush(self):
+        self._unflushed = 0
+        self._deadline = None
+        self._compress_staged()
+        self._drain(self._compressor.flush_into)
+        if hasattr(self._sink, "flush"):
+            self._sink.flush()
+
+    def _arm_timer(self):
+        self._deadline = time.monotonic() + self._flush_interval
+        if self._timer is None:
+            self._timer = threading.Thread(
+                target=_run_flush_timer,
+                args=(weakref.ref(self), self._timer_condition),
+                name="BrotliWriter flush timer",
+                daemon=True
+            )
+            self._timer.start()
+        else:
+            self._timer_condition.notify()
+
+    def _timed_flush(self):
+        # Flush if the deadline has passed, then return how long the timer
+        # should wait before calling again, or None to wait until woken.
+        if self._deadline is None:
+            return None
+        remaining = self._deadline - time.monotonic()
+        if remaining > 0:
+            return remaining
+        try:
+            self._flush()
+        except Exception as e:
+            self._deadline = None
+            self._timer_error = e
+        return None
+
+    def close(self):
+        """
+        Finish the Brotli stream and write the rest of it to ``sink``. The
+        sink itself is left open. May be called more than once without error.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._compress_staged()
+                self._drain(self._compressor.finish_into)
+                if hasattr(self._sink, "flush"):
+                    self._sink.flush()
+            finally:
+                self._closed = True
+                self._compressor = None
+                self._sink = None
+                self._timer_condition.notify()
+        timer, self._timer = self._timer, None
+        if timer is not None and timer is not threading.current_thread():
+            timer.join()
+
+    def tell(self):
+        """
+        Return the number of uncompressed bytes written so far.
+        """
+        self._check_not_closed()
+        return self._pos
+
+    def _compress_staged(self):
+        if self._staged:
+            with memoryview(self._staging) as view:
+                self._compress(view[:self._staged])
+            self._staged = 0
+
+    def _compress(self, view):
+        while view:
+            written, consumed = self._compressor.process_into(view, self._out)
+            self._write_out(written)
+            view = view[consumed:]
+
+    def _drain(self, method):
+        while True:
+            written = method(self._out)
+            self._write_out(written)
+            if written < len(self._out):
+                break
+
+    def _write_out(self, length):
+        view = self._out[:length]
+        while view:
+            # Raw sinks are allowed to accept only part of what we give them.
+            written = self._sink.write(view)
+            if written is None:
+                # Only a non-blocking raw sink returns None, and it means
+                # that nothing was written. Anything else returning None
+                # (many file-like objects do) has written everything.
+                if isinstance(self._sink, io.RawIOBase):
+                    raise BlockingIOError(
+                        errno.EAGAIN, "sink would block, output was lost"
+                    )
+                break
+            if written >= len(view):
+                break
+            view = view[written:]
+
+
+def _run_flush_timer(writer_ref, condition):
+    # The body of a BrotliWriter's timer thread. It only holds a weak
+    # reference to the writer while waiting, so that a writer that is never
+    # closed can still be collected, which closes it and wakes the thread.
+    with condition:
+        while True:
+            writer = writer_ref()
+            if writer is None or writer.closed:
+                return
+            timeout = writer._timed_flush()
+            # If that was the last reference, the writer has just been
+            # closed on this thread, and nothing will wake it again.
+            del writer
+            if writer_ref() is not None:
+                condition.wait(timeout)
+
+
+class BrotliFile(io.BufferedIOBase):
+    """
+    A file object that transparently compresses data written to it, or
+    decompresses data read from it, using Brotli. It supports the usual
+    binary file methods (``read()``, ``readinto()``, ``readline()``,
+    iteration, ``write()``, ``seek()`` and so on) and can be wrapped in an
+    :class:`io.TextIOWrapper` for text access.
+
+    Reading runs in constant memory however well the data compresses:
+    decompressed data is written straight into an internal
+    :class:`io.BufferedReader`. Seeking is emulated by decompressing forward,
+    so backwards seeks restart from the beginning of the stream and can be
+    slow.
+
+    .. versionadded:: 1.2.0.2
+
+    :param filename: Either a path (``str``, ``bytes`` or a path-like object)
+        to open, or an existing binary file object to read from or write to.
+
+    :param mode: ``"r"`` or ``"rb"`` for reading, ``"w"`` or ``"wb"`` for
+        writing, ``"x"`` or ``"xb"`` for exclusive creation. Brotli streams
+        cannot be concatenated, so appending is not supported.
+    :type mode: ``str``
+
+    :param quality: The encoder quality, used when writing.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size, used when
+        writing.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size, used
+        when writing.
+    :type lgblock: ``int``
+
+    :param encoder_mode: The encoder mode, used when writing.
+    :type encoder_mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param buffer_size: The size of the read buffer in read mode, or of the
+        :class:`BrotliWriter` staging buffer in write mode. Defaults to
+        :data:`io.DEFAULT_BUFFER_SIZE` and :data:`WRITE_BUFFER_SIZE`
+        respectively.
+    :type buffer_size: ``int``
+    """
+    def __init__(self,
+                 filename,
+                 mode="r",
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0,
+                 encoder_mode=DEFAULT_MODE,
+                 buffer_size=None):
+        self._fp = None
+        self._closefp = False
+        self._mode = _MODE_CLOSED
+        self._buffer = None
+
+        if mode in ("r", "rb"):
+            mode = "rb"
+            mode_code = _MODE_READ
+        elif mode in ("w", "wb", "x", "xb"):
+            mode = mode[0] + "b"
+            mode_code = _MODE_WRITE
+        else:
+            raise ValueError("Invalid mode: %r" % (mode,))
+
+        self._fp, self._closefp = _open_fileobj(filename, mode)
+
+        self._mode = mode_code
+        if mode_code == _MODE_READ:
+            self._buffer = io.BufferedReader(
+                _DecompressReader(self._fp),
+                buffer_size or io.DEFAULT_BUFFER_SIZE
+            )
+        else:
+            self._buffer = BrotliWriter(
+                self._fp,
+                buffer_size or WRITE_BUFFER_SIZE,
+                quality=quality,
+                lgwin=lgwin,
+                lgblock=lgblock,
+                encoder_mode=encoder_mode,
+            )
+
+    def _check_not_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _check_can_read(self):
+        self._check_not_closed()
+        if self._mode != _MODE_READ:
+            raise io.UnsupportedOperation("File not open for reading")
+
+    def _check_can_write(self):
+        self._check_not_closed()
+        if self._mode != _MODE_WRITE:
+            raise io.UnsupportedOperation("File not open for writing")
+
+    @property
+    def closed(self):
+        return self._mode == _MODE_CLOSED
+
+    def close(self):
+        """
+        Flush and close the file. In write mode, this finishes the Brotli
+        stream. May be called more than once without error.
+        """
+        if self._mode == _MODE_CLOSED:
+            return
+        try:
+            self._buffer.close()
+        finally:
+            try:
+                if self._closefp:
+                    self._fp.close()
+            finally:
+                self._fp = None
+                self._closefp = False
+                self._mode = _MODE_CLOSED
+                self._buffer = None
+
+    def fileno(self):
+        self._check_not_closed()
+        return self._fp.fileno()
+
+    def readable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_READ
+
+    def writable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_WRITE
+
+    def seekable(self):
+        return self.readable() and self._buffer.seekable()
+
+    def peek(self, size=-1):
+        """
+        Return buffered data without advancing the file position. At least
+        one byte is returned unless at end of file.
+        """
+        self._check_can_read()
+        return self._buffer.peek(size)
+
+    def read(self, size=-1):
+        self._check_can_read()
+        return self._buffer.read(size)
+
+    def read1(self, size=-1):
+        self._check_can_read()
+        if size < 0:
+            size = io.DEFAULT_BUFFER_SIZE
+        return self._buffer.read1(size)
+
+    def readinto(self, b):
+        self._check_can_read()
+        return self._buffer.readinto(b)
+
+    def readinto1(self, b):
+        self._check_can_read()
+        return self._buffer.readinto1(b)
+
+    def readline(self, size=-1):
+        self._check_can_read()
+        return self._buffer.readline(size)
+
+    def readlines(self, size=-1):
+        self._check_can_read()
+        return self._buffer.readlines(size)
+
+    def __iter__(self):
+        self._check_can_read()
+        return self._iter_lines()
+
+    def _iter_lines(self):
+        # Delegate to the buffer's own (C-level) line iterator, while keeping
+        # this file object alive for as long as it is being iterated over.
+        yield from self._buffer
+
+    def write(self, data):
+        """
+        Compress ``data`` and write it to the file, returning the number of
+        uncompressed bytes written.
+        """
+        self._check_can_write()
+        return self._buffer.write(data)
+
+    def flush(self):
+        """
+        In write mode, flush the compressor so that everything written so
+        far can be decompressed by a reader, then flush the underlying file.
+        """
+        self._check_not_closed()
+        if self._mode == _MODE_WRITE:
+            self._buffer.flush()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        Change the position in the decompressed stream. Only supported in
+        read mode, and emulated by decompressing forward.
+        """
+        self._check_can_read()
+        if not self._buffer.seekable():
+            raise io.UnsupportedOperation(
+                "The underlying file object does not support seeking"
+            )
+        return self._buffer.seek(offset, whence)
+
+    def tell(self):
+        """
+        Return the current position in the decompressed stream.
+        """
+        self._check_not_closed()
+        return self._buffer.tell()
+
+
+def open(filename,
+         mode="rb",
+         quality=lib.BROTLI_DEFAULT_QUALITY,
+         lgwin=lib.BROTLI_DEFAULT_WINDOW,
+         lgblock=0,
+         encoder_mode=DEFAULT_MODE,
+         encoding=None,
+         errors=None,
+         newline=None):
+    """
+    Open a Brotli-compressed file in binary or text mode, in the style of
+    :func:`gzip.open`.
+
+    .. versionadded:: 1.2.0.2
+
+    :param filename: A path (``str``, ``bytes`` or a path-like object) or an
+        existing binary file object.
+
+    :param mode: ``"r"``, ``"rb"``, ``"w"``, ``"wb"``, ``"x"`` or ``"xb"``
+        for binary mode, or ``"rt"``, ``"wt"`` or ``"xt"`` for text mode.
+    :type mode: ``str``
+
+    :param quality: The encoder quality, used when writing.
+    :param lgwin: The base-2 logarithm of the sliding window size, used when
+        writing.
+    :param lgblock: The base-2 logarithm of the maximum input block size, used
+        when writing.
+    :param encoder_mode: The encoder mode, used when writing.
+
+    :param encoding: The text encoding. Only valid in text mode.
+    :param errors: The text error handling scheme. Only valid in text mode.
+    :param newline: The newline handling. Only valid in text mode.
+
+    :returns: A :class:`BrotliFile` in binary mode, or an
+        :class:`io.TextIOWrapper` wrapping one in text mode.
+    """
+    if "t" in mode:
+        if "b" in mode:
+            raise ValueError("Invalid mode: %r" % (mode,))
+    else:
+        if encoding is not None:
+            raise ValueError(
+                "Argument 'encoding' not supported in binary mode"
+            )
+        if errors is not None:
+            raise ValueError("Argument 'errors' not supported in binary mode")
+        if newline is not None:
+            raise ValueError("Argument 'newline' not supported in binary mode")
+
+    binary_file = BrotliFile(
+        filename,
+        mode.replace("t", ""),
+        quality=quality,
+        lgwin=lgwin,
+        lgblock=lgblock,
+        encoder_mode=encoder_mode,
+    )
+
+    if "t" in mode:
+        return io.TextIOWrapper(binary_file, encoding, errors, newline)
+    return binary_file
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+import collections
+import contextlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ._api import (
+    Compressor, DEFAULT_MODE, Decompressor, compress, compress_into, error,
+    _set_parameter, _validate_lgblock, _validate_lgwin, _validate_mode,
+    _validate_quality
+)
+from ._brotlicffi import lib
+
+#: The default amount of input compressed by each worker in
+#: :func:`compress_parallel`.
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Each worker thread in compress_many() and decompress_many() keeps one
+# scratch buffer that it reuses from item to item. Buffers that grow beyond
+# this size are used once and then dropped, so that one unusually large item
+# doesn't pin its memory for the life of the thread.
+_MAX_SCRATCH_SIZE = 16 * 1024 * 1024
+_MIN_SCRATCH_SIZE = 64 * 1024
+_scratch = threading.local()
+
+
+def compress_parallel(data,
+                      workers=None,
+                      chunk_size=PARALLEL_CHUNK_SIZE,
+                      mode=DEFAULT_MODE,
+                      quality=lib.BROTLI_DEFAULT_QUALITY,
+                      lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                      lgblock=0):
+    """
+    Compress a string using Brotli on several cores at once.
+
+    The input is split into blocks of ``chunk_size`` bytes, which are
+    compressed concurrently on a pool of threads (the GIL is released while
+    the encoder runs). Every block after the first is encoded with the
+    ``BROTLI_PARAM_STREAM_OFFSET`` encoder parameter so that it omits the
+    stream header and can be appended to the flushed output of the block
+    before it. The result is a single standard Brotli stream that any decoder
+    can read.
+
+    Because each block is compressed without seeing the data before it, the
+    output is usually slightly larger than that of :func:`compress`. Larger
+    blocks narrow the gap at the cost of less parallelism.
+
+    .. versionadded:: 1.2.0.2
+
+    :param data: A bytes-like object containing the data to compress.
+
+    :param workers: The number of threads to compress with. Defaults to the
+        number of CPUs.
+    :type workers: ``int`` or ``None``
+
+    :param chunk_size: The number of input bytes compressed by each task.
+    :type chunk_size: ``int``
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: Controls the compression-speed vs compression-density
+        tradeoffs. The higher the quality, the slower the compression. The
+        range of this value is 0 to 11.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size. The range of
+        this value is 10 to 24.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size. The
+        range of this value is 16 to 24. If set to 0, the value will be set
+        based on ``quality``.
+    :type lgblock: ``int``
+
+    :returns: The compressed bytestring.
+    :rtype: ``bytes``
+    """
+    if chunk_size <= 0:
+        raise error("%d is not a valid chunk_size, must be positive"
+                    % chunk_size)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    elif workers <= 0:
+        raise error("%d is not a valid number of workers, must be positive"
+                    % workers)
+
+    with memoryview(data) as view, view.cast("B") as byte_view:
+        if workers == 1 or len(byte_view) <= chunk_size:
+            return compress(
+                byte_view,
+                mode=mode,
+                quality=quality,
+                lgwin=lgwin,
+                lgblock=lgblock
+            )
+
+        params = dict(mode=mode, quality=quality, lgwin=lgwin, lgblock=lgblock)
+        offsets = range(0, len(byte_view), chunk_size)
+        last_offset = offsets[-1]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(
+                lambda offset: _compress_block(
+                    byte_view[offset:offset + chunk_size],
+                    offset,
+                    offset == last_offset,
+                    params
+                ),
+                offsets
+            ))
+    return b''.join(parts)
+
+
+def _compress_block(block, offset, is_last, params):
+    """
+    Compresses one block of a parallel compression. Every block but the last
+    is flushed rather than finished, so that the next block can follow it.
+    """
+    compressor = Compressor(**params)
+    if offset:
+        # Every value at least as large as the window has the same effect.
+        _set_parameter(
+            compressor._encoder,
+            lib.BROTLI_PARAM_STREAM_OFFSET,
+            "stream_offset",
+            min(offset, 1 << 30)
+        )
+    compressed = compressor.process(block)
+    if is_last:
+        return compressed + compressor.finish()
+    return compressed + compressor.flush()
+
+
+def compress_many(items,
+                  workers=None,
+                  ordered=True,
+                  executor=None,
+                  mode=DEFAULT_MODE,
+                  quality=lib.BROTLI_DEFAULT_QUALITY,
+                  lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                  lgblock=0):
+    """
+    Compress many independent strings using Brotli on a pool of threads.
+
+    This is the batch counterpart of :func:`compress`, for workloads such as
+    cache warmups and bulk exports that have many separate payloads to
+    compress with the same parameters. The GIL is released while the encoder
+    runs, so the items are compressed concurrently. ``items`` is consumed
+    lazily and only a few items per worker are in flight at any time, so it
+    may be a generator over more data than fits in memory at once.
+
+    Each worker thread compresses into a scratch buffer that it reuses from
+    item to item, so only the result itself is allocated per item.
+
+    .. versionadded:: 1.2.0.2
+
+    :param items: An iterable of bytes-like objects to compress.
+
+    :param workers: The number of threads to compress with. Defaults to the
+        number of CPUs.
+    :type workers: ``int`` or ``None``
+
+    :param ordered: If ``True``, results are yielded in the order of
+        ``items``. If ``False``, ``(index, result)`` tuples are yielded as soon
+        as each item is done, where ``index`` is the item's position in
+        ``items``.
+    :type ordered: ``bool``
+
+    :param executor: An existing :class:`concurrent.futures.ThreadPoolExecutor`
+        to run on instead of starting a new pool for this call. ``workers``
+        then only bounds the number of items in flight.
+
+    :param mode: The encoder mode.
+    :type mode: :class:`BrotliEncoderMode` or ``int``
+
+    :param quality: The encoder quality.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size.
+    :type lgblock: ``int``
+
+    :returns: An iterator over the compressed bytestrings.
+    :raises: :class:`Error <brotlicffi.Error>` as soon as the result of an
+        item that failed would be yielded.
+    """
+    # Fail early on bad parameters, rather than on the first item.
+    _validate_mode(mode)
+    _validate_quality(quality)
+    _validate_lgwin(lgwin)
+    _validate_lgblock(lgblock)
+    params = dict(mode=mode, quality=quality, lgwin=lgwin, lgblock=lgblock)
+    return _map(
+        lambda data: _compress_item(data, params),
+        items, workers, ordered, executor
+    )
+
+
+def decompress_many(items, workers=None, ordered=True, executor=None):
+    """
+    Decompress many independent Brotli-compressed strings on a pool of
+    threads.
+
+    This is the batch counterpart of :func:`decompress`. ``items`` is consumed
+    lazily and only a few items per worker are in flight at any time. Each
+    worker thread decompresses into a scratch buffer that it reuses from item
+    to item, growing it as needed, so only the result itself is allocated per
+    item.
+
+    .. versionadded:: 1.2.0.2
+
+    :param items: An iterable of bytes-like objects containing complete
+        Brotli-compressed data.
+
+    :param workers: The number of threads to decompress with. Defaults to the
+        number of CPUs.
+    :type workers: ``int`` or ``None``
+
+    :param ordered: If ``True``, results are yielded in the order of
+        ``items``. If ``False``, ``(index, result)`` tuples are yielded as soon
+        as each item is done.
+    :type ordered: ``bool``
+
+    :param executor: An existing :class:`concurrent.futures.ThreadPoolExecutor`
+        to run on instead of starting a new pool for this call.
+
+    :returns: An iterator over the decompressed bytestrings.
+    :raises: :class:`Error <brotlicffi.Error>` as soon as the result of an
+        item that is invalid or truncated would be yielded.
+    """
+    return _map(_decompress_item, items, workers, ordered, executor)
+
+
+def _map(func, items, workers, ordered, executor):
+    """
+    Validates the pool arguments eagerly, then returns a generator that runs
+    ``func`` over ``items``.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    elif workers <= 0:
+        raise error("%d is not a valid number of workers, must be positive"
+                    % workers)
+
+    if ordered:
+        return _map_ordered(func, items, workers, executor)
+    return _map_unordered(func, items, workers, executor)
+
+
+def _map_ordered(func, items, workers, executor):
+    pending = collections.deque()
+    with _pool(workers, executor) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            _cancel(pending)
+
+
+def _map_unordered(func, items, workers, executor):
+    pending = set()
+    with _pool(workers, executor) as pool:
+        try:
+            for index, item in enumerate(items):
+                pending.add(pool.submit(_indexed, func, index, item))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            _cancel(pending)
+
+
+def _indexed(func, index, item):
+    return index, func(item)
+
+
+def _cancel(futures):
+    """
+    Cancels work that hasn't started yet when the caller stops iterating
+    early, or when an item fails.
+    """
+    for future in futures:
+        future.cancel()
+
+
+@contextlib.contextmanager
+def _pool(workers, executor):
+    """
+    Yields the caller's executor unchanged, or a private pool of ``workers``
+    threads that is shut down afterwards.
+    """
+    if executor is not None:
+        yield executor
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield pool
+
+
+def _scratch_buffer(size):
+    """
+    Returns this thread's scratch buffer, replacing it with a larger one if it
+    holds fewer than ``size`` bytes.
+    """
+    buffer = getattr(_scratch, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        if size <= _MAX_SCRATCH_SIZE:
+            _scratch.buffer = buffer
+    return buffer
+
+
+def _grow_scratch(buffer, used):
+    """
+    Returns a scratch buffer twice the size of ``buffer`` holding a copy of its
+    first ``used`` bytes.
+    """
+    grown = _scratch_buffer(2 * len(buffer))
+    with memoryview(buffer) as view:
+        grown[:used] = view[:used]
+    return grown
+
+
+def _compress_item(data, params):
+    with memoryview(data) as view:
+        bound = lib.BrotliEncoderMaxCompressedSize(view.nbytes)
+    if not bound:
+        # The input is too large for the bound to be computed.
+        return compress(data, **params)
+    out = _scratch_buffer(bound)
+    written = compress_into(data, out, **params)
+    with memoryview(out) as view:
+        return bytes(view[:written])
+
+
+def _decompress_item(data):
+    decompressor = Decompressor()
+    with memoryview(data) as view, view.cast("B") as remaining:
+        out = _scratch_buffer(max(4 * len(remaining), _MIN_SCRATCH_SIZE))
+        used = 0
+        while True:
+            with memoryview(out) as out_view:
+                written, consumed, rc = decompressor._decompress_into(
+                    remaining, out_view[used:]
+                )
+            used += written
+            remaining = remaining[consumed:]
+            if rc != lib.BROTLI_DECODER_RESULT_NEEDS_MORE_OUTPUT:
+                break
+            out = _grow_scratch(out, used)
+    decompressor.finish()
+    with memoryview(out) as view:
+        return bytes(view[:used])
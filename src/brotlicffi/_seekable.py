@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+import bisect
+import io
+import struct
+import threading
+
+from ._api import (
+    DEFAULT_MODE, compress, decompress, error, _validate_lgblock,
+    _validate_lgwin, _validate_mode, _validate_quality
+)
+from ._brotlicffi import lib
+from ._file import _open_fileobj
+
+#: The default amount of uncompressed data held in each frame written by
+#: :class:`SeekableBrotliWriter`.
+SEEKABLE_FRAME_SIZE = 1024 * 1024
+
+#: The magic number that ends every seekable Brotli file.
+SEEKABLE_MAGIC = b"BrSk"
+
+# A seekable Brotli file is a sequence of frames, each a complete, standalone
+# Brotli stream, followed by an index and a footer:
+#
+#   frame 0 | ... | frame n-1 | index | footer
+#
+# The index holds one entry per frame: its compressed size and its
+# decompressed size, as little-endian 32-bit integers. The footer holds the
+# number of frames as a little-endian 32-bit integer, followed by the magic
+# number.
+_INDEX_ENTRY = struct.Struct("<II")
+_FOOTER = struct.Struct("<I4s")
+
+_MAX_FRAME_SIZE = 1 << 30
+
+
+class SeekableBrotliWriter(io.BufferedIOBase):
+    """
+    A writable binary stream that produces a seekable Brotli file: a sequence
+    of independently decodable Brotli frames of ``frame_size`` uncompressed
+    bytes each, followed by an index of the frames' compressed and
+    uncompressed sizes. :class:`SeekableBrotliReader` uses the index to read
+    arbitrary byte ranges while decompressing only the frames that cover
+    them.
+
+    The result is not itself a Brotli stream, but each frame is. Smaller
+    frames make random access cheaper at the cost of compression ratio, since
+    each frame is compressed without reference to the others.
+
+    The index is written when the writer is closed. :meth:`flush` ends the
+    current frame early so that everything written so far reaches the file.
+
+    .. versionadded:: 1.2.0.2
+
+    :param filename: Either a path (``str``, ``bytes`` or a path-like object)
+        to create, or an existing binary file object to write to.
+
+    :param mode: ``"w"`` or ``"wb"`` to create or truncate the file, ``"x"``
+        or ``"xb"`` for exclusive creation.
+    :type mode: ``str``
+
+    :param frame_size: The number of uncompressed bytes in each frame, up to
+        ``2**30``.
+    :type frame_size: ``int``
+
+    :param quality: The encoder quality.
+    :type quality: ``int``
+
+    :param lgwin: The base-2 logarithm of the sliding window size.
+    :type lgwin: ``int``
+
+    :param lgblock: The base-2 logarithm of the maximum input block size.
+    :type lgblock: ``int``
+
+    :param encoder_mode: The encoder mode.
+    :type encoder_mode: :class:`BrotliEncoderMode` or ``int``
+    """
+    def __init__(self,
+                 filename,
+                 mode="w",
+                 frame_size=SEEKABLE_FRAME_SIZE,
+                 quality=lib.BROTLI_DEFAULT_QUALITY,
+                 lgwin=lib.BROTLI_DEFAULT_WINDOW,
+                 lgblock=0,
+                 encoder_mode=DEFAULT_MODE):
+        if mode not in ("w", "wb", "x", "xb"):
+            raise ValueError("Invalid mode: %r" % (mode,))
+        if not (0 < frame_size <= _MAX_FRAME_SIZE):
+            raise ValueError(
+                "frame_size must be between 1 and %d" % _MAX_FRAME_SIZE
+            )
+
+        # Fail early on bad parameters, rather than on the first frame.
+        _validate_mode(encoder_mode)
+        _validate_quality(quality)
+        _validate_lgwin(lgwin)
+        _validate_lgblock(lgblock)
+        self._params = dict(
+            mode=encoder_mode, quality=quality, lgwin=lgwin, lgblock=lgblock
+        )
+
+        self._fp, self._closefp = _open_fileobj(filename, mode[0] + "b")
+        self._closed = False
+        self._frame_size = frame_size
+        self._staging = bytearray(frame_size)
+        self._staged = 0
+        self._frames = []
+        self._pos = 0
+
+    def _check_not_closed(self):
+        if self._closed:
+            raise ValueError("I/O operation on closed file")
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def writable(self):
+        self._check_not_closed()
+        return True
+
+    def write(self, data):
+        """
+        Compress ``data`` into the file, returning the number of uncompressed
+        bytes accepted, which is always all of them.
+        """
+        self._check_not_closed()
+        with memoryview(data) as view, view.cast("B") as byte_view:
+            length = len(byte_view)
+            while byte_view:
+                if not self._staged and len(byte_view) >= self._frame_size:
+                    # Whole frames are compressed straight from the caller's
+                    # buffer.
+                    self._write_frame(byte_view[:self._frame_size])
+                    byte_view = byte_view[self._frame_size:]
+                    continue
+
+                take = min(len(byte_view), self._frame_size - self._staged)
+                end = self._staged + take
+                self._staging[self._staged:end] = byte_view[:take]
+                self._staged = end
+                byte_view = byte_view[take:]
+                if self._staged == self._frame_size:
+                    self._write_staged_frame()
+        self._pos += length
+        return length
+
+    def flush(self):
+        """
+        End the current frame early and flush the underlying file.
+        """
+        self._check_not_closed()
+        self._write_staged_frame()
+        if hasattr(self._fp, "flush"):
+            self._fp.flush()
+
+    def close(self):
+        """
+        Write the last frame and the index, then close the file if it was
+        opened by this writer. May be called more than once without error.
+        """
+        if self._closed:
+            return
+        try:
+            self._write_staged_frame()
+            self._fp.write(b''.join(
+                _INDEX_ENTRY.pack(*frame) for frame in self._frames
+            ))
+            self._fp.write(_FOOTER.pack(len(self._frames), SEEKABLE_MAGIC))
+            if hasattr(self._fp, "flush"):
+                self._fp.flush()
+        finally:
+            try:
+                if self._closefp:
+                    self._fp.close()
+            finally:
+                self._closed = True
+                self._fp = None
+                self._staging = None
+
+    def tell(self):
+        """
+        Return the number of uncompressed bytes written so far.
+        """
+        self._check_not_closed()
+        return self._pos
+
+    def _write_staged_frame(self):
+        if self._staged:
+            with memoryview(self._staging) as view:
+                self._write_frame(view[:self._staged])
+            self._staged = 0
+
+    def _write_frame(self, view):
+        compressed = compress(view, **self._params)
+        self._fp.write(compressed)
+        self._frames.append((len(compressed), len(view)))
+
+
+class SeekableBrotliReader(io.RawIOBase):
+    """
+    A readable, seekable binary stream over a file written by
+    :class:`SeekableBrotliWriter`.
+
+    Seeking is free: only the index is read when the file is opened, and each
+    read decompresses just the frames covering the requested range. The most
+    recently decompressed frame is kept, so sequential small reads only
+    decompress each frame once. :meth:`pread` reads a range without moving
+    the stream position and may be called from several threads at once.
+
+    .. versionadded:: 1.2.0.2
+
+    :param filename: Either a path (``str``, ``bytes`` or a path-like object)
+        to open, or an existing seekable binary file object.
+
+    :raises: :class:`Error <brotlicffi.Error>` if the file is not a valid
+        seekable Brotli file.
+    """
+    def __init__(self, filename):
+        self._fp, self._closefp = _open_fileobj(filename, "rb")
+        self._lock = threading.Lock()
+        self._pos = 0
+        self._cached_frame = (-1, b'')
+        try:
+            self._load_index()
+        except BaseException:
+            if self._closefp:
+                self._fp.close()
+            raise
+
+    def _load_index(self):
+        end = self._fp.seek(0, io.SEEK_END)
+        if end < _FOOTER.size:
+            raise error("Not a seekable Brotli file: too short.")
+        self._fp.seek(end - _FOOTER.size)
+        count, magic = _FOOTER.unpack(self._fp.read(_FOOTER.size))
+        if magic != SEEKABLE_MAGIC:
+            raise error("Not a seekable Brotli file: bad magic number.")
+
+        index_start = end - _FOOTER.size - count * _INDEX_ENTRY.size
+        if index_start < 0:
+            raise error("Corrupt seekable Brotli file: truncated index.")
+        self._fp.seek(index_start)
+        index = self._fp.read(count * _INDEX_ENTRY.size)
+
+        # Cumulative offsets of the start of each frame, plus one entry for
+        # the end of the last frame.
+        self._compressed_offsets = [0]
+        self._offsets = [0]
+        for compressed_size, size in _INDEX_ENTRY.iter_unpack(index):
+            self._compressed_offsets.append(
+                self._compressed_offsets[-1] + compressed_size
+            )
+            self._offsets.append(self._offsets[-1] + size)
+        if self._compressed_offsets[-1] != index_start:
+            raise error("Corrupt seekable Brotli file: index mismatch.")
+
+    @property
+    def size(self):
+        """
+        The total uncompressed size of the file.
+        """
+        return self._offsets[-1]
+
+    @property
+    def frame_count(self):
+        """
+        The number of independently decodable frames in the file.
+        """
+        return len(self._offsets) - 1
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self._closefp:
+                    self._fp.close()
+            finally:
+                self._fp = None
+                self._cached_frame = (-1, b'')
+        super(SeekableBrotliReader, self).close()
+
+    def pread(self, size, offset):
+        """
+        Read up to ``size`` uncompressed bytes starting at ``offset``,
+        decompressing only the frames that cover that range. The stream
+        position is not changed.
+
+        :param size: The number of bytes to read. If negative, read to the
+            end of the file.
+        :param offset: The uncompressed offset to read from.
+        :returns: The data read, which is only shorter than ``size`` at the
+            end of the file.
+        :rtype: ``bytes``
+        """
+        self._checkClosed()
+        if offset < 0:
+            raise ValueError("negative offset")
+        end = self.size if size < 0 else min(offset + size, self.size)
+
+        chunks = []
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        while offset < end:
+            frame = self._read_frame(index)
+            frame_start = self._offsets[index]
+            chunk = frame[offset - frame_start:end - frame_start]
+            chunks.append(chunk)
+            offset += len(chunk)
+            index += 1
+        return b''.join(chunks)
+
+    def _read_frame(self, index):
+        with self._lock:
+            cached_index, cached = self._cached_frame
+            if cached_index == index:
+                return cached
+            start = self._compressed_offsets[index]
+            self._fp.seek(start)
+            compressed = self._fp.read(
+                self._compressed_offsets[index + 1] - start
+            )
+
+        size = self._offsets[index + 1] - self._offsets[index]
+        frame = decompress(compressed, expected_size=size)
+        if len(frame) != size:
+            raise error("Corrupt seekable Brotli file: frame size mismatch.")
+
+        with self._lock:
+            self._cached_frame = (index, frame)
+        return frame
+
+    def readinto(self, b):
+        with memoryview(b) as view, view.cast("B") as byte_view:
+            data = self.pread(len(byte_view), self._pos)
+            byte_view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def readall(self):
+        data = self.pread(-1, self._pos)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pass
+        elif whence == io.SEEK_CUR:
+            offset = self._pos + offset
+        elif whence == io.SEEK_END:
+            offset = self.size + offset
+        else:
+            raise ValueError("Invalid value for whence: %r" % (whence,))
+        if offset < 0:
+            raise ValueError("negative seek position %d" % (offset,))
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
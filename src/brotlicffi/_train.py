@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+import collections
+import heapq
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ._api import (
+    Compressor, Decompressor, error, prepare_dictionary
+)
+from ._brotlicffi import lib
+
+#: The default size of a dictionary built by :func:`train_dictionary`.
+DEFAULT_DICTIONARY_SIZE = 64 * 1024
+
+#: The default length of the pieces of the samples that
+#: :func:`train_dictionary` chooses between.
+DEFAULT_SEGMENT_SIZE = 128
+
+# Substrings are compared by their d-mers: the overlapping substrings of this
+# length that they contain. Brotli's shortest useful dictionary matches are
+# a little shorter than this.
+_DMER_SIZE = 8
+
+# The most sample data considered per byte of dictionary. Larger corpora are
+# evenly subsampled down to this, which bounds the training time without
+# much affecting the result.
+_SAMPLES_PER_BYTE = 100
+
+# Samples larger than this are subsampled in slices of this size.
+_SUBSAMPLE_SLICE_SIZE = 4096
+
+
+def train_dictionary(samples,
+                     size=DEFAULT_DICTIONARY_SIZE,
+                     segment_size=DEFAULT_SEGMENT_SIZE,
+                     workers=1):
+    """
+    Build a custom LZ77 dictionary from representative samples of the data
+    that will be compressed with it.
+
+    The samples are split into segments of ``segment_size`` bytes, which are
+    scored by how many of the other samples share their content. The best
+    segments are chosen greedily, each one discounting the content of those
+    already chosen, and concatenated with the most valuable last, where
+    Brotli can reference it most cheaply. This is the same approach as the
+    "cover" dictionary builder used by Zstandard.
+
+    Samples should be individual records, e.g. one JSON document each, so
+    that content shared between records can be told apart from content that
+    is merely repeated within one. Corpora larger than 100 times ``size`` are
+    evenly subsampled down to that.
+
+    .. versionadded:: 1.2.0.2
+
+    :param samples: An iterable of bytes-like objects.
+
+    :param size: The size of the dictionary to build, in bytes. The result
+        may be smaller if the samples don't contain enough shared content.
+    :type size: ``int``
+
+    :param segment_size: The length of the pieces of the samples chosen
+        between. Smaller segments suit small records with little shared
+        structure; larger ones suit documents with long repeated passages.
+    :type segment_size: ``int``
+
+    :param workers: The number of processes to analyse the samples with.
+        Using more than one pays off for corpora of several megabytes.
+    :type workers: ``int``
+
+    :returns: The dictionary.
+    :rtype: ``bytes``
+    """
+    if size <= 0:
+        raise error("%d is not a valid dictionary size, must be positive"
+                    % size)
+    if segment_size < _DMER_SIZE:
+        raise error("%d is not a valid segment_size, must be at least %d"
+                    % (segment_size, _DMER_SIZE))
+    if workers <= 0:
+        raise error("%d is not a valid number of workers, must be positive"
+                    % workers)
+
+    samples = _subsample(
+        [bytes(memoryview(s).cast("B")) for s in samples],
+        size * _SAMPLES_PER_BYTE
+    )
+    if not samples:
+        raise error("Cannot train a dictionary without samples.")
+
+    shared = _count_shared_dmers(samples, workers)
+    segments = _choose_segments(
+        samples, shared, size, segment_size, workers
+    )
+
+    # The encoder reaches the end of the dictionary with the shortest
+    # distances, so the most valuable segments go last.
+    dictionary = b''.join(reversed(segments))
+    return dictionary[-size:]
+
+
+def _subsample(samples, budget):
+    """
+    Returns an evenly spaced selection of the samples totalling about
+    ``budget`` bytes, or all of them if they fit.
+
+    Samples larger than :data:`_SUBSAMPLE_SLICE_SIZE` are cut into slices of
+    that size, and slices rather than whole samples are selected, so that a
+    corpus of a few large samples is cut down to part of each of them rather
+    than to none of them. The slices selected from each sample are joined
+    back together, so that content shared between samples can still be told
+    apart from content repeated within one.
+    """
+    total = sum(len(sample) for sample in samples)
+    if total <= budget:
+        return samples
+    slices = [
+        (index, sample[start:start + _SUBSAMPLE_SLICE_SIZE])
+        for index, sample in enumerate(samples)
+        for start in range(0, len(sample), _SUBSAMPLE_SLICE_SIZE)
+    ]
+    step = total / float(budget)
+    count = max(1, int(len(slices) / step))
+    chosen = {}
+    for i in range(count):
+        index, data = slices[int(i * step)]
+        chosen.setdefault(index, []).append(data)
+    return [b''.join(pieces) for pieces in chosen.values()]
+
+
+def _dmers(data, step=1):
+    return set(
+        data[i:i + _DMER_SIZE]
+        for i in range(0, len(data) - _DMER_SIZE + 1, step)
+    )
+
+
+def _sample_dmer_counts(samples):
+    """
+    Counts the number of samples each d-mer appears in.
+    """
+    counts = collections.Counter()
+    for sample in samples:
+        counts.update(_dmers(sample))
+    return counts
+
+
+def _shared_dmers(counts):
+    """
+    Maps each d-mer found in more than one sample to the number of other
+    samples it is found in. The rest are of no use in a dictionary.
+    """
+    return dict(
+        (dmer, count - 1) for dmer, count in counts.items() if count > 1
+    )
+
+
+def _segment_score(segment, shared):
+    # Spacing the d-mers out makes scoring much cheaper for little loss of
+    # accuracy.
+    dmers = _dmers(segment, step=_DMER_SIZE // 2)
+    return sum(map(shared.get, dmers, itertools.repeat(0, len(dmers))))
+
+
+def _segments(samples, segment_size):
+    """
+    Splits the samples into half-overlapping segments.
+    """
+    step = segment_size // 2
+    segments = []
+    for sample in samples:
+        for start in range(0, max(len(sample) - step, 1), step):
+            segment = sample[start:start + segment_size]
+            if len(segment) >= _DMER_SIZE:
+                segments.append(segment)
+    return segments
+
+
+# The shared d-mers of the corpus, in worker processes.
+_worker_shared = None
+
+
+def _init_worker(shared):
+    global _worker_shared
+    _worker_shared = shared
+
+
+def _score_shard(segments):
+    return [_segment_score(segment, _worker_shared) for segment in segments]
+
+
+def _score_segments(segments, shared, workers):
+    if workers == 1 or len(segments) < 2 * workers:
+        return [_segment_score(segment, shared) for segment in segments]
+
+    chunk = -(-len(segments) // workers)
+    shards = [segments[i:i + chunk] for i in range(0, len(segments), chunk)]
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(shared,)) as pool:
+        return list(itertools.chain.from_iterable(
+            pool.map(_score_shard, shards)
+        ))
+
+
+def _count_shared_dmers(samples, workers):
+    if workers == 1 or len(samples) < 2 * workers:
+        return _shared_dmers(_sample_dmer_counts(samples))
+
+    shards = [samples[i::workers] for i in range(workers)]
+    counts = collections.Counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard_counts in pool.map(_sample_dmer_counts, shards):
+            counts.update(shard_counts)
+    return _shared_dmers(counts)
+
+
+def _choose_segments(samples, shared, size, segment_size, workers):
+    """
+    Greedily chooses the highest-scoring segments, lazily rescoring each
+    against the content already chosen. Returns them best first.
+    """
+    segments = _segments(samples, segment_size)
+    heap = [
+        (-score, index)
+        for index, score in enumerate(
+            _score_segments(segments, shared, workers)
+        )
+        if score
+    ]
+    heapq.heapify(heap)
+
+    chosen = []
+    chosen_size = 0
+    while heap and chosen_size < size:
+        _, index = heapq.heappop(heap)
+        segment = segments[index]
+        score = _segment_score(segment, shared)
+        if not score:
+            continue
+        if heap and score < -heap[0][0]:
+            # Another segment may be better now: try again later.
+            heapq.heappush(heap, (-score, index))
+            continue
+
+        chosen.append(segment)
+        chosen_size += len(segment)
+        for dmer in _dmers(segment):
+            shared.pop(dmer, None)
+    return chosen
+
+
+class DictionaryEvaluation(collections.namedtuple(
+        "DictionaryEvaluation",
+        [
+            "original_size",
+            "compressed_size",
+            "compressed_size_with_dictionary",
+            "compress_time",
+            "compress_time_with_dictionary",
+            "decompress_time",
+            "decompress_time_with_dictionary",
+        ])):
+    """
+    The result of :func:`evaluate_dictionary`. Sizes are totals in bytes over
+    all of the samples, and times are totals in seconds.
+
+    .. versionadded:: 1.2.0.2
+    """
+    __slots__ = ()
+
+    @property
+    def ratio(self):
+        """
+        The compression ratio achieved without the dictionary.
+        """
+        return self.original_size / float(max(self.compressed_size, 1))
+
+    @property
+    def ratio_with_dictionary(self):
+        """
+        The compression ratio achieved with the dictionary.
+        """
+        return self.original_size / float(
+            max(self.compressed_size_with_dictionary, 1)
+        )
+
+
+def evaluate_dictionary(dictionary,
+                        samples,
+                        quality=lib.BROTLI_DEFAULT_QUALITY,
+                        lgwin=lib.BROTLI_DEFAULT_WINDOW):
+    """
+    Measure how much a dictionary helps with the given samples, by
+    compressing and decompressing each one separately with a
+    :class:`Compressor` and :class:`Decompressor`, both with and without the
+    dictionary. The samples should be representative of real data, and
+    ideally not the ones the dictionary was trained on.
+
+    .. versionadded:: 1.2.0.2
+
+    :param dictionary: The dictionary to evaluate.
+    :type dictionary: ``bytes`` or :class:`PreparedDictionary`
+    :param samples: An iterable of bytes-like objects.
+    :param quality: The encoder quality to measure at.
+    :type quality: ``int``
+    :param lgwin: The base-2 logarithm of the sliding window size.
+    :type lgwin: ``int``
+    :rtype: :class:`DictionaryEvaluation`
+    """
+    dictionary = prepare_dictionary(dictionary)
+    samples = list(samples)
+    without = _measure(samples, None, quality, lgwin)
+    with_dictionary = _measure(samples, dictionary, quality, lgwin)
+    return DictionaryEvaluation(
+        original_size=sum(len(memoryview(s).cast("B")) for s in samples),
+        compressed_size=without[0],
+        compressed_size_with_dictionary=with_dictionary[0],
+        compress_time=without[1],
+        compress_time_with_dictionary=with_dictionary[1],
+        decompress_time=without[2],
+        decompress_time_with_dictionary=with_dictionary[2],
+    )
+
+
+def _measure(samples, dictionary, quality, lgwin):
+    """
+    Returns the total compressed size, compression time and decompression
+    time of the samples.
+    """
+    compressed = []
+    start = time.perf_counter()
+    for sample in samples:
+        compressor = Compressor(
+            quality=quality, lgwin=lgwin, dictionary=dictionary
+        )
+        compressed.append(compressor.process(sample) + compressor.finish())
+    compress_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in compressed:
+        decompressor = Decompressor(dictionary=dictionary)
+        decompressor.process(data)
+    decompress_time = time.perf_counter() - start
+
+    return sum(len(c) for c in compressed), compress_time, decompress_time
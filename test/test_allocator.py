@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+test_allocator
+~~~~~~~~~~~~~~
+
+Tests for custom native memory allocators.
+"""
+import brotlicffi
+from brotlicffi._brotlicffi import ffi
+
+import pytest
+
+
+DATA = b'Some compressible test data. ' * 10000
+
+
+class CountingAllocator(brotlicffi.Allocator):
+    """
+    An allocator that tracks how much memory is outstanding.
+    """
+    def __init__(self):
+        self.allocations = 0
+        self.outstanding = 0
+
+    def malloc(self, size):
+        self.allocations += 1
+        self.outstanding += size
+        return super(CountingAllocator, self).malloc(size)
+
+    def free(self, address, size):
+        self.outstanding -= size
+        super(CountingAllocator, self).free(address, size)
+
+
+class FailingAllocator(brotlicffi.Allocator):
+    """
+    An allocator that refuses blocks larger than a limit.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+
+    def malloc(self, size):
+        if size > self.limit:
+            return ffi.NULL
+        return super(FailingAllocator, self).malloc(size)
+
+
+def test_allocator_sees_all_memory():
+    allocator = CountingAllocator()
+    c = brotlicffi.Compressor(quality=5, allocator=allocator)
+    compressed = c.process(DATA) + c.finish()
+    d = brotlicffi.Decompressor(allocator=allocator)
+    assert d.process(compressed) == DATA
+
+    assert allocator.allocations
+    assert allocator.outstanding > 0
+    del c, d
+    assert allocator.outstanding == 0
+
+
+def test_pooled_allocator_reuses_blocks():
+    pool = brotlicffi.PooledAllocator()
+    c = brotlicffi.Compressor(quality=9, allocator=pool)
+    expected = c.process(DATA) + c.finish()
+    del c
+    pooled = pool.pooled_bytes
+    assert pooled > 0
+
+    for _ in range(3):
+        c = brotlicffi.Compressor(quality=9, allocator=pool)
+        assert c.process(DATA) + c.finish() == expected
+        del c
+        assert pool.pooled_bytes == pooled
+
+    pool.clear()
+    assert pool.pooled_bytes == 0
+
+
+def test_pooled_allocator_respects_limit():
+    pool = brotlicffi.PooledAllocator(max_pooled_bytes=1024 * 1024)
+    c = brotlicffi.Compressor(quality=11, lgwin=22, allocator=pool)
+    c.process(DATA)
+    c.finish()
+    del c
+    assert 0 < pool.pooled_bytes <= 1024 * 1024
+
+
+def test_pooled_allocator_across_instances():
+    pool = brotlicffi.PooledAllocator(min_block_size=1)
+    compressed = brotlicffi.compress(DATA)
+    for _ in range(5):
+        d = brotlicffi.Decompressor(allocator=pool)
+        assert d.process(compressed) == DATA
+
+
+def test_failing_allocator_raises_in_decoder():
+    compressed = brotlicffi.compress(DATA, lgwin=22)
+    d = brotlicffi.Decompressor(allocator=FailingAllocator(64 * 1024))
+    with pytest.raises(brotlicffi.error):
+        d.process(compressed)
+
+
+def test_failing_allocator_falls_back_in_encoder():
+    """
+    The encoder can't survive a failed allocation, so it gets malloc instead.
+    """
+    c = brotlicffi.Compressor(allocator=FailingAllocator(0))
+    compressed = c.process(DATA) + c.finish()
+    assert brotlicffi.decompress(compressed) == DATA
+
+
+def test_memory_usage_untracked_by_default():
+    assert brotlicffi.Compressor().memory_usage is None
+    assert brotlicffi.Decompressor().peak_memory_usage is None
+
+
+def test_compressor_memory_usage():
+    c = brotlicffi.Compressor(quality=11, lgwin=22, max_memory=1 << 30)
+    initial = c.memory_usage
+    assert 0 < initial == c.peak_memory_usage
+    c.process(DATA)
+    c.finish()
+    assert c.peak_memory_usage > 1 << 20
+    assert c.peak_memory_usage >= c.memory_usage >= initial
+
+
+def test_decompressor_memory_usage():
+    compressed = brotlicffi.compress(DATA, lgwin=16)
+    d = brotlicffi.Decompressor(allocator=brotlicffi.Allocator())
+    assert d.process(compressed) == DATA
+    assert d.peak_memory_usage >= 1 << 16
+
+
+def test_decompressor_max_memory():
+    # The decoder sizes its ring buffer to the output when it can, so this
+    # needs more than the limit's worth of output.
+    compressed = brotlicffi.compress(DATA * 10, quality=1, lgwin=22)
+    d = brotlicffi.Decompressor(max_memory=1 << 20)
+    with pytest.raises(brotlicffi.error, match='memory limit'):
+        d.process(compressed)
+    assert d.peak_memory_usage <= 1 << 20
+
+    small = brotlicffi.compress(DATA, lgwin=16)
+    d = brotlicffi.Decompressor(max_memory=1 << 20)
+    assert d.process(small) == DATA
+
+
+def test_compressor_max_memory():
+    c = brotlicffi.Compressor(quality=11, lgwin=22, max_memory=1 << 20)
+    with pytest.raises(brotlicffi.error, match='memory limit'):
+        c.process(DATA)
+        c.finish()
+    with pytest.raises(brotlicffi.error, match='memory limit'):
+        c.finish()
+
+    c = brotlicffi.Compressor(quality=1, lgwin=16, max_memory=1 << 22)
+    out = bytearray(len(DATA))
+    written, _ = c.compress_into(DATA, out)
+    written += c.finish_into(memoryview(out)[written:])
+    assert brotlicffi.decompress(out[:written]) == DATA
+
+
+def test_tiny_max_memory_decoder():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.Decompressor(max_memory=10)
+
+
+def test_negative_max_memory():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.Compressor(max_memory=-1)
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.Decompressor(max_memory=-1)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+test_async
+~~~~~~~~~~
+
+Tests for the asyncio streaming API.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import brotlicffi
+from brotlicffi._async import _input_block_size
+
+import pytest
+
+
+DATA = b''.join(
+    b'line %d of some moderately compressible text\n' % i
+    for i in range(6000)
+)
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super(RecordingExecutor, self).__init__(max_workers=1)
+        self.calls = 0
+        self.threads = set()
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls += 1
+
+        def run():
+            self.threads.add(threading.get_ident())
+            return fn(*args, **kwargs)
+        return super(RecordingExecutor, self).submit(run)
+
+
+class BufferWriter(object):
+    def __init__(self):
+        self.data = bytearray()
+        self.drains = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drains += 1
+
+
+async def _aiter(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(aiterable):
+    return [chunk async for chunk in aiterable]
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('quality', [1, 5, 11])
+def test_async_compressor_roundtrip(quality):
+    async def run():
+        compressor = brotlicffi.AsyncCompressor(quality=quality)
+        output = [await compressor.compress(c) for c in _chunks(DATA, 4096)]
+        output.append(await compressor.flush())
+        output.append(await compressor.compress(b'more'))
+        output.append(await compressor.finish())
+        return b''.join(output)
+
+    assert brotlicffi.decompress(asyncio.run(run())) == DATA + b'more'
+
+
+def test_async_compressor_offloads_only_heavy_calls():
+    executor = RecordingExecutor()
+
+    async def run():
+        compressor = brotlicffi.AsyncCompressor(quality=9, executor=executor)
+        await compressor.compress(b'small')
+        assert executor.calls == 0
+        await compressor.compress(DATA)
+        assert executor.calls == 1
+        await compressor.finish()
+
+    asyncio.run(run())
+    assert threading.get_ident() not in executor.threads
+
+
+def test_async_compressor_inline_threshold():
+    executor = RecordingExecutor()
+
+    async def run():
+        compressor = brotlicffi.AsyncCompressor(
+            quality=5, executor=executor, inline_threshold=0
+        )
+        # Buffering input is never offloaded, but compressing it is.
+        await compressor.compress(b'small')
+        assert executor.calls == 0
+        await compressor.finish()
+        assert executor.calls == 1
+
+    asyncio.run(run())
+
+
+def test_async_compressor_serializes_concurrent_calls():
+    chunks = _chunks(DATA, 100000)
+
+    async def run():
+        compressor = brotlicffi.AsyncCompressor(
+            quality=5, inline_threshold=0
+        )
+        output = await asyncio.gather(*[
+            compressor.compress(chunk) for chunk in chunks
+        ])
+        return b''.join(output) + await compressor.finish()
+
+    assert brotlicffi.decompress(asyncio.run(run())) == DATA
+
+
+def test_async_decompressor_roundtrip():
+    compressed = brotlicffi.compress(DATA)
+
+    async def run():
+        decompressor = brotlicffi.AsyncDecompressor(inline_threshold=0)
+        output = [
+            await decompressor.decompress(chunk)
+            for chunk in _chunks(compressed, 1000)
+        ]
+        assert decompressor.is_finished()
+        await decompressor.finish()
+        return b''.join(output)
+
+    assert asyncio.run(run()) == DATA
+
+
+def test_async_decompressor_offloads_only_heavy_calls():
+    compressed = brotlicffi.compress(DATA)
+    executor = RecordingExecutor()
+
+    async def run():
+        decompressor = brotlicffi.AsyncDecompressor(executor=executor)
+        await decompressor.decompress(compressed[:100], 1024)
+        assert executor.calls == 0
+        await decompressor.decompress(b'', 1024 * 1024)
+        assert executor.calls == 1
+
+    asyncio.run(run())
+
+
+def test_async_decompressor_estimates_from_observed_ratio():
+    """
+    Once the stream is known to compress well, small inputs that expand into
+    a lot of output are offloaded.
+    """
+    compressed = brotlicffi.compress(DATA)
+    chunks = _chunks(compressed, 2000)
+    assert len(chunks) > 2
+    executor = RecordingExecutor()
+
+    async def run():
+        decompressor = brotlicffi.AsyncDecompressor(
+            executor=executor, inline_threshold=64 * 1024
+        )
+        output = [await decompressor.decompress(chunks[0])]
+        assert executor.calls == 0
+        for chunk in chunks[1:-1]:
+            output.append(await decompressor.decompress(chunk))
+        assert executor.calls == len(chunks) - 2
+        output.append(await decompressor.decompress(chunks[-1]))
+        return b''.join(output)
+
+    assert asyncio.run(run()) == DATA
+
+
+@pytest.mark.parametrize('quality', [1, 11])
+def test_aiter_roundtrip(quality):
+    async def run():
+        compressed = b''.join(await _collect(brotlicffi.compress_aiter(
+            _aiter(_chunks(DATA, 10000)), quality=quality
+        )))
+        return b''.join(await _collect(brotlicffi.decompress_aiter(
+            _aiter(_chunks(compressed, 777))
+        )))
+
+    assert asyncio.run(run()) == DATA
+
+
+def test_decompress_aiter_bounds_output():
+    compressed = brotlicffi.compress(b'\0' * (8 * 1024 * 1024))
+
+    async def run():
+        return await _collect(brotlicffi.decompress_aiter(
+            _aiter([compressed]), output_chunk_size=65536
+        ))
+
+    pieces = asyncio.run(run())
+    assert all(len(piece) <= 65536 for piece in pieces)
+    assert b''.join(pieces) == b'\0' * (8 * 1024 * 1024)
+
+
+def test_decompress_aiter_truncated():
+    compressed = brotlicffi.compress(DATA)
+
+    async def run():
+        await _collect(brotlicffi.decompress_aiter(
+            _aiter([compressed[:-10]])
+        ))
+
+    with pytest.raises(brotlicffi.error):
+        asyncio.run(run())
+
+
+def test_stream_roundtrip():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(DATA)
+        reader.feed_eof()
+        compressed = BufferWriter()
+        await brotlicffi.compress_stream(
+            reader, compressed, chunk_size=8192, quality=6
+        )
+        assert compressed.drains > 0
+
+        reader = asyncio.StreamReader()
+        reader.feed_data(bytes(compressed.data))
+        reader.feed_eof()
+        decompressed = BufferWriter()
+        await brotlicffi.decompress_stream(
+            reader, decompressed, chunk_size=8192
+        )
+        assert decompressed.drains >= len(DATA) // 8192
+        return bytes(decompressed.data)
+
+    assert asyncio.run(run()) == DATA
+
+
+@pytest.mark.parametrize('quality,lgwin,lgblock,size', [
+    (0, 22, 0, 1),
+    (3, 22, 20, 1 << 14),
+    (5, 22, 0, 1 << 16),
+    (5, 22, 20, 1 << 20),
+    (11, 22, 0, 1 << 18),
+    (11, 16, 0, 1 << 16),
+])
+def test_input_block_size(quality, lgwin, lgblock, size):
+    assert _input_block_size(quality, lgwin, lgblock) == size
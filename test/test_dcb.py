@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+test_dcb
+~~~~~~~~
+
+Tests for the dictionary-compressed Brotli (dcb) content encoding.
+"""
+import hashlib
+
+import brotlicffi
+
+import pytest
+
+
+OLD_BUNDLE = b''.join(
+    b'function module%d(a, b) { return a * %d + b; }\n' % (i, i)
+    for i in range(2000)
+)
+NEW_BUNDLE = OLD_BUNDLE.replace(b'module1234', b'renamedModule')
+
+
+def test_dcb_roundtrip():
+    registry = brotlicffi.DictionaryRegistry([OLD_BUNDLE])
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE, quality=5)
+
+    assert compressed.startswith(b'\xffDCB')
+    assert compressed[4:36] == hashlib.sha256(OLD_BUNDLE).digest()
+    assert brotlicffi.decompress_dcb(compressed, registry) == NEW_BUNDLE
+
+
+def test_dcb_delta_is_small():
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE, quality=5)
+    assert len(compressed) * 10 < len(brotlicffi.compress(NEW_BUNDLE))
+
+
+def test_dcb_streaming_in_small_pieces():
+    compressor = brotlicffi.DCBCompressor(OLD_BUNDLE, quality=5)
+    parts = [compressor.process(NEW_BUNDLE[:1000]), compressor.flush()]
+    parts.append(compressor.process(NEW_BUNDLE[1000:]))
+    parts.append(compressor.finish())
+    compressed = b''.join(parts)
+
+    decompressor = brotlicffi.DCBDecompressor(
+        {hashlib.sha256(OLD_BUNDLE).digest(): OLD_BUNDLE}
+    )
+    assert decompressor.dictionary_digest is None
+    out = b''.join(
+        decompressor.process(compressed[i:i + 7])
+        for i in range(0, len(compressed), 7)
+    )
+    assert out == NEW_BUNDLE
+    assert decompressor.is_finished()
+    assert decompressor.dictionary_digest == (
+        hashlib.sha256(OLD_BUNDLE).digest()
+    )
+    decompressor.finish()
+
+
+def test_dcb_unknown_dictionary():
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE)
+    with pytest.raises(brotlicffi.error, match='Unknown dcb dictionary'):
+        brotlicffi.decompress_dcb(compressed, brotlicffi.DictionaryRegistry())
+
+
+def test_dcb_bad_magic():
+    with pytest.raises(brotlicffi.error, match='magic'):
+        brotlicffi.DCBDecompressor({}).process(b'\xffDCX')
+
+
+def test_dcb_truncated():
+    registry = brotlicffi.DictionaryRegistry([OLD_BUNDLE])
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE)
+    for size in (10, len(compressed) - 1):
+        with pytest.raises(brotlicffi.error, match='incomplete'):
+            brotlicffi.decompress_dcb(compressed[:size], registry)
+
+
+def test_registry():
+    registry = brotlicffi.DictionaryRegistry()
+    digest = registry.add(bytearray(OLD_BUNDLE))
+    assert digest == hashlib.sha256(OLD_BUNDLE).digest()
+    assert digest in registry
+    assert len(registry) == 1
+    assert registry.get(digest).data == OLD_BUNDLE
+
+    registry.remove(digest)
+    registry.remove(digest)
+    assert registry.get(digest) is None
+    assert len(registry) == 0
+
+
+def test_dcb_decompression_does_not_prepare_dictionaries(monkeypatch):
+    def fail(data):
+        raise AssertionError("dictionary was prepared")
+
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE, quality=5)
+    monkeypatch.setattr(brotlicffi._dcb, 'prepare_dictionary', fail)
+    registry = brotlicffi.DictionaryRegistry([OLD_BUNDLE])
+    digest = hashlib.sha256(OLD_BUNDLE).digest()
+    for dictionaries in (registry, {digest: OLD_BUNDLE}):
+        assert brotlicffi.decompress_dcb(compressed, dictionaries) == (
+            NEW_BUNDLE
+        )
+
+
+def test_dcb_wrong_dictionary_for_digest():
+    compressed = brotlicffi.compress_dcb(NEW_BUNDLE, OLD_BUNDLE)
+    digest = hashlib.sha256(OLD_BUNDLE).digest()
+    for dictionary in (NEW_BUNDLE, brotlicffi.prepare_dictionary(NEW_BUNDLE)):
+        with pytest.raises(brotlicffi.error, match='Wrong dcb dictionary'):
+            brotlicffi.decompress_dcb(compressed, {digest: dictionary})
+
+
+def test_registry_prepares_on_get():
+    registry = brotlicffi.DictionaryRegistry([OLD_BUNDLE])
+    digest = hashlib.sha256(OLD_BUNDLE).digest()
+    prepared = registry.get(digest)
+    assert isinstance(prepared, brotlicffi.PreparedDictionary)
+    assert registry.get(digest) is prepared
+    assert registry.get(b'missing', 'default') == 'default'
+
+    with pytest.raises(brotlicffi.error, match='empty'):
+        registry.add(b'')
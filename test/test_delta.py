@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+test_delta
+~~~~~~~~~~
+
+Tests for delta compression against a reference version.
+"""
+import json
+import random
+
+import brotlicffi
+from brotlicffi._delta import _delta_window
+
+import pytest
+
+
+def _snapshot(seed, changes=0):
+    rng = random.Random(seed)
+    config = dict(
+        ('service-%d' % i, {
+            'replicas': rng.randint(1, 9),
+            'token': '%032x' % rng.getrandbits(128),
+        })
+        for i in range(2000)
+    )
+    for name in rng.sample(sorted(config), changes):
+        config[name]['replicas'] += 1
+    return json.dumps(config, indent=1).encode('ascii')
+
+
+REFERENCE = _snapshot(1)
+NEW = _snapshot(1, changes=10)
+
+
+def test_delta_roundtrip():
+    delta = brotlicffi.compress_delta(REFERENCE, NEW)
+    assert brotlicffi.decompress_delta(REFERENCE, delta) == NEW
+
+
+def test_delta_is_much_smaller_than_compression():
+    delta = brotlicffi.compress_delta(REFERENCE, NEW)
+    assert len(delta) * 100 < len(brotlicffi.compress(NEW))
+
+
+@pytest.mark.parametrize('quality', [5, 9, 11])
+def test_delta_qualities(quality):
+    delta = brotlicffi.compress_delta(REFERENCE, NEW, quality=quality)
+    assert brotlicffi.decompress_delta(REFERENCE, delta) == NEW
+
+
+def test_delta_with_prepared_reference():
+    reference = brotlicffi.PreparedDictionary(REFERENCE)
+    delta = brotlicffi.compress_delta(reference, bytearray(NEW))
+    assert brotlicffi.decompress_delta(reference, delta) == NEW
+    assert brotlicffi.decompress_delta(REFERENCE, delta) == NEW
+
+
+def test_delta_of_unrelated_data():
+    new = _snapshot(2)
+    delta = brotlicffi.compress_delta(REFERENCE, new)
+    assert brotlicffi.decompress_delta(REFERENCE, delta) == new
+
+
+def test_delta_against_wrong_reference():
+    delta = brotlicffi.compress_delta(REFERENCE, NEW)
+    try:
+        result = brotlicffi.decompress_delta(_snapshot(2), delta)
+    except brotlicffi.error:
+        pass
+    else:
+        assert result != NEW
+
+
+@pytest.mark.parametrize('size,lgwin,large_window', [
+    (1, 10, False),
+    (1024 - 16, 10, False),
+    (1024 - 15, 11, False),
+    ((1 << 24) - 16, 24, False),
+    ((1 << 24) - 15, 25, True),
+    ((1 << 30) - 16, 30, True),
+])
+def test_delta_window(size, lgwin, large_window):
+    assert _delta_window(size) == (lgwin, large_window)
+
+
+def test_delta_reference_too_large():
+    with pytest.raises(brotlicffi.error):
+        _delta_window((1 << 30) - 15)
+
+
+def test_delta_low_quality():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress_delta(REFERENCE, NEW, quality=4)
+
+
+@pytest.mark.slow
+def test_delta_large_window():
+    rng = random.Random(3)
+    reference = bytes(rng.getrandbits(8) for _ in range(1 << 16)) * 260
+    new = bytearray(reference)
+    new[len(new) // 2] ^= 0xff
+    delta = brotlicffi.compress_delta(reference, new, quality=5)
+    assert len(delta) < 4096
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.decompress(delta, dictionary=reference)
+    assert brotlicffi.decompress_delta(reference, delta) == new
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+test_dictionary
+~~~~~~~~~~~~~~~
+
+Tests for custom dictionaries and the prepared dictionary cache.
+"""
+import json
+import threading
+
+import brotlicffi
+from brotlicffi._api import _DictionaryCache
+
+import pytest
+
+from hypothesis import given
+from hypothesis.strategies import binary
+
+
+RECORDS = [
+    json.dumps({
+        'user_id': i,
+        'event': 'page_view',
+        'path': '/products/%d' % (i % 97),
+        'referrer': 'https://example.com/search?q=item',
+    }).encode('ascii')
+    for i in range(500)
+]
+DICTIONARY = b''.join(RECORDS[:100])
+
+
+@pytest.mark.parametrize('quality', [2, 5, 9, 11])
+def test_dictionary_roundtrip(quality):
+    for record in RECORDS[100:120]:
+        c = brotlicffi.Compressor(quality=quality, dictionary=DICTIONARY)
+        compressed = c.process(record) + c.finish()
+        d = brotlicffi.Decompressor(dictionary=DICTIONARY)
+        assert d.process(compressed) == record
+        assert d.is_finished()
+
+
+def test_dictionary_shrinks_small_messages():
+    plain = sum(len(brotlicffi.compress(r)) for r in RECORDS[100:200])
+    with_dictionary = sum(
+        len(brotlicffi.compress(r, dictionary=DICTIONARY))
+        for r in RECORDS[100:200]
+    )
+    assert with_dictionary * 2 < plain
+
+
+def test_one_shot_functions_with_dictionary():
+    prepared = brotlicffi.prepare_dictionary(DICTIONARY)
+    record = RECORDS[200]
+    compressed = brotlicffi.compress(record, dictionary=prepared)
+    assert brotlicffi.decompress(compressed, dictionary=DICTIONARY) == record
+    assert brotlicffi.decompress(
+        compressed, dictionary=prepared, expected_size=len(record)
+    ) == record
+
+
+def test_missing_dictionary_does_not_roundtrip():
+    """
+    Dictionary references decode as something else, or not at all, without
+    the dictionary.
+    """
+    compressed = brotlicffi.compress(RECORDS[200], dictionary=DICTIONARY)
+    try:
+        assert brotlicffi.decompress(compressed) != RECORDS[200]
+    except brotlicffi.error:
+        pass
+
+
+@given(binary(min_size=1, max_size=1000), binary())
+def test_arbitrary_dictionary_roundtrip(dictionary, data):
+    compressed = brotlicffi.compress(data, quality=5, dictionary=dictionary)
+    assert brotlicffi.decompress(
+        compressed, dictionary=bytearray(dictionary)
+    ) == data
+
+
+def test_prepared_dictionary_attributes():
+    prepared = brotlicffi.PreparedDictionary(memoryview(DICTIONARY))
+    assert prepared.data == DICTIONARY
+    assert len(prepared) == len(DICTIONARY)
+    assert len(prepared.digest) == 32
+    assert prepared.memory_usage > 0
+
+
+def test_empty_prepared_dictionary():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.PreparedDictionary(b'')
+
+
+def test_prepare_dictionary_is_cached():
+    first = brotlicffi.prepare_dictionary(DICTIONARY)
+    assert brotlicffi.prepare_dictionary(bytearray(DICTIONARY)) is first
+    assert brotlicffi.prepare_dictionary(first) is first
+
+
+def test_dictionary_cache_evicts_least_recently_used():
+    cache = _DictionaryCache(2)
+    a = cache.get(b'a' * 100)
+    b = cache.get(b'b' * 100)
+    assert cache.get(b'a' * 100) is a
+    cache.get(b'c' * 100)
+    assert cache.get(b'a' * 100) is a
+    assert cache.get(b'b' * 100) is not b
+
+
+def test_dictionary_cache_across_threads():
+    cache = _DictionaryCache(4)
+    results = []
+
+    def prepare():
+        results.append(cache.get(DICTIONARY))
+
+    threads = [threading.Thread(target=prepare) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(id(r) for r in results)) == 1
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+test_file
+~~~~~~~~~
+
+Tests for the BrotliFile file object and brotlicffi.open().
+"""
+import io
+
+import brotlicffi
+
+import pytest
+
+
+LINES = [b'line %d of the log\n' % i for i in range(20000)]
+DATA = b''.join(LINES)
+
+
+@pytest.fixture
+def compressed_path(tmp_path):
+    path = tmp_path / 'data.br'
+    path.write_bytes(brotlicffi.compress(DATA, quality=5))
+    return path
+
+
+def test_read_all(compressed_path):
+    with brotlicffi.open(compressed_path) as f:
+        assert f.read() == DATA
+
+
+def test_read_in_chunks(compressed_path):
+    chunks = []
+    with brotlicffi.open(compressed_path, 'rb') as f:
+        while True:
+            chunk = f.read(1000)
+            if not chunk:
+                break
+            assert len(chunk) <= 1000
+            chunks.append(chunk)
+    assert b''.join(chunks) == DATA
+
+
+def test_readinto(compressed_path):
+    out = bytearray(len(DATA))
+    with brotlicffi.BrotliFile(compressed_path) as f:
+        view = memoryview(out)
+        total = 0
+        while total < len(out):
+            read = f.readinto(view[total:])
+            assert read
+            total += read
+        assert f.readinto(bytearray(10)) == 0
+    assert out == DATA
+
+
+def test_readline_and_iteration(compressed_path):
+    with brotlicffi.open(compressed_path) as f:
+        assert f.readline() == LINES[0]
+        assert f.readline() == LINES[1]
+        assert list(f) == LINES[2:]
+
+
+def test_wraps_existing_file_object():
+    f = brotlicffi.BrotliFile(io.BytesIO(brotlicffi.compress(DATA)))
+    assert f.read() == DATA
+    f.close()
+    assert f.closed
+
+
+def test_forward_and_backward_seek(compressed_path):
+    with brotlicffi.open(compressed_path) as f:
+        assert f.seekable()
+        assert f.seek(1000) == 1000
+        assert f.read(10) == DATA[1000:1010]
+        assert f.tell() == 1010
+        assert f.seek(-10, io.SEEK_CUR) == 1000
+        assert f.read(10) == DATA[1000:1010]
+        assert f.seek(-5, io.SEEK_END) == len(DATA) - 5
+        assert f.read() == DATA[-5:]
+        assert f.seek(0) == 0
+        assert f.readline() == LINES[0]
+
+
+@pytest.mark.parametrize('offset,whence', [
+    (-100, io.SEEK_CUR),
+    (-10 ** 6, io.SEEK_END),
+    (-1, io.SEEK_SET),
+])
+def test_seek_before_start_clamps_to_start(compressed_path, offset, whence):
+    with brotlicffi.open(compressed_path) as f:
+        f.read(10)
+        assert f.seek(offset, whence) == 0
+        assert f.tell() == 0
+        assert f.read(10) == DATA[:10]
+
+
+def test_text_mode(compressed_path):
+    with brotlicffi.open(compressed_path, 'rt', encoding='ascii') as f:
+        assert f.readline() == LINES[0].decode('ascii')
+        assert f.read() == DATA[len(LINES[0]):].decode('ascii')
+
+
+def test_write_then_read(tmp_path):
+    path = tmp_path / 'written.br'
+    with brotlicffi.open(path, 'wb', quality=4) as f:
+        for line in LINES:
+            assert f.write(line) == len(line)
+        assert f.tell() == len(DATA)
+    assert brotlicffi.decompress(path.read_bytes()) == DATA
+
+
+def test_write_text_mode(tmp_path):
+    path = tmp_path / 'written.br'
+    with brotlicffi.open(path, 'wt', encoding='utf-8') as f:
+        f.write(u'caf\xe9\n')
+    assert brotlicffi.decompress(path.read_bytes()) == b'caf\xc3\xa9\n'
+
+
+def test_flush_makes_data_readable():
+    sink = io.BytesIO()
+    f = brotlicffi.BrotliFile(sink, 'wb')
+    f.write(b'first record\n')
+    f.flush()
+    d = brotlicffi.Decompressor()
+    assert d.process(sink.getvalue()) == b'first record\n'
+    f.close()
+
+
+def test_exclusive_create_fails_if_exists(compressed_path):
+    with pytest.raises(FileExistsError):
+        brotlicffi.open(compressed_path, 'xb')
+
+
+def test_truncated_file_raises(tmp_path):
+    path = tmp_path / 'truncated.br'
+    path.write_bytes(brotlicffi.compress(DATA)[:-10])
+    with brotlicffi.open(path) as f:
+        with pytest.raises(EOFError):
+            f.read()
+
+
+def test_garbage_raises(tmp_path):
+    path = tmp_path / 'garbage.br'
+    path.write_bytes(b'some random garbage')
+    with brotlicffi.open(path) as f:
+        with pytest.raises(brotlicffi.error):
+            f.read()
+
+
+@pytest.mark.parametrize('mode', ['a', 'ab', 'rw', 'rbt'])
+def test_invalid_modes(compressed_path, mode):
+    with pytest.raises(ValueError):
+        brotlicffi.open(compressed_path, mode)
+
+
+def test_text_arguments_rejected_in_binary_mode(compressed_path):
+    with pytest.raises(ValueError):
+        brotlicffi.open(compressed_path, 'rb', encoding='utf-8')
+
+
+def test_wrong_direction_operations(compressed_path, tmp_path):
+    with brotlicffi.open(compressed_path) as f:
+        with pytest.raises(io.UnsupportedOperation):
+            f.write(b'data')
+
+    with brotlicffi.open(tmp_path / 'out.br', 'wb') as f:
+        with pytest.raises(io.UnsupportedOperation):
+            f.read()
+        with pytest.raises(io.UnsupportedOperation):
+            f.seek(0)
+
+    with pytest.raises(ValueError):
+        f.write(b'data')
+
+
+def test_highly_compressible_data_is_read_in_bounded_chunks(tmp_path):
+    """
+    A small compressed file that expands enormously is still read a buffer at
+    a time.
+    """
+    path = tmp_path / 'zeros.br'
+    with brotlicffi.open(path, 'wb', quality=1) as f:
+        for _ in range(64):
+            f.write(b'\x00' * (1 << 20))
+
+    total = 0
+    with brotlicffi.open(path) as f:
+        while True:
+            chunk = f.read1()
+            if not chunk:
+                break
+            assert len(chunk) <= io.DEFAULT_BUFFER_SIZE
+            total += len(chunk)
+    assert total == 64 << 20
+
+
+def test_iterate_unreferenced_file(compressed_path):
+    """
+    Iterating over a file object that isn't otherwise referenced keeps it
+    open until iteration finishes.
+    """
+    assert list(brotlicffi.open(compressed_path)) == LINES
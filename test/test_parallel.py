@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+test_parallel
+~~~~~~~~~~~~~
+
+Tests for multi-threaded compression.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import brotlicffi
+
+import pytest
+
+from hypothesis import given, settings
+from hypothesis.strategies import binary, integers
+
+
+@pytest.mark.parametrize('quality', [0, 1, 2, 5, 9, 11])
+@pytest.mark.parametrize('lgwin', [10, 16, 22])
+def test_compress_parallel_roundtrip(one_compressed_file, quality, lgwin):
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    compressed = brotlicffi.compress_parallel(
+        data, workers=4, chunk_size=10000, quality=quality, lgwin=lgwin
+    )
+    assert brotlicffi.decompress(compressed) == data
+
+
+@settings(deadline=None)
+@given(
+    data=binary(max_size=5000),
+    chunk_size=integers(min_value=1, max_value=2000),
+)
+def test_compress_parallel_arbitrary_chunking(data, chunk_size):
+    compressed = brotlicffi.compress_parallel(
+        data, workers=3, chunk_size=chunk_size, quality=5
+    )
+    assert brotlicffi.decompress(compressed) == data
+
+
+def test_compress_parallel_streams_through_decompressor(one_compressed_file):
+    """
+    The stitched output is a single stream that can be decoded incrementally.
+    """
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    compressed = brotlicffi.compress_parallel(
+        bytearray(data), workers=2, chunk_size=4096, quality=4
+    )
+    d = brotlicffi.Decompressor()
+    out = b''.join(
+        d.process(compressed[i:i + 100])
+        for i in range(0, len(compressed), 100)
+    )
+    assert d.is_finished()
+    assert out == data
+
+
+def test_compress_parallel_small_input_matches_compress():
+    data = b'small input'
+    assert brotlicffi.compress_parallel(data, workers=4) == (
+        brotlicffi.compress(data)
+    )
+
+
+@pytest.mark.parametrize('params', [
+    {'workers': 0},
+    {'chunk_size': 0},
+    {'quality': 52},
+])
+def test_compress_parallel_bad_parameters(params):
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress_parallel(
+            b'data' * 1000, **dict({'chunk_size': 100}, **params)
+        )
+
+
+ITEMS = [b'item %d ' % i * (i % 50 + 1) for i in range(300)]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_compress_many_roundtrip(workers):
+    compressed = list(brotlicffi.compress_many(
+        ITEMS, workers=workers, quality=5
+    ))
+    assert compressed == [brotlicffi.compress(i, quality=5) for i in ITEMS]
+    assert list(brotlicffi.decompress_many(
+        iter(compressed), workers=workers
+    )) == ITEMS
+
+
+def test_many_unordered_yields_indices():
+    compressed = brotlicffi.compress_many(ITEMS, workers=3, ordered=False)
+    results = dict(compressed)
+    assert sorted(results) == list(range(len(ITEMS)))
+
+    decompressed = dict(brotlicffi.decompress_many(
+        [results[i] for i in range(len(ITEMS))], workers=3, ordered=False
+    ))
+    assert [decompressed[i] for i in range(len(ITEMS))] == ITEMS
+
+
+def test_decompress_many_grows_scratch_buffer():
+    """
+    Items that expand far beyond their compressed size are decoded in full.
+    """
+    data = [b'\x00' * (1 << 20), b'', b'abc' * 100000]
+    compressed = [brotlicffi.compress(d) for d in data]
+    assert list(brotlicffi.decompress_many(compressed, workers=2)) == data
+
+
+def test_many_with_existing_executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        compressed = list(brotlicffi.compress_many(
+            [bytearray(i) for i in ITEMS], executor=pool
+        ))
+        assert list(brotlicffi.decompress_many(
+            compressed, executor=pool
+        )) == ITEMS
+
+
+def test_decompress_many_raises_on_bad_item():
+    items = [brotlicffi.compress(b'good'), b'garbage',
+             brotlicffi.compress(b'good')[:-1]]
+    results = brotlicffi.decompress_many(items, workers=2)
+    assert next(results) == b'good'
+    with pytest.raises(brotlicffi.error):
+        next(results)
+
+
+def test_decompress_many_raises_on_truncated_item():
+    truncated = brotlicffi.compress(ITEMS[-1])[:-1]
+    with pytest.raises(brotlicffi.error):
+        list(brotlicffi.decompress_many([truncated]))
+
+
+@pytest.mark.parametrize('params', [
+    {'workers': 0},
+    {'quality': 52},
+    {'lgwin': 100},
+])
+def test_compress_many_bad_parameters(params):
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress_many(ITEMS, **params)
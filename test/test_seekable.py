@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+test_seekable
+~~~~~~~~~~~~~
+
+Tests for the seekable framed Brotli format.
+"""
+import io
+import struct
+import threading
+
+import brotlicffi
+
+import pytest
+
+from hypothesis import given, settings
+from hypothesis.strategies import integers
+
+
+DATA = b''.join(b'record %07d: some payload text\n' % i for i in range(30000))
+
+
+def write_seekable(data, frame_size, chunk=None):
+    sink = io.BytesIO()
+    w = brotlicffi.SeekableBrotliWriter(
+        sink, frame_size=frame_size, quality=4
+    )
+    chunk = chunk or len(data) or 1
+    for i in range(0, len(data), chunk):
+        w.write(data[i:i + chunk])
+    w.close()
+    return sink.getvalue()
+
+
+@pytest.fixture(scope='module')
+def seekable_data():
+    return write_seekable(DATA, frame_size=64 * 1024, chunk=1000)
+
+
+def test_frames_are_standalone_brotli_streams(seekable_data):
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    assert r.frame_count == -(-len(DATA) // (64 * 1024))
+    assert r.size == len(DATA)
+
+    # The first frame decodes on its own with a plain decompressor.
+    d = brotlicffi.Decompressor()
+    assert d.process(seekable_data) == DATA[:64 * 1024]
+    assert d.is_finished()
+
+
+def test_read_everything(seekable_data):
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    assert r.read() == DATA
+    assert r.read() == b''
+
+
+@settings(deadline=None, max_examples=50)
+@given(
+    offset=integers(min_value=0, max_value=len(DATA) + 10),
+    size=integers(min_value=-1, max_value=200000),
+)
+def test_pread(seekable_data, offset, size):
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    expected = DATA[offset:] if size < 0 else DATA[offset:offset + size]
+    assert r.pread(size, offset) == expected
+    assert r.tell() == 0
+
+
+def test_pread_decodes_only_covering_frames(seekable_data, monkeypatch):
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    decoded = []
+    original = r._read_frame
+
+    def read_frame(index):
+        decoded.append(index)
+        return original(index)
+
+    monkeypatch.setattr(r, '_read_frame', read_frame)
+    offset = 5 * 64 * 1024 - 10
+    assert r.pread(20, offset) == DATA[offset:offset + 20]
+    assert decoded == [4, 5]
+
+
+def test_seek_and_read(seekable_data):
+    r = io.BufferedReader(
+        brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    )
+    assert r.seek(123456) == 123456
+    assert r.read(100) == DATA[123456:123556]
+    assert r.seek(-50, io.SEEK_END) == len(DATA) - 50
+    assert r.read() == DATA[-50:]
+    assert r.seek(10) == 10
+    assert r.readline() == DATA[10:DATA.index(b'\n') + 1]
+
+
+def test_concurrent_pread(seekable_data):
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(seekable_data))
+    failures = []
+
+    def worker(start):
+        for offset in range(start, len(DATA), 97 * 1024):
+            if r.pread(4096, offset) != DATA[offset:offset + 4096]:
+                failures.append(offset)
+
+    threads = [
+        threading.Thread(target=worker, args=(i * 1000,)) for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not failures
+
+
+@pytest.mark.parametrize('chunk', [1, 777, 64 * 1024, 200000])
+def test_write_chunking_does_not_change_frames(chunk):
+    data = DATA[:300000]
+    assert write_seekable(data, 64 * 1024, chunk) == (
+        write_seekable(data, 64 * 1024)
+    )
+
+
+def test_empty_file():
+    data = write_seekable(b'', 1024)
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(data))
+    assert r.size == 0
+    assert r.frame_count == 0
+    assert r.read() == b''
+
+
+def test_flush_ends_frame():
+    sink = io.BytesIO()
+    w = brotlicffi.SeekableBrotliWriter(sink, frame_size=1024)
+    w.write(b'a' * 100)
+    w.flush()
+    w.write(b'b' * 100)
+    w.close()
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(sink.getvalue()))
+    assert r.frame_count == 2
+    assert r.read() == b'a' * 100 + b'b' * 100
+
+
+def test_roundtrip_through_paths(tmp_path):
+    path = tmp_path / 'data.brs'
+    with brotlicffi.SeekableBrotliWriter(path, frame_size=4096) as w:
+        w.write(DATA[:100000])
+    with brotlicffi.SeekableBrotliReader(path) as r:
+        assert r.pread(10, 50000) == DATA[50000:50010]
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'not a seekable brotli file',
+    struct.pack('<I4s', 5, b'BrSk'),
+])
+def test_invalid_files(data):
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.SeekableBrotliReader(io.BytesIO(data))
+
+
+def test_corrupt_frame(seekable_data):
+    corrupt = bytearray(seekable_data)
+    corrupt[10:20] = b'\xff' * 10
+    r = brotlicffi.SeekableBrotliReader(io.BytesIO(bytes(corrupt)))
+    with pytest.raises(brotlicffi.error):
+        r.pread(10, 0)
+    assert r.pread(10, 64 * 1024) == DATA[64 * 1024:64 * 1024 + 10]
+
+
+@pytest.mark.parametrize('params', [
+    {'frame_size': 0},
+    {'mode': 'r'},
+])
+def test_invalid_writer_arguments(params):
+    with pytest.raises(ValueError):
+        brotlicffi.SeekableBrotliWriter(io.BytesIO(), **params)
+
+
+def test_invalid_encoder_parameters():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.SeekableBrotliWriter(io.BytesIO(), quality=52)
@@ -5,6 +5,10 @@ test_simple_compression
 
 Tests for compression of single chunks.
 """
+import array
+import os
+import tracemalloc
+
 import brotlicffi
 
 import pytest
@@ -132,8 +136,439 @@ def test_process_alias(s):
         {"quality": 52},
         {"lgwin": 52},
         {"lgblock": 52},
+        {"size_hint": -1},
+        {"size_hint": 1 << 32},
+        {"npostfix": 4},
+        {"ndirect": 16},
+        {"npostfix": 1, "ndirect": 3},
+        {"npostfix": 3, "ndirect": 128},
     ]
 )
 def test_bad_compressor_parameters(params):
     with pytest.raises(brotlicffi.error):
         brotlicffi.Compressor(**params)
+
+
+@pytest.mark.parametrize(
+    "wrap",
+    [
+        bytearray,
+        memoryview,
+        lambda b: memoryview(bytearray(b))[1:],
+        lambda b: array.array('B', b),
+    ]
+)
+def test_compress_accepts_buffer_protocol(wrap):
+    """
+    Any contiguous buffer can be compressed, both in one shot and through the
+    streaming interface.
+    """
+    data = b'some data to compress ' * 100
+    buf = wrap(data)
+    expected = bytes(memoryview(buf).cast('B'))
+
+    assert brotlicffi.decompress(brotlicffi.compress(buf)) == expected
+
+    c = brotlicffi.Compressor()
+    compressed = c.process(buf) + c.finish()
+    assert brotlicffi.decompress(compressed) == expected
+
+
+def test_compress_wide_array_uses_byte_length():
+    """
+    Buffers whose items are wider than a byte are compressed in full.
+    """
+    buf = array.array('i', range(1000))
+    compressed = brotlicffi.compress(buf)
+    assert brotlicffi.decompress(compressed) == buf.tobytes()
+
+
+def test_compress_rejects_non_contiguous_buffer():
+    with pytest.raises(BufferError):
+        brotlicffi.compress(memoryview(b'abcdef')[::2])
+
+
+FRAGMENTS = (
+    [b'<li>item %d</li>\n' % i for i in range(5000)] +
+    [bytes(range(256)) * 1024, b'', bytearray(b'<footer/>')] +
+    [memoryview(b'tail')]
+)
+
+
+@pytest.mark.parametrize('quality', [0, 1, 5, 11])
+def test_compress_iter(quality):
+    data = b''.join(FRAGMENTS)
+    assert brotlicffi.decompress(
+        brotlicffi.compress_iter(FRAGMENTS, quality=quality)
+    ) == data
+    assert brotlicffi.decompress(
+        brotlicffi.compress_iter(iter(FRAGMENTS), quality=quality)
+    ) == data
+
+
+def test_compress_iter_list_is_not_copied():
+    """
+    A list of small chunks is staged a little at a time, never copied whole.
+    """
+    chunks = [bytes([i % 256]) * 1024 for i in range(8 * 1024)]
+    tracemalloc.start()
+    try:
+        compressed = brotlicffi.compress_iter(chunks, quality=1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 1024 * 1024
+    assert brotlicffi.decompress(compressed) == b''.join(chunks)
+
+
+def test_compress_iter_empty():
+    assert brotlicffi.decompress(brotlicffi.compress_iter([])) == b''
+
+
+def test_compress_iter_incompressible():
+    # Output larger than the input, so the output buffer has to grow while
+    # keeping what has been written to it so far.
+    chunks = [os.urandom(100000) for _ in range(10)]
+    assert brotlicffi.decompress(
+        brotlicffi.compress_iter(chunks, quality=5)
+    ) == b''.join(chunks)
+
+
+def test_compress_iter_with_dictionary():
+    dictionary = b''.join(FRAGMENTS[:100])
+    compressed = brotlicffi.compress_iter(
+        FRAGMENTS, quality=5, dictionary=dictionary
+    )
+    assert brotlicffi.decompress(
+        compressed, dictionary=dictionary
+    ) == b''.join(FRAGMENTS)
+
+
+def test_compress_vectored_matches_process():
+    """
+    Compressing fragments together gives the same stream as compressing
+    them joined.
+    """
+    data = b''.join(FRAGMENTS)
+    joined = brotlicffi.Compressor(quality=5)
+    vectored = brotlicffi.Compressor(quality=5)
+    assert vectored.process_vectored(FRAGMENTS) == joined.process(data)
+    assert vectored.compress_vectored([b'more', b'data']) == (
+        joined.process(b'moredata')
+    )
+    assert vectored.finish() == joined.finish()
+
+
+def test_compress_vectored_rejects_non_buffers():
+    c = brotlicffi.Compressor()
+    with pytest.raises(TypeError):
+        c.process_vectored([b'data', u'text'])
+
+
+@given(binary())
+def test_compress_into_roundtrips(s):
+    out = bytearray(len(s) + 1024)
+    written = brotlicffi.compress_into(s, out)
+    assert brotlicffi.decompress(out[:written]) == s
+
+
+def test_compress_into_too_small_buffer():
+    data = bytes(range(256)) * 64
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress_into(data, bytearray(16))
+
+
+def test_compress_into_rejects_read_only_buffer():
+    with pytest.raises(BufferError):
+        brotlicffi.compress_into(b'data', b'\x00' * 64)
+
+
+def test_streaming_compress_into_small_buffer(one_compressed_file):
+    """
+    Streaming compression into a small, reused buffer produces a valid stream.
+    """
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    out = bytearray(128)
+    view = memoryview(data)
+    compressed = []
+    c = brotlicffi.Compressor(quality=5)
+
+    for start in range(0, len(data), 4096):
+        chunk = view[start:start + 4096]
+        while chunk:
+            written, consumed = c.process_into(chunk, out)
+            compressed.append(bytes(out[:written]))
+            chunk = chunk[consumed:]
+
+        while True:
+            written = c.flush_into(out)
+            compressed.append(bytes(out[:written]))
+            if written < len(out):
+                break
+
+    while True:
+        written = c.finish_into(out)
+        compressed.append(bytes(out[:written]))
+        if written < len(out):
+            break
+
+    assert c.finish_into(out) == 0
+    assert brotlicffi.decompress(b''.join(compressed)) == data
+
+
+def test_compressor_reuses_output_buffer():
+    """
+    A stream of small messages, each flushed, reuses the same output buffer
+    and only grows it for a larger input.
+    """
+    messages = [b'{"id": %04d, "event": "update"}' % i for i in range(1000)]
+    c = brotlicffi.Compressor(quality=5)
+    compressed = [c.process(messages[0]), c.flush()]
+    output_buffer = c._output
+    for message in messages[1:]:
+        compressed.append(c.process(message))
+        compressed.append(c.flush())
+    assert c._output is output_buffer
+
+    data = b''.join(messages) * 20
+    compressed.append(c.process(data))
+    assert len(c._output) > len(output_buffer)
+    compressed.append(c.finish())
+    assert brotlicffi.decompress(b''.join(compressed)) == (
+        b''.join(messages) + data
+    )
+
+
+@pytest.mark.parametrize('quality', [0, 1, 5, 11])
+def test_compress_message(quality):
+    """
+    Each compressed message can be decompressed as soon as it arrives.
+    """
+    messages = [b'{"id": %d, "event": "update"}' % i for i in range(100)]
+    messages.append(b'')
+    messages.append(bytearray(b'x' * 100000))
+
+    c = brotlicffi.Compressor(quality=quality)
+    d = brotlicffi.Decompressor()
+    compressed = []
+    for message in messages:
+        compressed.append(c.process_message(message))
+        assert d.decompress(compressed[-1]) == message
+    compressed.append(c.finish())
+    d.decompress(compressed[-1])
+    d.finish()
+
+
+def test_compress_message_matches_process_and_flush():
+    messages = [b'{"id": %d, "event": "update"}' % i for i in range(100)]
+    separate = brotlicffi.Compressor(quality=5)
+    fused = brotlicffi.Compressor(quality=5)
+    for message in messages:
+        assert fused.compress_message(message) == (
+            separate.process(message) + separate.flush()
+        )
+
+
+@pytest.mark.parametrize('quality', [1, 5, 11])
+def test_streaming_compress_views(one_compressed_file, quality):
+    """
+    Streaming compression through output views produces the same stream as
+    the copying methods.
+    """
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    c = brotlicffi.Compressor(quality=quality)
+    expected = [c.process(data[:4096]), c.flush(), c.process(data[4096:]),
+                c.finish()]
+
+    c = brotlicffi.Compressor(quality=quality)
+    compressed = []
+    for views in (c.process_views(data[:4096]), c.flush_views(),
+                  c.process_views(data[4096:]), c.finish_views()):
+        compressed.append(b''.join(bytes(view) for view in views))
+
+    assert compressed == expected
+    assert list(c.finish_views()) == []
+    assert brotlicffi.decompress(b''.join(compressed)) == data
+
+
+def test_compress_views_are_released():
+    c = brotlicffi.Compressor(quality=1)
+    views = c.compress_views(b'data')
+    compressed = [bytes(view) for view in views]
+    views = c.finish_views()
+    view = next(views)
+    assert view.readonly
+    compressed.append(bytes(view))
+    with pytest.raises(StopIteration):
+        next(views)
+    with pytest.raises(ValueError):
+        bytes(view)
+    assert brotlicffi.decompress(b''.join(compressed)) == b'data'
+
+
+@pytest.mark.parametrize('method,args', [
+    ('process', (b'more',)),
+    ('compress_into', (b'more', bytearray(100))),
+    ('flush', ()),
+    ('flush_into', (bytearray(100),)),
+    ('finish', ()),
+    ('compress_message', (b'more',)),
+    ('compress_vectored', ([b'more'],)),
+    ('flush_views', ()),
+])
+def test_compressor_refuses_calls_while_views_are_open(method, args):
+    """
+    The lock is reentrant, so calls from the thread that holds an open
+    views iterator have to be refused explicitly, or they would be
+    interleaved with its output.
+    """
+    data = os.urandom(3 * 1024 * 1024)
+    c = brotlicffi.Compressor(quality=5)
+    views = c.compress_views(data)
+    compressed = [bytes(next(views))]
+    with pytest.raises(brotlicffi.error):
+        result = getattr(c, method)(*args)
+        # The views methods only raise once they are started.
+        next(iter(result))
+    compressed.extend(bytes(view) for view in views)
+    compressed.append(c.process(b'more') + c.finish())
+    assert brotlicffi.decompress(b''.join(compressed)) == data + b'more'
+
+
+@pytest.mark.parametrize('close', [True, False])
+def test_compress_views_not_started(close):
+    """
+    An iterator that is closed or dropped before it is started doesn't
+    leave the compressor locked.
+    """
+    c = brotlicffi.Compressor(quality=5)
+    views = c.compress_views(b'dropped')
+    if close:
+        views.close()
+    del views
+    compressed = c.process(b'data') + c.finish()
+    assert brotlicffi.decompress(compressed) == b'data'
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"mode": 52},
+        {"quality": 52},
+        {"lgwin": 52},
+        {"lgblock": 52},
+        {"npostfix": 4},
+        {"ndirect": 121},
+    ]
+)
+def test_bad_compress_parameters(params):
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress(b'data', **params)
+
+
+@pytest.mark.parametrize("lgblock", [0, 16])
+@pytest.mark.parametrize("quality", [0, 1, 5, 10, 11])
+def test_one_shot_and_streaming_paths_roundtrip(one_compressed_file,
+                                                quality,
+                                                lgblock):
+    """
+    compress() uses the native one-shot encoder unless lgblock is set, and
+    both paths produce valid streams.
+    """
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    compressed = brotlicffi.compress(data, quality=quality, lgblock=lgblock)
+    assert brotlicffi.decompress(compressed) == data
+
+    out = bytearray(len(data) + 1024)
+    written = brotlicffi.compress_into(
+        data, out, quality=quality, lgblock=lgblock
+    )
+    assert brotlicffi.decompress(out[:written]) == data
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"disable_literal_context_modeling": True},
+        {"npostfix": 2, "ndirect": 8},
+        {"npostfix": 3, "ndirect": 120},
+        {"npostfix": 0, "ndirect": 15, "lgblock": 16},
+    ]
+)
+@pytest.mark.parametrize("quality", [1, 5, 11])
+def test_advanced_encoder_parameters_roundtrip(one_compressed_file,
+                                               params,
+                                               quality):
+    with open(one_compressed_file, 'rb') as f:
+        data = f.read()
+
+    compressed = brotlicffi.compress(data, quality=quality, **params)
+    assert brotlicffi.decompress(compressed) == data
+
+    c = brotlicffi.Compressor(quality=quality, size_hint=len(data), **params)
+    assert brotlicffi.decompress(c.process(data) + c.finish()) == data
+
+
+@given(binary(), integers(min_value=0, max_value=(1 << 32) - 1))
+def test_any_size_hint_roundtrips(s, size_hint):
+    """
+    The size hint is only a hint: a wrong one still gives a valid stream.
+    """
+    c = brotlicffi.Compressor(quality=5, size_hint=size_hint)
+    assert brotlicffi.decompress(c.process(s) + c.finish()) == s
+
+
+@pytest.mark.parametrize("lgwin", [16, 24, 25, 30])
+@pytest.mark.parametrize("lgblock", [0, 16])
+def test_large_window_roundtrip(lgwin, lgblock):
+    data = bytes(range(256)) * 1000
+    compressed = brotlicffi.compress(
+        data, quality=5, lgwin=lgwin, lgblock=lgblock, large_window=True
+    )
+    assert brotlicffi.decompress(compressed, large_window=True) == data
+    assert brotlicffi.decompress(
+        compressed, expected_size=len(data), large_window=True
+    ) == data
+
+    c = brotlicffi.Compressor(quality=5, lgwin=lgwin, large_window=True)
+    compressed = c.process(data) + c.finish()
+    d = brotlicffi.Decompressor(large_window=True)
+    assert d.process(compressed) == data
+    assert d.is_finished()
+
+
+@pytest.mark.parametrize("lgwin", [16, 30])
+def test_large_window_requires_decoder_opt_in(lgwin):
+    compressed = brotlicffi.compress(
+        b'some data', lgwin=lgwin, large_window=True
+    )
+    with pytest.raises(brotlicffi.error, match='large_window=True'):
+        brotlicffi.decompress(compressed)
+    with pytest.raises(brotlicffi.error, match='large_window=True'):
+        brotlicffi.Decompressor().process(compressed)
+
+
+def test_large_window_decoder_reads_standard_streams():
+    compressed = brotlicffi.compress(b'some data')
+    assert brotlicffi.decompress(compressed, large_window=True) == b'some data'
+
+
+@pytest.mark.parametrize("lgwin", [25, 30])
+def test_large_lgwin_requires_opt_in(lgwin):
+    with pytest.raises(brotlicffi.error, match='large_window'):
+        brotlicffi.compress(b'data', lgwin=lgwin)
+    with pytest.raises(brotlicffi.error, match='large_window'):
+        brotlicffi.Compressor(lgwin=lgwin)
+
+
+def test_large_window_lgwin_limit():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.compress(b'data', lgwin=31, large_window=True)
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.Compressor(lgwin=31, large_window=True)
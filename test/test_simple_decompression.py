@@ -5,6 +5,9 @@ test_simple_decompression
 
 Tests for decompression of single chunks.
 """
+import mmap
+import os
+
 import brotlicffi
 
 import pytest
@@ -133,3 +136,288 @@ def test_decompression_fails_properly_on_garbage(bogus, exception_cls):
     """
     with pytest.raises(exception_cls):
         brotlicffi.decompress(bogus)
+
+
+@pytest.mark.parametrize('wrap', [bytearray, memoryview])
+def test_decompression_accepts_buffer_protocol(simple_compressed_file, wrap):
+    """
+    Any contiguous buffer can be decompressed, both in one shot and through
+    the streaming interface.
+    """
+    with open(simple_compressed_file[0], 'rb') as f:
+        uncompressed_data = f.read()
+
+    with open(simple_compressed_file[1], 'rb') as f:
+        compressed_data = wrap(f.read())
+
+    assert brotlicffi.decompress(compressed_data) == uncompressed_data
+
+    o = brotlicffi.Decompressor()
+    assert o.process(compressed_data) + o.finish() == uncompressed_data
+
+
+def test_decompression_from_mmap(tmp_path):
+    """
+    Memory-mapped files can be decompressed without reading them first.
+    """
+    uncompressed_data = b'mapped data ' * 1000
+    path = tmp_path / 'data.br'
+    path.write_bytes(brotlicffi.compress(uncompressed_data))
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            assert brotlicffi.decompress(m) == uncompressed_data
+
+
+def test_decompress_into(simple_compressed_file):
+    with open(simple_compressed_file[0], 'rb') as f:
+        uncompressed_data = f.read()
+
+    with open(simple_compressed_file[1], 'rb') as f:
+        compressed_data = f.read()
+
+    out = bytearray(len(uncompressed_data) + 10)
+    written = brotlicffi.decompress_into(compressed_data, out)
+    assert written == len(uncompressed_data)
+    assert out[:written] == uncompressed_data
+
+
+def test_decompress_into_too_small_buffer(one_compressed_file):
+    with open(one_compressed_file, 'rb') as f:
+        compressed_data = brotlicffi.compress(f.read())
+
+    with pytest.raises(brotlicffi.error, match='too small'):
+        brotlicffi.decompress_into(compressed_data, bytearray(100))
+
+
+def test_decompress_into_truncated_stream(one_compressed_file):
+    with open(one_compressed_file, 'rb') as f:
+        compressed_data = brotlicffi.compress(f.read())
+
+    with pytest.raises(brotlicffi.error, match='incomplete'):
+        brotlicffi.decompress_into(compressed_data[:100], bytearray(1 << 20))
+
+
+@pytest.mark.parametrize('out_size', [1, 100, 4096])
+def test_streaming_decompress_into(simple_compressed_file, out_size):
+    """
+    Draining a stream through a small, reused output buffer reproduces the
+    original data, and the caller keeps ownership of unconsumed input.
+    """
+    with open(simple_compressed_file[0], 'rb') as f:
+        uncompressed_data = f.read()
+
+    with open(simple_compressed_file[1], 'rb') as f:
+        compressed_data = memoryview(f.read())
+
+    out = bytearray(out_size)
+    o = brotlicffi.Decompressor()
+    result = []
+    while not o.is_finished():
+        written, consumed = o.process_into(compressed_data, out)
+        result.append(bytes(out[:written]))
+        compressed_data = compressed_data[consumed:]
+
+    assert b''.join(result) == uncompressed_data
+
+
+def test_decompress_into_with_pending_input(one_compressed_file):
+    with open(one_compressed_file, 'rb') as f:
+        # A small window forces the decoder to stop consuming input once its
+        # ring buffer is full.
+        compressed_data = brotlicffi.compress(f.read(), lgwin=10)
+
+    o = brotlicffi.Decompressor()
+    o.process(compressed_data, output_buffer_limit=1)
+    assert o._unconsumed_data
+    with pytest.raises(brotlicffi.error):
+        o.process_into(b'', bytearray(100))
+
+
+class AmbiguousBuffer(bytearray):
+    """
+    A buffer that, like a NumPy array, can't be used as a truth value.
+    """
+    def __bool__(self):
+        raise ValueError("The truth value of a buffer is ambiguous")
+
+
+def test_decompress_with_pending_input_and_array(one_compressed_file):
+    with open(one_compressed_file, 'rb') as f:
+        compressed_data = brotlicffi.compress(f.read(), lgwin=10)
+
+    o = brotlicffi.Decompressor()
+    o.process(compressed_data, output_buffer_limit=1)
+    assert o._unconsumed_data
+    with pytest.raises(brotlicffi.error):
+        o.process(AmbiguousBuffer(b'more'))
+    # An empty one is fine, and drains the pending input.
+    assert o.process(AmbiguousBuffer(), output_buffer_limit=1)
+
+
+def test_decompress_with_expected_size(simple_compressed_file):
+    with open(simple_compressed_file[0], 'rb') as f:
+        uncompressed_data = f.read()
+
+    with open(simple_compressed_file[1], 'rb') as f:
+        compressed_data = f.read()
+
+    assert brotlicffi.decompress(
+        compressed_data, expected_size=len(uncompressed_data)
+    ) == uncompressed_data
+
+
+def test_decompress_with_generous_expected_size():
+    data = b'hello world' * 100
+    compressed = brotlicffi.compress(data)
+    assert brotlicffi.decompress(
+        compressed, expected_size=len(data) * 2
+    ) == data
+
+
+@pytest.mark.parametrize('expected_size', [0, 1, 1099])
+def test_decompress_with_too_small_expected_size(expected_size):
+    compressed = brotlicffi.compress(b'hello world' * 100)
+    with pytest.raises(brotlicffi.error, match='expected_size'):
+        brotlicffi.decompress(compressed, expected_size=expected_size)
+
+
+def test_decompress_with_negative_expected_size():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.decompress(brotlicffi.compress(b''), expected_size=-1)
+
+
+def test_decompress_with_expected_size_truncated():
+    data = b'hello world' * 100
+    compressed = brotlicffi.compress(data)
+    with pytest.raises(brotlicffi.error, match='incomplete'):
+        brotlicffi.decompress(compressed[:-2], expected_size=len(data))
+
+
+def _compressible_payload(size, ratio):
+    # Blocks of fresh random bytes padded with zeros, so the compression
+    # ratio is roughly `ratio` whatever the size.
+    random_size = 4096 // ratio
+    padding = b'\0' * (4096 - random_size)
+    return b''.join(
+        os.urandom(random_size) + padding for _ in range(size // 4096)
+    )
+
+
+@pytest.mark.parametrize('ratio', [2, 20, 50])
+def test_streaming_highly_compressible_data(ratio):
+    """
+    Feeding highly compressible data in chunks, so that each call produces
+    far more output than its input, returns everything in order.
+    """
+    data = _compressible_payload(4 * 1024 * 1024, ratio)
+    compressed = brotlicffi.compress(data, quality=5)
+
+    o = brotlicffi.Decompressor()
+    result = []
+    for i in range(0, len(compressed), 16384):
+        assert o.can_accept_more_data()
+        result.append(o.decompress(compressed[i:i + 16384]))
+    o.finish()
+    assert b''.join(result) == data
+
+
+def test_decompressor_reuses_output_buffer():
+    data = _compressible_payload(1024 * 1024, 20)
+    compressed = brotlicffi.compress(data, quality=5)
+
+    o = brotlicffi.Decompressor()
+    result = [o.decompress(compressed[:1000])]
+    output_buffer = o._output
+    for i in range(1000, len(compressed), 1000):
+        result.append(o.decompress(compressed[i:i + 1000]))
+    assert b''.join(result) == data
+    assert o._output is output_buffer
+
+
+def test_decompress_grows_output_in_one_call():
+    # Far more output than the ratio of the input suggests.
+    data = b'\0' * (32 * 1024 * 1024)
+    assert brotlicffi.decompress(brotlicffi.compress(data)) == data
+
+
+@pytest.mark.parametrize('input_type', [bytes, bytearray, memoryview])
+def test_drain_with_output_buffer_limit(input_type):
+    """
+    Draining a large input through a small limit keeps the unconsumed input
+    in place rather than copying it each call, whatever the input type.
+    """
+    data = _compressible_payload(1024 * 1024, 2)
+    # A small window stops the decoder consuming input far ahead of the
+    # output it has returned.
+    compressed = input_type(brotlicffi.compress(data, quality=1, lgwin=16))
+
+    o = brotlicffi.Decompressor()
+    result = [o.decompress(compressed, output_buffer_limit=16384)]
+    assert o._unconsumed_data
+    pending = o._pending[0]
+    if isinstance(compressed, bytearray):
+        # The caller's buffer is no longer pinned, and can be changed.
+        compressed[:] = b''
+    while not o.can_accept_more_data():
+        assert len(result[-1]) <= 16384
+        result.append(o.decompress(b'', output_buffer_limit=16384))
+        assert o._pending is None or o._pending[0] is pending
+    o.finish()
+    assert b''.join(result) == data
+
+
+def test_decompress_views():
+    """
+    Output views cover the whole output, in pieces of at most the window
+    size, and each is released once the next is taken.
+    """
+    data = _compressible_payload(1024 * 1024, 20)
+    compressed = brotlicffi.compress(data, quality=5, lgwin=16)
+
+    o = brotlicffi.Decompressor()
+    result = []
+    previous = None
+    for i in range(0, len(compressed), 1000):
+        for view in o.decompress_views(compressed[i:i + 1000]):
+            assert view.readonly
+            assert len(view) <= 1 << 16
+            if previous is not None:
+                with pytest.raises(ValueError):
+                    bytes(previous)
+            result.append(bytes(view))
+            previous = view
+    o.finish()
+    assert b''.join(result) == data
+
+
+def test_decompress_views_must_be_exhausted():
+    compressed = brotlicffi.compress(b'\0' * (1024 * 1024), lgwin=16)
+
+    o = brotlicffi.Decompressor()
+    views = o.decompress_views(compressed)
+    first = bytes(next(views))
+    with pytest.raises(brotlicffi.error):
+        o.decompress(b'')
+    # Abandoning the iterator drops the rest of the input, but leaves the
+    # decompressor usable.
+    views.close()
+    rest = o.decompress(b'')
+    assert first + rest == b'\0' * len(first + rest)
+    assert not o.is_finished()
+
+
+@pytest.mark.parametrize('close', [True, False])
+def test_decompress_views_not_started(close):
+    """
+    An iterator that is closed or dropped before it is started doesn't
+    leave the decompressor locked.
+    """
+    compressed = brotlicffi.compress(b'data')
+    o = brotlicffi.Decompressor()
+    views = o.decompress_views(compressed)
+    if close:
+        views.close()
+    del views
+    assert o.decompress(compressed) == b'data'
+    o.finish()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+test_train
+~~~~~~~~~~
+
+Tests for dictionary training and evaluation.
+"""
+import json
+
+import brotlicffi
+from brotlicffi._train import _subsample
+
+import pytest
+
+
+RECORDS = [
+    json.dumps({
+        'order_id': i,
+        'customer': {'name': 'customer-%d' % (i * 7919 % 1000),
+                     'country': ['GB', 'US', 'DE', 'FR'][i % 4]},
+        'status': ['pending', 'shipped', 'delivered'][i % 3],
+        'items': [{'sku': 'SKU-%05d' % (i * 31 % 5000), 'quantity': i % 5}],
+    }).encode('ascii')
+    for i in range(600)
+]
+TRAINING, TESTING = RECORDS[:500], RECORDS[500:]
+
+
+def test_train_dictionary_respects_size():
+    dictionary = brotlicffi.train_dictionary(TRAINING, size=1024)
+    assert 0 < len(dictionary) <= 1024
+
+
+def test_trained_dictionary_roundtrip():
+    dictionary = brotlicffi.train_dictionary(TRAINING, size=2048)
+    for record in TESTING:
+        compressed = brotlicffi.compress(record, dictionary=dictionary)
+        assert brotlicffi.decompress(
+            compressed, dictionary=dictionary
+        ) == record
+
+
+def test_trained_dictionary_improves_ratio():
+    dictionary = brotlicffi.train_dictionary(TRAINING, size=2048)
+    evaluation = brotlicffi.evaluate_dictionary(dictionary, TESTING)
+    assert evaluation.original_size == sum(len(r) for r in TESTING)
+    assert evaluation.ratio_with_dictionary > 2 * evaluation.ratio
+    assert evaluation.compress_time > 0
+    assert evaluation.decompress_time_with_dictionary > 0
+
+
+def test_train_dictionary_accepts_buffers():
+    samples = [bytearray(r) for r in TRAINING[:100]]
+    assert brotlicffi.train_dictionary(
+        samples, size=512
+    ) == brotlicffi.train_dictionary(TRAINING[:100], size=512)
+
+
+@pytest.mark.slow
+def test_train_dictionary_with_workers():
+    assert brotlicffi.train_dictionary(
+        TRAINING, size=2048, workers=2
+    ) == brotlicffi.train_dictionary(TRAINING, size=2048)
+
+
+def test_train_dictionary_without_shared_content():
+    dictionary = brotlicffi.train_dictionary(
+        [bytes([i]) * 100 for i in range(10)], size=1024
+    )
+    assert dictionary == b''
+
+
+def test_subsample_spreads_over_corpus():
+    samples = [bytes([i]) * 10 for i in range(100)]
+    chosen = _subsample(samples, 250)
+    assert len(chosen) == 25
+    assert chosen[0] == samples[0]
+    assert chosen[-1] == samples[96]
+
+
+def test_subsample_slices_large_samples():
+    samples = [bytes([i]) * (1024 * 1024) for i in range(2)]
+    chosen = _subsample(samples, 100 * 1024)
+    assert len(chosen) == 2
+    assert chosen[0][:1] == b'\x00' and chosen[1][:1] == b'\x01'
+    assert 90 * 1024 <= sum(len(sample) for sample in chosen) <= 110 * 1024
+
+
+def test_train_dictionary_from_few_large_samples():
+    # Two samples far larger than the subsampling budget between them.
+    samples = [b''.join(TRAINING[i::2]) * 40 for i in range(2)]
+    assert all(len(sample) > 1024 * 1024 for sample in samples)
+    dictionary = brotlicffi.train_dictionary(samples, size=4096)
+    assert 0 < len(dictionary) <= 4096
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'size': 0},
+    {'segment_size': 4},
+    {'workers': 0},
+])
+def test_train_dictionary_bad_arguments(kwargs):
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.train_dictionary(TRAINING, **kwargs)
+
+
+def test_train_dictionary_without_samples():
+    with pytest.raises(brotlicffi.error):
+        brotlicffi.train_dictionary([])
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+test_writer
+~~~~~~~~~~~
+
+Tests for the coalescing BrotliWriter.
+"""
+import gc
+import io
+import threading
+import time
+
+import brotlicffi
+
+import pytest
+
+from hypothesis import given
+from hypothesis.strategies import binary, integers, lists
+
+
+RECORDS = [b'{"event": "click", "id": %d}\n' % i for i in range(5000)]
+
+
+class CountingSink(io.BytesIO):
+    """
+    A BytesIO that counts how often it is written to.
+    """
+    def __init__(self):
+        super(CountingSink, self).__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super(CountingSink, self).write(data)
+
+
+class FlushEventSink(io.BytesIO):
+    """
+    A BytesIO that signals each time it is flushed, and can be made to fail.
+    """
+    def __init__(self):
+        super(FlushEventSink, self).__init__()
+        self.flushed = threading.Event()
+        self.fail = False
+
+    def write(self, data):
+        if self.fail:
+            raise OSError("sink is broken")
+        return super(FlushEventSink, self).write(data)
+
+    def flush(self):
+        super(FlushEventSink, self).flush()
+        self.flushed.set()
+
+
+class TrickleSink(io.RawIOBase):
+    """
+    A raw sink that only ever accepts a few bytes per write.
+    """
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        chunk = bytes(data[:7])
+        self.data += chunk
+        return len(chunk)
+
+
+class WouldBlockSink(io.RawIOBase):
+    """
+    A non-blocking raw sink that never has room for more data.
+    """
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return None
+
+
+class NoneReturningSink(object):
+    """
+    A minimal file-like object whose write() returns None after writing.
+    """
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+def test_small_writes_roundtrip():
+    sink = io.BytesIO()
+    with brotlicffi.BrotliWriter(sink, quality=5) as w:
+        for record in RECORDS:
+            assert w.write(record) == len(record)
+        assert w.tell() == sum(len(r) for r in RECORDS)
+    assert not sink.closed
+    assert brotlicffi.decompress(sink.getvalue()) == b''.join(RECORDS)
+
+
+def test_small_writes_are_batched():
+    """
+    Small writes don't reach the sink until the staging buffer fills up.
+    """
+    sink = CountingSink()
+    w = brotlicffi.BrotliWriter(sink, buffer_size=64 * 1024, quality=5)
+    for record in RECORDS[:100]:
+        w.write(record)
+    assert sink.writes == 0
+    w.close()
+    assert brotlicffi.decompress(sink.getvalue()) == b''.join(RECORDS[:100])
+
+
+def test_flush_emits_decodable_prefix():
+    sink = io.BytesIO()
+    w = brotlicffi.BrotliWriter(sink)
+    d = brotlicffi.Decompressor()
+
+    w.write(RECORDS[0])
+    w.flush()
+    first = sink.getvalue()
+    assert d.process(first) == RECORDS[0]
+
+    w.write(RECORDS[1])
+    w.flush()
+    assert d.process(sink.getvalue()[len(first):]) == RECORDS[1]
+    w.close()
+
+
+@given(
+    chunks=lists(binary(max_size=300), max_size=50),
+    buffer_size=integers(min_value=1, max_value=512),
+)
+def test_arbitrary_writes_roundtrip(chunks, buffer_size):
+    sink = io.BytesIO()
+    with brotlicffi.BrotliWriter(
+        sink, buffer_size=buffer_size, quality=1
+    ) as w:
+        for chunk in chunks:
+            w.write(memoryview(chunk))
+    assert brotlicffi.decompress(sink.getvalue()) == b''.join(chunks)
+
+
+def test_large_write_bypasses_staging():
+    data = bytes(range(256)) * 4096
+    sink = io.BytesIO()
+    with brotlicffi.BrotliWriter(sink, buffer_size=1024, quality=1) as w:
+        w.write(b'prefix')
+        w.write(data)
+        w.write(b'suffix')
+    assert brotlicffi.decompress(sink.getvalue()) == (
+        b'prefix' + data + b'suffix'
+    )
+
+
+def test_partial_writes_to_raw_sink():
+    sink = TrickleSink()
+    with brotlicffi.BrotliWriter(sink, quality=5) as w:
+        for record in RECORDS:
+            w.write(record)
+    assert brotlicffi.decompress(bytes(sink.data)) == b''.join(RECORDS)
+
+
+def test_would_block_raw_sink_raises():
+    w = brotlicffi.BrotliWriter(WouldBlockSink(), quality=5)
+    w.write(b'data')
+    with pytest.raises(BlockingIOError):
+        w.flush()
+
+
+def test_none_from_non_raw_sink_is_a_full_write():
+    sink = NoneReturningSink()
+    with brotlicffi.BrotliWriter(sink, quality=5) as w:
+        for record in RECORDS:
+            w.write(record)
+    assert brotlicffi.decompress(bytes(sink.data)) == b''.join(RECORDS)
+
+
+def test_write_after_close_raises():
+    w = brotlicffi.BrotliWriter(io.BytesIO())
+    w.close()
+    w.close()
+    assert w.closed
+    with pytest.raises(ValueError):
+        w.write(b'data')
+
+
+def test_invalid_buffer_size():
+    with pytest.raises(ValueError):
+        brotlicffi.BrotliWriter(io.BytesIO(), buffer_size=0)
+
+
+def test_flush_bytes():
+    sink = CountingSink()
+    w = brotlicffi.BrotliWriter(sink, quality=5, flush_bytes=1000)
+    d = brotlicffi.Decompressor()
+    written = b''
+    for record in RECORDS[:100]:
+        w.write(record)
+        written += record
+        if sink.writes:
+            break
+    assert 1000 <= len(written) < 1000 + len(RECORDS[0])
+    assert d.process(sink.getvalue()) == written
+
+    # The count starts again from the flush.
+    sink.writes = 0
+    w.write(b'x' * 999)
+    assert sink.writes == 0
+    w.write(b'x')
+    assert sink.writes > 0
+    w.close()
+
+
+def test_flush_interval():
+    sink = FlushEventSink()
+    w = brotlicffi.BrotliWriter(sink, quality=5, flush_interval=0.05)
+    d = brotlicffi.Decompressor()
+
+    start = time.monotonic()
+    w.write(RECORDS[0])
+    w.write(RECORDS[1])
+    assert sink.flushed.wait(5)
+    assert time.monotonic() - start >= 0.05
+    assert d.process(sink.getvalue()) == RECORDS[0] + RECORDS[1]
+
+    # Nothing written, so nothing to flush.
+    sink.flushed.clear()
+    assert not sink.flushed.wait(0.2)
+    w.close()
+
+
+def test_explicit_flush_cancels_timer():
+    sink = FlushEventSink()
+    w = brotlicffi.BrotliWriter(sink, flush_interval=0.05)
+    w.write(RECORDS[0])
+    w.flush()
+    sink.flushed.clear()
+    assert not sink.flushed.wait(0.2)
+    w.close()
+    assert brotlicffi.decompress(sink.getvalue()) == RECORDS[0]
+
+
+def test_timer_thread_is_reused_and_stopped_by_close():
+    sink = FlushEventSink()
+    w = brotlicffi.BrotliWriter(sink, flush_interval=0.01)
+    threads = set()
+    for record in RECORDS[:3]:
+        sink.flushed.clear()
+        w.write(record)
+        threads.add(w._timer)
+        assert sink.flushed.wait(5)
+    assert len(threads) == 1
+    timer = threads.pop()
+    assert timer.is_alive()
+
+    w.close()
+    assert not timer.is_alive()
+    assert brotlicffi.decompress(sink.getvalue()) == b''.join(RECORDS[:3])
+
+
+def test_unclosed_writer_is_collected():
+    sink = FlushEventSink()
+    w = brotlicffi.BrotliWriter(sink, flush_interval=0.01)
+    w.write(RECORDS[0])
+    assert sink.flushed.wait(5)
+    timer = w._timer
+    del w
+    gc.collect()
+    timer.join(5)
+    assert not timer.is_alive()
+    assert brotlicffi.decompress(sink.getvalue()) == RECORDS[0]
+
+
+def test_timed_flush_error_is_raised_by_next_call():
+    sink = FlushEventSink()
+    w = brotlicffi.BrotliWriter(sink, flush_interval=0.01)
+    sink.fail = True
+    w.write(RECORDS[0])
+    deadline = time.monotonic() + 5
+    while w._timer_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(OSError):
+        w.write(RECORDS[1])
+
+
+@pytest.mark.parametrize('params', [
+    {'flush_bytes': 0},
+    {'flush_interval': 0},
+    {'flush_interval': -1.0},
+])
+def test_invalid_flush_policy(params):
+    with pytest.raises(ValueError):
+        brotlicffi.BrotliWriter(io.BytesIO(), **params)